@@ -1,6 +1,8 @@
 import argparse
+import asyncio
 from pathlib import Path
 import os
+import sys
 import yaml
 from dgsm.dgsm import DGSM_Coordinator
 from dgsm.controllers import update_controllers_from_path
@@ -16,7 +18,7 @@ apps: # Dictionary of application settings
       endpoint: '<IP or URL>' # will be passed to users who request app info
       password: '<App Password>' # will be passed to users who request app info
     opts: # Optional - Dictionary for customizing behavior of the app
-      new_console: <False | True> # Starts the app in a new terminal window
+      new_console: <False | True> # Starts the app in a new terminal window (windows only - use 'python -m dgsm attach <AppName>' elsewhere)
       upnp: # UPnP config
         ports: # dictionary <port: protocol> where port is an int and protocol is 'tcp' | 'udp' | 'both'
           2456: 'both'
@@ -55,7 +57,21 @@ if __name__ == '__main__':
         with open(path) as cfg_file:
             return yaml.load(cfg_file, Loader=yaml.Loader)
 
+    # attach this terminal to a running app - python -m dgsm attach <app>
+    def attach(argv:list[str]) -> int:
+        from dgsm.utils.attach import attach, socket_path
+        parser = argparse.ArgumentParser(prog='python -m dgsm attach', description="Attach this terminal to an app's console")
+        parser.add_argument('app', help="name of the app")
+        parser.add_argument('--dir', '-d', default=None, help="directory of the attach sockets, defaults to $XDG_RUNTIME_DIR/dgsm")
+        args = parser.parse_args(argv)
+        if os.name == 'nt':
+            print("attach is not supported on windows - use 'new_console' instead")
+            return 1
+        try: return asyncio.run(attach(socket_path(args.app, args.dir)))
+        except KeyboardInterrupt: return 0
+
     def main():
+        if sys.argv[1:2] == ['attach']: return attach(sys.argv[2:])
         parser = argparse.ArgumentParser()
         parser.add_argument('--cfg', '-c', help="path to config file", default ='', type=str)
         parser.add_argument('--con', '-o', help="path to custom ProcController implementations", default='', type=str)
@@ -93,5 +109,4 @@ if __name__ == '__main__':
         
         DGSM_Coordinator(**config).start()
 
-    main()
-
+    sys.exit(main())
@@ -1,10 +1,17 @@
-import asyncio, re
+import asyncio, re, sqlite3, time
+from collections import Counter
+from datetime import datetime
 from dgsm.controllers.proc_controller import ProcController, cmd
-from dgsm.utils.intf_grouping import interface_tag
+from dgsm.utils.intf_grouping import interface_tag, interface_version
 from dgsm.utils.log_util import make_logger
+from dgsm.utils.pattern_set import PatternSet
+from dgsm.utils.rcon import RconError, RconPool
+from dgsm.utils.scrollback import parse_duration
+from dgsm.utils.server_query import QUERIES, QueryResult, reconcile
+from dgsm.utils.session_store import SessionStore, format_duration
 
 
-logger = make_logger()
+logger = make_logger(__name__)
 stdout_handler = interface_tag('handlers')
 
 # AppController abstract class
@@ -13,8 +20,48 @@ stdout_handler = interface_tag('handlers')
 # version, server connection, player connects/disconnects
 # this is not compulsory, subclasses can override anything as needed
 class AppController(ProcController):
+    # query protocol ('a2s' or 'slp') and port used to poll the players online when the 'query' opts are set
+    QUERY:str = None
+    QUERY_PORT:int = None
+
     def __init__(self, name:str, **kwargs):
         super().__init__(name, **kwargs)
+        self._regex_engine = kwargs.get('opts', {}).get('regex_engine', 're')
+        self._bind_handlers()
+        self._rcon = self._create_rcon(kwargs.get('opts', {}).get('rcon'))
+        self._query_opts = self._query_config(kwargs.get('opts', {}).get('query'))
+        self._query:QueryResult = None
+        self._query_error = ''
+        self._query_task = None
+        self._sessions:SessionStore = kwargs.get('sessions')
+        self._recorded = Counter() # players whose sessions are open in the session store
+
+    # rcon connection pool described by the 'rcon' opts - None if rcon is not configured
+    def _create_rcon(self, cfg:dict) -> RconPool:
+        if not cfg: return None
+        if not cfg.get('port') or 'password' not in cfg:
+            logger.error(f"{self.name} rcon opts need a 'port' and a 'password' - using stdin for commands")
+            return None
+        return RconPool(cfg.get('host', 'localhost'), cfg['port'], cfg['password'], cfg.get('pool', 2), cfg.get('timeout', 5.0), cfg.get('idle', 0.5))
+
+    # compile this class's stdout_handler patterns once into a single PatternSet - compiled again if the interface changes
+    # the patterns are in the order of the handlers interface, so a pattern's index is the index of its handler
+    @classmethod
+    def _compiled_handlers(cls, engine:str='re') -> PatternSet:
+        cache = cls.__dict__.get('_handler_cache')
+        if cache is None:
+            cache = {}
+            setattr(cls, '_handler_cache', cache)
+        if (entry := cache.get(engine)) is None or entry[0] != interface_version():
+            patterns = list(cls.handlers.keys()) if hasattr(cls, 'handlers') else []
+            cache[engine] = entry = (interface_version(), PatternSet(patterns, engine))
+        return entry[1]
+
+    # look up the compiled patterns and this instance's bound handlers, they are dispatched to by index
+    def _bind_handlers(self) -> None:
+        self._handler_set = self._compiled_handlers(self._regex_engine)
+        self._handler_funcs = self.handlers.funcs if hasattr(type(self), 'handlers') else ()
+        self._handler_version = interface_version()
 
     @property
     def status(self) -> str: return 'Online' if self._app_attrs['online'] else 'Offline'
@@ -44,20 +91,114 @@ class AppController(ProcController):
     def _handle_connect(self, match:re.Match) -> None:
         self._app_attrs['players'].append(match.group(1))
         
-    # remove players from list when they disconnect
+    # remove players from list when they disconnect - a query may have removed them already
     def _handle_disconnect(self, match:re.Match) -> None:
-        self._app_attrs['players'].remove(match.group(1))
+        if match.group(1) in self._app_attrs['players']: self._app_attrs['players'].remove(match.group(1))
 
-    # run msg through re.search - if match then call associated handler function
+    # search msg with the compiled handler patterns - if match then call associated handler function
+    # patterns are tried in declaration order, the first match wins
     def _output_handler(self, msg:str) -> bool:
-        for pattern, method in self.handlers.items():
-            if match := re.search(pattern, msg):
-                method(match)
-                return True
-        return False
+        if self._handler_version != interface_version(): self._bind_handlers()
+        if not (hit := self._handler_set.search(msg)): return False
+        idx, match = hit
+        self._handler_funcs[idx](match)
+        if self._sessions: self._record_sessions()
+        return True
     
+    # complete the 'query' opts with this controller's protocol and port - None if querying is off or not possible
+    def _query_config(self, cfg:dict|bool) -> dict:
+        if not cfg: return None
+        cfg = {} if cfg is True else dict(cfg)
+        cfg.setdefault('type', self.QUERY)
+        cfg.setdefault('port', self.QUERY_PORT)
+        if cfg['type'] not in QUERIES or not cfg['port']:
+            logger.error(f"{self.name} query opts need a 'type' of {', '.join(QUERIES)} and a 'port' - player counts will not be polled")
+            return None
+        return cfg
+
+    # poll the server's query protocol while the app runs and reconcile the players found in the output with the result
+    # polls every 'interval' seconds while players are online and every 'idle_interval' seconds otherwise
+    # a result only changes the players once the next poll agrees with it, so players that are joining are not dropped
+    async def _poll_players(self) -> None:
+        cfg = self._query_opts
+        query = QUERIES[cfg['type']]
+        while self.running:
+            try:
+                result = await query(cfg.get('host', 'localhost'), cfg['port'], cfg.get('timeout', 3.0))
+                if result.agrees(self._query):
+                    self._reconcile_players(result)
+                    if self._sessions: self._record_sessions()
+                if result.version: self._app_attrs.setdefault('version', result.version) # in case it was not found in the output
+                self._query, self._query_error = result, ''
+            except (OSError, EOFError, ValueError, IndexError, asyncio.TimeoutError) as e:
+                if not self._query_error: logger.warning(f"{self.name} query failed: {e!r}")
+                self._query, self._query_error = None, repr(e)
+            busy = self._app_attrs['players'] or (self._query and self._query.players)
+            await asyncio.sleep(cfg.get('interval', 10) if busy else cfg.get('idle_interval', 60))
+
+    # make the players agree with the query result
+    def _reconcile_players(self, result:QueryResult) -> None:
+        players = self._app_attrs['players']
+        if (new := reconcile(players, result)) is None: return
+        logger.info(f"{self.name} players reconciled with {self._query_opts['type']} query: {', '.join(players) or 'none'} -> {', '.join(new) or 'none'}")
+        players[:] = new
+
+    # names of the players online - implementations that store players differently override this
+    def _player_names(self) -> list[str]:
+        return list(self._app_attrs['players'])
+
+    # queue a session event for every player that joined or left since the last call - never blocks
+    def _record_sessions(self) -> None:
+        current = Counter(self._player_names())
+        if current == self._recorded: return
+        count = sum(current.values())
+        for player, n in (current - self._recorded).items():
+            for _ in range(n): self._sessions.join(self.name, player, count)
+        for player, n in (self._recorded - current).items():
+            for _ in range(n): self._sessions.leave(self.name, player, count)
+        self._recorded = current
+
+    # formatted query result for status messages - empty if querying is off
+    def _poll_status(self) -> str:
+        if not self._query_opts or not self.running: return ''
+        if self._query: return f'\n  Query: {self._query} ({self._query.latency * 1000:.0f}ms)'
+        return f'\n  Query: {self._query_error or "waiting"}'
+
+    def _status_details(self) -> str:
+        return super()._status_details() + self._poll_status()
+
+    # send command to the app and return its response - None if the app is not running
+    # commands are sent over rcon when it is configured, the response is exactly the output of the command
+    # otherwise (or if rcon fails) the command is written to stdin and the response is read from stdout:
+    #   the first line matching pattern if one is given, else all output for 'wait_time' seconds
+    # an empty string is returned if no matching output is seen within timeout
+    async def send_command(self, command:str, pattern:re.Pattern=None, timeout:float=3.0, wait_time:float=1.0) -> str | None:
+        if not self.running: return None
+        if self._rcon:
+            try: return await self._rcon.execute(command)
+            except RconError as e: logger.warning(f"{self.name} rcon command failed, sending it to stdin instead: {e}")
+        waiter = self.output_waiter(pattern, timeout) if pattern else self.output_waiter(wait_time=wait_time)
+        if not waiter: return None
+        await self.message_app(command)
+        output = await waiter()
+        if pattern: return output.string if output else ''
+        return output
+
+    # rcon connections and polling do not survive the app
+    async def _terminate_proc(self) -> None:
+        if self._rcon: self._rcon.close()
+        if self._query_task: self._query_task.cancel()
+        self._query_task = self._query = None
+        self._query_error = ''
+        if self._sessions and self._recorded: self._sessions.end_all(self.name)
+        self._recorded = Counter()
+        await super()._terminate_proc()
+
     # customize message once app has started
+    # a readiness probe can pass before the online output is seen - the app is online either way
     async def _on_start(self) -> str:
+        self._app_attrs['online'] = True
+        if self._query_opts and not self._query_task: self._query_task = asyncio.get_event_loop().create_task(self._poll_players())
         rstr = f'{self.name} has started'
         if ep := self._app_attrs.get('app_info', {}).get('endpoint'):
             rstr += f'\nEndpoint: {ep}'
@@ -89,7 +230,55 @@ class AppController(ProcController):
             rstr += ':'
             for player in self._app_attrs['players']:
                 rstr += f'\n    {player}'
-        cpu, mem = self._resource_calc()
-        rstr += f'\n  CPU: {cpu}%'
-        rstr += f'\n  Mem: {mem} GB'
+        rstr += self._status_details()
         await self.message_coordinator(rstr)
+
+    @cmd('players')
+    async def _players(self, *args) -> None:
+        """
+        Returns player history: --top [n] players by playtime, --peak players online at once, --since <duration> (i.e. 7d) limits either to a recent period
+        """
+        if not self._sessions:
+            await self.message_coordinator(f"Player sessions are not recorded")
+            return
+        tokens, since, top, peak = ' '.join(args).split(), 0.0, 0, False
+        try:
+            while tokens:
+                match tokens.pop(0):
+                    case '--top':
+                        top = int(tokens.pop(0)) if tokens and tokens[0].isdigit() else 10
+                    case '--peak': peak = True
+                    case '--since': since = time.time() - parse_duration(tokens.pop(0))
+                    case arg: raise ValueError(arg)
+        except (IndexError, ValueError):
+            await self.message_coordinator(f"Usage: players [--top [n]] [--peak] [--since <duration>]")
+            return
+        await asyncio.to_thread(self._sessions.flush)
+        period = f" since {datetime.fromtimestamp(since):%Y-%m-%d %H:%M}" if since else ''
+        try:
+            if top: await self.message_coordinator(await self._top_players(since, top, period))
+            if peak: await self.message_coordinator(await self._peak_players(since, period))
+            if not top and not peak: await self.message_coordinator(await self._recent_players(since, period))
+        except (sqlite3.Error, OSError) as e:
+            logger.exception(f"unable to read the player sessions of {self.name}")
+            await self.message_coordinator(f"Unable to read the player sessions of {self.name}: {e}")
+
+    async def _top_players(self, since:float, limit:int, period:str) -> str:
+        if not (rows := await asyncio.to_thread(self._sessions.top, self.name, since, limit)): return f"No players have joined {self.name}{period}"
+        rstr = f'{self.name} top players{period}:'
+        for player, played, sessions in rows:
+            rstr += f'\n  {player}: {format_duration(played)} ({sessions} session{"s" if sessions != 1 else ""})'
+        return rstr
+
+    async def _peak_players(self, since:float, period:str) -> str:
+        if not (row := await asyncio.to_thread(self._sessions.peak, self.name, since)) or not row[0]: return f"No players have joined {self.name}{period}"
+        return f'{self.name} peak{period}: {row[0]} player{"s" if row[0] != 1 else ""} online at {datetime.fromtimestamp(row[1]):%Y-%m-%d %H:%M}'
+
+    async def _recent_players(self, since:float, period:str) -> str:
+        sessions, players, played = await asyncio.to_thread(self._sessions.totals, self.name, since)
+        if not sessions: return f"No players have joined {self.name}{period}"
+        rstr = f'{self.name}{period}: {players} player{"s" if players != 1 else ""}, {sessions} session{"s" if sessions != 1 else ""}, {format_duration(played)} played\nRecent sessions:'
+        for player, joined, left in await asyncio.to_thread(self._sessions.recent, self.name, since, 10):
+            rstr += f'\n  {player}: {datetime.fromtimestamp(joined):%Y-%m-%d %H:%M} '
+            rstr += f'for {format_duration(left - joined)}' if left else f'online for {format_duration(time.time() - joined)}'
+        return rstr
@@ -1,5 +1,6 @@
 import asyncio
 from dgsm.controllers.proc_controller import ProcController, cmd
+from dgsm.utils.readiness import FutureProbe, Probe
 
 
 # Implementation that can be used for any app
@@ -31,15 +32,22 @@ class DefaultController(ProcController):
         return (True, "OK to stop")
 
     # override start command to automatically set _start_comp after 3 seconds
+    # apps with readiness probes are started once the probes pass instead
     @cmd('start')
     async def _start(self, *_):
         """
         Start the application
         """
+        if self._ready_opts.get('probes'): return await super()._start()
         asyncio.get_running_loop().create_task(super()._start())
         await asyncio.sleep(3)
         try: self._start_comp.set_result(True)
         except asyncio.InvalidStateError: pass
+
+    # without probes the app is considered started once it has run for 3 seconds
+    def _default_probes(self) -> list[Probe]:
+        if self._ready_opts.get('probes'): return []
+        return [FutureProbe(self._start_comp, label='startup delay')]
     
     # override start command message since we are setting started state in 3 seconds anyway
     async def _on_start_cmd(self) -> str:
@@ -53,7 +61,5 @@ class DefaultController(ProcController):
         """
         rstr = f'{self.name} is {self.status}'
         if self.running:
-            cpu, mem = self._resource_calc()
-            rstr += f'\n  CPU: {cpu}%'
-            rstr += f'\n  Mem: {mem} GB'
+            rstr += self._status_details()
         await self.message_coordinator(rstr)
\ No newline at end of file
@@ -5,13 +5,15 @@ from dgsm.controllers import AppController, cmd, stdout_handler
 # Factorio Game Server reseats its stdin handle to the console that executed it (at least on windows)
 # Discussion here: https://forums.factorio.com/viewtopic.php?t=75627
 # This affects the console interface since Factorio will attempt to read from the terminal
-# Setting new_console to True in the config file (in 'opts' dict) is the only current workaround for this scenario
+# Setting new_console to True in the config file (in 'opts' dict) works around this scenario on windows - configure 'rcon' in 'opts'
+#   (and start the server with --rcon-port and --rcon-password) to still send commands to the server
 
 class FactorioController(AppController):
     VERSION    = re.compile(r'(?:Factorio )([\w.]+)(?: \(build)', re.IGNORECASE)
     ONLINE     = re.compile(r'(Hosting game at IP ADDR)', re.IGNORECASE)
     CONNECT    = re.compile(r'(?:\[JOIN\] )(\w+)(?: joined the game)', re.IGNORECASE)
     DISCONNECT = re.compile(r'(?:\[LEAVE\] )(\w+)(?: left the game)', re.IGNORECASE)
+    STOP_SEQUENCE = (('/quit', None, 0.0),) # the server saves the map when it quits
     def __init__(self, name:str, **kwargs) -> None:
         super().__init__(name, **kwargs)
 
@@ -34,3 +36,13 @@ class FactorioController(AppController):
     @stdout_handler(DISCONNECT)
     def _handle_disconnect(self, match: re.Match) -> None:
         return super()._handle_disconnect(match)
+
+    @cmd('input')
+    async def _input(self, *args) -> None:
+        """
+        Sends input directly to the app
+        """
+        if not args: return
+        output = await self.send_command(' '.join(arg for arg in args))
+        if output is None: return
+        await self.message_coordinator(output or f'{self.name} sent no response')
@@ -7,6 +7,20 @@ class MineCraftController(AppController):
     ONLINE     = re.compile(r'(Done \([\w.]+s\)!)', re.IGNORECASE)
     CONNECT    = re.compile(r'([\w]+)(?: joined the game)', re.IGNORECASE)
     DISCONNECT = re.compile(r'([\w]+)(?: left the game)', re.IGNORECASE)
+    SEED       = re.compile(r'(?:Seed: \[)(-?\d+)(?:\])', re.IGNORECASE)
+    # flush the world to disk before stopping
+    STOP_SEQUENCE = (
+        ('save-all flush', re.compile(r'Saved the (?:game|world)', re.IGNORECASE), 60.0),
+        ('stop', None, 0.0),
+    )
+    # stop writing the world while a backup is taken
+    BACKUP_BEGIN = (
+        ('save-off', re.compile(r'Automatic saving is now disabled', re.IGNORECASE), 10.0),
+        ('save-all flush', re.compile(r'Saved the (?:game|world)', re.IGNORECASE), 60.0),
+    )
+    BACKUP_END = (('save-on', re.compile(r'Automatic saving is now enabled', re.IGNORECASE), 10.0),)
+    QUERY      = 'slp'
+    QUERY_PORT = 25565
     def __init__(self, name:str, **kwargs) -> None:
         super().__init__(name, **kwargs)
 
@@ -43,11 +57,10 @@ class MineCraftController(AppController):
         """
         Returns the seed of the server
         """
-        waiter = self.output_waiter(pattern=re.compile(r'(?:Seed: \[)(-?\d+)(?:\])', re.IGNORECASE))
-        if not waiter: return
-        await self.message_app('seed')
-        match = await waiter()
-        await self.message_coordinator(f'{self.name} Seed: {match.group(1)}')
+        response = await self.send_command('seed', pattern=self.SEED)
+        if response is None: return
+        if match := self.SEED.search(response): await self.message_coordinator(f'{self.name} Seed: {match.group(1)}')
+        else: await self.message_coordinator(f'{self.name} did not respond with its seed')
     
     @cmd('input')
     async def _input(self, *args) -> None:
@@ -55,8 +68,6 @@ class MineCraftController(AppController):
         Sends input directly to the app
         """
         if not args: return
-        waiter = self.output_waiter(wait_time=1.0)
-        if not waiter: return
-        await self.message_app(' '.join(arg for arg in args))
-        output = await waiter()
-        await self.message_coordinator(output)
+        output = await self.send_command(' '.join(arg for arg in args))
+        if output is None: return
+        await self.message_coordinator(output or f'{self.name} sent no response')
@@ -1,5 +1,10 @@
 import re
 from dgsm.controllers import AppController, cmd, stdout_handler
+from dgsm.utils.log_util import make_logger
+from dgsm.utils.server_query import QueryResult, reconcile
+
+
+logger = make_logger(__name__)
 
 
 class ValheimController(AppController):
@@ -7,6 +12,8 @@ class ValheimController(AppController):
     ONLINE     = re.compile(r'(Game server connected)(?:\s|$)', re.IGNORECASE)
     CONNECT    = re.compile(r'(?:Got character ZDOID from )([\w]+)(?: : )(-?[0-9]{5,})(?::)', re.IGNORECASE)
     DISCONNECT = re.compile(r'(?:Destroying abandoned non persistent zdo -?[0-9]{5,}:\d+ owner )(-?[0-9]{5,})(?:\s|$)', re.IGNORECASE)
+    QUERY      = 'a2s'
+    QUERY_PORT = 2457 # game port + 1
     def __init__(self, name:str, **kwargs) -> None:
         super().__init__(name, **kwargs)
 
@@ -36,6 +43,28 @@ class ValheimController(AppController):
     def _handle_disconnect(self, match:re.Match) -> None:
         self._app_attrs['players'].pop(match.group(1), None)
 
+    def _player_names(self) -> list[str]:
+        return list(self._app_attrs['players'].values())
+
+    # players is a dict of zdoid: name - valheim does not report player names to queries, so this usually
+    #   drops the players that joined first when the count is lower than the players found in the output
+    # players only known to the query are added under their name
+    def _reconcile_players(self, result:QueryResult) -> None:
+        players = self._app_attrs['players']
+        if (new := reconcile(list(players.values()), result)) is None: return
+        entries = list(players.items())
+        if not result.complete: entries = entries[len(entries) - len(new):]
+        else:
+            remaining, kept = list(new), []
+            for zdoid, name in entries:
+                if name in remaining:
+                    remaining.remove(name)
+                    kept.append((zdoid, name))
+            entries = kept + [(name, name) for name in remaining]
+        logger.info(f"{self.name} players reconciled with a2s query: {', '.join(players.values()) or 'none'} -> {', '.join(new) or 'none'}")
+        players.clear()
+        players.update(entries)
+
     # override query to handle dict of players instead of list
     @cmd('status')
     async def _query_status(self, *_) -> None:
@@ -45,8 +74,9 @@ class ValheimController(AppController):
         if not self._app_attrs['online']:
             await self.message_coordinator(f"{self.name} is Offline")
             return
-        rstr = f'{self.name} - {self.app_type}\n' \
-            f'  version: {self._app_attrs["version"]}\n'
+        rstr = f'{self.name} - {self.app_type}\n'
+        if self._app_attrs.get('version'):
+            rstr += f'  version: {self._app_attrs["version"]}\n'
         for k, v in self._app_attrs['app_info'].items():
             rstr += f'  {k}: {v}\n'
         rstr += f'  {len(self._app_attrs["players"])} player{"s" if len(self._app_attrs["players"]) != 1 else ""} online'
@@ -54,7 +84,5 @@ class ValheimController(AppController):
             rstr += ':'
             for player in self._app_attrs['players'].values():
                 rstr += f'\n    {player}'
-        cpu, mem = self._resource_calc()
-        rstr += f'\n  CPU: {cpu}%'
-        rstr += f'\n  Mem: {mem} GB'
+        rstr += self._status_details()
         await self.message_coordinator(rstr)
\ No newline at end of file
@@ -2,6 +2,7 @@ import asyncio
 import os
 import sys
 import dgsm.controllers.tee_proc as tee
+from dgsm.utils.log_util import make_logger
 
 
 TEE_SCRIPT = tee.__file__
@@ -12,28 +13,130 @@ IS_WINDOWS = os.name == 'nt'
 if IS_WINDOWS:
     from asyncio import windows_utils
     import _winapi
+else:
+    import fcntl
+    import pty
+    import struct
+    import termios
+
+logger = make_logger(__name__)
 
 def NOP(*a, **k): pass
 
+# raise the capacity of the pipe at fd to absorb bursts of output - returns the resulting capacity
+# pipe capacity is only adjustable on linux - returns 0 if the size could not be changed
+def set_pipe_size(fd:int, size:int) -> int:
+    if IS_WINDOWS or not size or not hasattr(fcntl, 'F_SETPIPE_SZ'): return 0
+    try: return fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, size)
+    except OSError as e: # size exceeds /proc/sys/fs/pipe-max-size for unprivileged users
+        logger.warning(f"unable to set pipe size to {size}: {e}")
+        return 0
+
 # returns a 5-tuple - subprocess, readstream, writestream, close_readstream_fn, close_writestream_fn
 # if new_console is false this simply returns a Process, Process.stdout, Process.stdin, NOP, NOP
 # if new_console is true, 2 new streams are created and returned instead of Process.stdin and Process.stdout - leaving stdin/stdout in-tact
 # this is used for 'teeing' the application input/output from/to a new terminal window as well as the main ProcController
-async def create_sub_proc(args:list[str], loop=None, new_console=False, **kwargs):
+# new_console is windows only - other platforms attach terminals to the app's attach socket instead (python -m dgsm attach <app>)
+# pipe_size sets the capacity (bytes) of the pipe carrying the app output (linux only)
+# preexec_fn is run in the child process before the app is executed, i.e. to apply resource limits (posix only)
+# if use_pty is True the app is run under a pseudo-terminal so it line-buffers its output (posix only, ignored with new_console)
+async def create_sub_proc(args:list[str], loop=None, new_console=False, pipe_size:int=0, preexec_fn=None, use_pty=False, **kwargs):
     if not loop: loop = asyncio.get_running_loop()
-    if not new_console: return await get_sub_proc(args)
-    if IS_WINDOWS: return await windows_piped_proc(' '.join(arg for arg in args), loop, **kwargs)
-    return await linux_piped_proc(' '.join(arg for arg in args), loop, **kwargs)
+    new_console = new_console and IS_WINDOWS
+    if use_pty and not new_console:
+        if not IS_WINDOWS: return await pty_proc(args, loop, preexec_fn)
+        logger.warning("pty mode is not supported on windows - using pipes instead")
+    if not new_console: return await get_sub_proc(args, loop, pipe_size, preexec_fn)
+    return await windows_piped_proc(' '.join(arg for arg in args), loop, **kwargs)
 
 # simply create a subprocess and return it along with its stdin and stdout
-async def get_sub_proc(args:list[str]):
-    sub_proc = await asyncio.create_subprocess_exec(
-        *args,
-        stdin=asyncio.subprocess.PIPE,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.STDOUT
-    )
-    return sub_proc, sub_proc.stdout, sub_proc.stdin, NOP, NOP
+# if pipe_size is given the stdout pipe is created here so its capacity can be set before the app starts writing
+async def get_sub_proc(args:list[str], loop=None, pipe_size:int=0, preexec_fn=None):
+    if IS_WINDOWS or not pipe_size:
+        sub_proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            preexec_fn=None if IS_WINDOWS else preexec_fn
+        )
+        return sub_proc, sub_proc.stdout, sub_proc.stdin, NOP, NOP
+
+    if not loop: loop = asyncio.get_running_loop()
+    c2pr, c2pw = os.pipe()
+    set_pipe_size(c2pr, pipe_size)
+    try:
+        sub_proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=c2pw,
+            stderr=c2pw,
+            preexec_fn=preexec_fn
+        )
+    except BaseException:
+        os.close(c2pr)
+        raise
+    finally:
+        os.close(c2pw)
+
+    ## Child to Parent Stream
+    c2p_stream = asyncio.StreamReader()
+    c2p_file = os.fdopen(c2pr, 'rb', buffering=0)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(c2p_stream), c2p_file)
+
+    def close_read_stream():
+        try: c2p_file.close()
+        except OSError: pass
+    return sub_proc, c2p_stream, sub_proc.stdin, close_read_stream, NOP
+
+# create a subprocess whose stdin, stdout and stderr are the slave side of a new pseudo-terminal
+# the app sees a terminal, so it line-buffers its output like it does in an interactive console
+# echo is disabled so input sent to the app is not read back as output
+# the app becomes the leader of a new session with the pseudo-terminal as its controlling terminal
+async def pty_proc(args:list[str], loop, preexec_fn=None, rows:int=50, cols:int=250):
+    master, slave = pty.openpty()
+    attrs = termios.tcgetattr(slave)
+    attrs[3] &= ~(termios.ECHO | termios.ECHONL)
+    termios.tcsetattr(slave, termios.TCSANOW, attrs)
+    fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+
+    def _preexec():
+        try: fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+        except OSError: pass
+        if preexec_fn: preexec_fn()
+
+    try:
+        sub_proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=slave,
+            stdout=slave,
+            stderr=slave,
+            start_new_session=True,
+            preexec_fn=_preexec
+        )
+    except BaseException:
+        os.close(master)
+        raise
+    finally:
+        os.close(slave)
+
+    ## Terminal to Parent Stream
+    rs = asyncio.StreamReader()
+    r_file = os.fdopen(master, 'rb', buffering=0)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(rs), r_file)
+
+    ## Parent to Terminal Stream - written through a duplicate of the master so each transport owns its fd
+    w_file = os.fdopen(os.dup(master), 'wb', buffering=0)
+    transport, proto = await loop.connect_write_pipe(lambda: asyncio.StreamReaderProtocol(asyncio.StreamReader()), w_file)
+    ws = asyncio.StreamWriter(transport, proto, None, loop)
+
+    def close_read_stream():
+        try: r_file.close()
+        except OSError: pass
+    def close_write_stream():
+        try: ws.close()
+        except OSError: pass
+    return sub_proc, rs, ws, close_read_stream, close_write_stream
 
 # create a subprocess with 2 inherited File Handles prepared for overlapped I/O
 async def windows_piped_proc(args:str, loop, **kwargs):
@@ -89,58 +192,3 @@ async def windows_piped_proc(args:str, loop, **kwargs):
         except OSError: pass
    
     return sub_proc, c2p_stream, p2c_stream, close_read_stream, close_write_stream
-
-# create subprocess with inheritable pipes for linux systems
-async def linux_piped_proc(args:str, loop, **kwargs):
-    p2cr, p2cw = os.pipe()
-    c2pr, c2pw = os.pipe()
-
-    env = os.environ.copy()
-    name = kwargs.get('name', '_'.join(arg for arg in args))
-    # the subprocess needs knowledge of these keys at 'compile' time
-    env[P2CR] = str(p2cr)
-    env[C2PW] = str(c2pw)
-    env['proc_name'] = name
-    os.set_inheritable(p2cr, True)
-    os.set_inheritable(c2pw, True)
-
-    sub_proc = await asyncio.create_subprocess_shell(
-        # xterm is not guaranteed to exist...
-        cmd=f'xterm -T {name} -e {sys.executable} {TEE_SCRIPT} {args}',
-        shell=True,
-        env=env,
-        close_fds=False
-    )
-
-    ## Detach File Handles used by child process in *this* process
-    os.close(p2cr)
-    os.close(c2pw)
-   
-    ## Child to Parent Stream
-    c2p_stream = asyncio.StreamReader()
-    await loop.connect_read_pipe(
-        lambda: asyncio.StreamReaderProtocol(c2p_stream),
-        os.fdopen(c2pr)
-    )
-
-    ## Parent to Child Stream
-    rs = asyncio.StreamReader()
-    transport, proto = await loop.connect_write_pipe(
-        lambda: asyncio.StreamReaderProtocol(rs),
-        os.fdopen(p2cw)
-    )
-    p2c_stream = asyncio.StreamWriter(transport, proto, rs, loop)
-
-    ## Verify the PipeHandles are closed
-    def close_read_stream():
-        try:
-            os.close(c2pr)
-        except OSError: pass
-    def close_write_stream():
-        try:
-            p2c_stream.close()
-            os.close(p2cw)
-        except OSError: pass
-   
-    return sub_proc, c2p_stream, p2c_stream, close_read_stream, close_write_stream
-
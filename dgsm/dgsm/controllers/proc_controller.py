@@ -8,33 +8,71 @@ import uuid
 import psutil
 from dgsm.utils.intf_grouping import IGI, AIGI, interface_tag
 from dgsm.controllers import piped_proc
+from dgsm.utils.attach import AttachServer, socket_path
+from dgsm.utils.backup_store import CHUNK_SIZE, BackupStore
+from dgsm.utils.cgroups import CGROUPS, Limits, weight_to_nice
+from dgsm.utils.core_allocator import format_cpus, set_tree_affinity
+from dgsm.utils.flood_control import FloodControl, RateLimiter
+from dgsm.utils.line_reader import MAX_LINE, LineSplitter, read_lines
 from dgsm.utils.log_util import make_logger
+from dgsm.utils.output_archive import OutputArchive
+from dgsm.utils.output_matcher import OutputMatcher, Waiter, WaiterHandle
+from dgsm.utils.proc_tracker import ProcTracker, signal_tree, terminate_tree
+from dgsm.utils.readiness import FutureProbe, Probe, Readiness, build_probes, wait_ready
+from dgsm.utils.scrollback import Scrollback, parse_duration
+from dgsm.utils.subscription import Subscription
 
 
-logger = make_logger()
+logger = make_logger(__name__)
 cmd = interface_tag('cmds')
 
 # ProcController abstract class
 # executes program located at kwargs['prg'] and monitors the new process's stdout
 # exposes start and stop methods to start and stop the process
 class ProcController(ABC, IGI, metaclass=AIGI):
+    # commands sent to the app to stop it gracefully, in order
+    # each step is (command, pattern, timeout) - a step with a pattern waits up to timeout seconds for it to be output
+    STOP_SEQUENCE:tuple[tuple[str, re.Pattern, float], ...] = ()
+    # commands sent before and after a backup is taken while the app is running, i.e. to pause saving
+    BACKUP_BEGIN:tuple[tuple[str, re.Pattern, float], ...] = ()
+    BACKUP_END:tuple[tuple[str, re.Pattern, float], ...] = ()
+
     def __init__(self, name:str, **kwargs) -> None:
         self._app_attrs = {}
         self._app_attrs.update(kwargs)
         self._name = name
         self._prg = kwargs['prg']
         self._msg_cb = kwargs['msg_cb']
+        self._state_cb = kwargs.get('state_cb')
         self._run = False
         self._proc = None
-        self._proc_children = []
+        self._tracker:ProcTracker = None
+        self._limits:dict[str,str] = {}
+        self._cpus:list[int] = []
         self._readstream = None
         self._writestream = None
         self._close_rs = None
         self._close_ws = None
         self._start_comp = None
         self._monitor_task = None
+        self._spawn_task = None
         self._stop_commanded = False
-        self._output_workers:dict[int,Callable] = {}
+        self._subscriptions:dict[str,tuple[Subscription, RateLimiter]] = {}
+        self._attach:AttachServer = None
+        self._matcher = OutputMatcher()
+        self._matcher_task = None
+        self._flood_opts = kwargs.get('opts', {}).get('flood', {})
+        self._stop_opts = kwargs.get('opts', {}).get('stop', {})
+        self._ready_opts = kwargs.get('opts', {}).get('ready', {})
+        self._readiness:Readiness = None
+        self._flood = FloodControl(self._flood_opts.get('summary_interval', 5.0))
+        self._dropped = 0
+        sb_opts = kwargs.get('opts', {}).get('scrollback', {})
+        self._scrollback = Scrollback(sb_opts.get('lines', 2000), sb_opts.get('bytes', 1<<20))
+        self._archive = self._create_archive(kwargs.get('opts', {}).get('archive'))
+        self._backup_opts = kwargs.get('opts', {}).get('backup', {})
+        self._backup_store = self._create_backup_store(self._backup_opts)
+        self._backup_lock = asyncio.Lock()
         self._init_vars()
     
     @abstractclassmethod
@@ -56,6 +94,12 @@ class ProcController(ABC, IGI, metaclass=AIGI):
     def name(self) -> str: return self._name
     @property
     def running(self) -> bool: return self._run
+    # relative number of cpu cores the app is given when cores are partitioned - 0 leaves the app unpinned
+    @property
+    def core_weight(self) -> float: return self._app_attrs.get('opts', {}).get('core_weight', 1)
+    # cpus the app is pinned to - empty if it is not pinned
+    @property
+    def cpus(self) -> list[int]: return list(self._cpus)
 
     # spawn app in new subprocess if it isn't already running. verify app starts and connects
     @cmd('start')
@@ -70,8 +114,8 @@ class ProcController(ABC, IGI, metaclass=AIGI):
         loop = asyncio.get_event_loop()
         self._start_comp = loop.create_future()
         # start the app
-        if msg := await self._on_start_cmd(): await self.message_coordinator(msg)
-        loop.create_task(self._spawn_subprocess())
+        if msg := await self._on_start_cmd(): await self.message_coordinator(msg, progress=f'{self.name}:start')
+        self._spawn_task = loop.create_task(self._spawn_subprocess())
         await self._wait_for_start()
 
     # tries to stop app if possible. verify app has stopped running
@@ -80,19 +124,28 @@ class ProcController(ABC, IGI, metaclass=AIGI):
         """
         Stop the application
         """
+        await self.stop()
+
+    # stop the app gracefully - returns True if the app is no longer running
+    # the STOP_SEQUENCE is sent to the app, then the process tree is sent SIGTERM and finally SIGKILL
+    #   so that the app has exited by deadline (event loop time) - defaults to the 'stop' opts 'timeout' from now
+    # if force is True the implementation is not asked whether the app can be stopped
+    async def stop(self, deadline:float=None, force=False) -> bool:
         if not self._run: # app is already stopped
-            await self.message_coordinator(f'{self.name} is not running')
-            return
-        stop_ok, code = self._stop_ok()
-        if not stop_ok: # implementation determined app cannot be stopped
-            await self.message_coordinator(code)
-            return
-        self._run = False
+            if not force: await self.message_coordinator(f'{self.name} is not running')
+            return True
+        if self._stop_commanded: # a stop is already in progress
+            if not force: await self.message_coordinator(f'{self.name} is already stopping')
+            return False
+        if not force:
+            stop_ok, code = self._stop_ok()
+            if not stop_ok: # implementation determined app cannot be stopped
+                await self.message_coordinator(code)
+                return False
         # stop the app
         self._stop_commanded = True
-        if msg := await self._on_stop_cmd(): await self.message_coordinator(msg)
-        if not self._monitor_task.done(): self._monitor_task.cancel()
-        await self._wait_for_stop()
+        if msg := await self._on_stop_cmd(): await self.message_coordinator(msg, progress=f'{self.name}:stop')
+        return await self._wait_for_stop(deadline)
     
     @cmd('help')
     async def _help(self, *_) -> None:
@@ -107,31 +160,120 @@ class ProcController(ABC, IGI, metaclass=AIGI):
             msg += '\n'
         await self.message_coordinator(msg)
     
-    # indescriminately stop the app
-    async def force_stop(self) -> None:
-        if not self._run: # app is already stopped
+    @cmd('tail')
+    async def _tail(self, *args) -> None:
+        """
+        Returns the most recent output of the application (default 20 lines)
+        """
+        try: n = int(args[0]) if args else 20
+        except ValueError:
+            await self.message_coordinator(f"'{args[0]}' is not a number of lines")
             return
-        self._run = False
-        self._stop_commanded = True
-        if not self._monitor_task.done(): self._monitor_task.cancel()
-        try: # wait until the process has ended
-            await asyncio.wait_for(self._proc.wait(), 5)
-            logger.info(f"{self.name} has been force stopped")
-        except asyncio.TimeoutError: pass
-        await asyncio.sleep(0)
+        if not (lines := self._scrollback.tail(n)):
+            await self.message_coordinator(f"No output from {self.name} has been recorded")
+            return
+        await self.message_coordinator('\n'.join(lines))
+
+    @cmd('since')
+    async def _since(self, *args) -> None:
+        """
+        Returns the output of the application within a duration (i.e. 30s, 5m, 1h)
+        """
+        try: seconds = parse_duration(' '.join(args))
+        except ValueError:
+            await self.message_coordinator(f"Must specify a duration such as 30s, 5m or 1h")
+            return
+        if not (lines := self._scrollback.since(seconds)):
+            await self.message_coordinator(f"No output from {self.name} has been recorded in that time")
+            return
+        await self.message_coordinator('\n'.join(lines))
+
+    @cmd('backup')
+    async def _backup(self, *_) -> None:
+        """
+        Takes an incremental backup of the application's world
+        """
+        if not self._backup_store:
+            await self.message_coordinator(f"Backups are not configured for {self.name}")
+            return
+        if self._backup_lock.locked():
+            await self.message_coordinator(f"A backup of {self.name} is already in progress")
+            return
+        async with self._backup_lock:
+            await self.message_coordinator(f"Backing up {self.name}", progress=f'{self.name}:backup')
+            try: await self.message_coordinator(await self._take_backup(), progress=f'{self.name}:backup')
+            except (OSError, ValueError) as e:
+                logger.exception(f"backup of {self.name} failed")
+                await self.message_coordinator(f"Backup of {self.name} failed: {e}", progress=f'{self.name}:backup')
+
+    @cmd('restore')
+    async def _restore(self, *args) -> None:
+        """
+        Lists the backups of the application, or restores one by name or 'latest' (the application must be stopped)
+        """
+        if not self._backup_store:
+            await self.message_coordinator(f"Backups are not configured for {self.name}")
+            return
+        snaps = await asyncio.to_thread(self._backup_store.snapshots)
+        if not args or not args[0].strip():
+            if not snaps: msg = f"{self.name} has no backups"
+            else: msg = f'{self.name} backups:\n' + '\n'.join(f'  {snap}' for snap in snaps[-10:])
+            await self.message_coordinator(msg)
+            return
+        snap = args[0].strip()
+        if snap == 'latest' and snaps: snap = snaps[-1]
+        if snap not in snaps:
+            await self.message_coordinator(f"{self.name} has no backup '{snap}'")
+            return
+        if self.running or self._backup_lock.locked():
+            await self.message_coordinator(f"{self.name} must be stopped to restore a backup")
+            return
+        async with self._backup_lock:
+            await self.message_coordinator(f"Restoring {self.name} backup {snap}", progress=f'{self.name}:restore')
+            try: written, deleted = await asyncio.to_thread(self._backup_store.restore, snap, self._backup_opts['path'])
+            except (OSError, ValueError) as e:
+                logger.exception(f"restore of {self.name} backup {snap} failed")
+                await self.message_coordinator(f"Restore of {self.name} failed: {e}", progress=f'{self.name}:restore')
+                return
+            await self.message_coordinator(f"Restored {self.name} backup {snap} - {written} files written, {deleted} removed", progress=f'{self.name}:restore')
+
+    # indescriminately stop the app
+    async def force_stop(self, deadline:float=None) -> bool:
+        return await self.stop(deadline, force=True)
 
     # write a message to the coordinator
+    # messages sharing a progress key are updates of one operation (i.e. starting, then started) - the bot edits its previous update
     async def message_coordinator(self, message, **kwargs) -> None:
         await self._msg_cb(message, **kwargs)
 
+    # tell the coordinator the app has started or stopped running
+    async def _notify_state(self) -> None:
+        if self._attach: self._attach.state_changed()
+        if not self._state_cb: return
+        try: await self._state_cb(self)
+        except Exception: logger.exception(f"state callback failed for {self.name}")
+
+    # pin the app's process tree to cpus - children spawned later inherit the affinity
+    async def set_affinity(self, cpus:list[int]) -> None:
+        self._cpus = list(cpus)
+        if not self._tracker or not cpus: return
+        procs = await asyncio.to_thread(self._tracker.discover)
+        pinned = await asyncio.to_thread(set_tree_affinity, procs, cpus)
+        logger.info(f"{self.name} pinned to cpus {format_cpus(cpus)} ({pinned} threads)")
+
     # spawn a new subprocess to run the app - await the monitor_task until it is cancelled
     async def _spawn_subprocess(self) -> None:
         self._run = True
         try:
             args = self._prg if type(self._prg) is list else [self._prg]
+            opts = self._app_attrs.get('opts', {})
+            preexec_fn = await self._apply_limits(opts.get('limits'))
             self._proc, self._readstream, self._writestream, self._close_rs, self._close_ws = await piped_proc.create_sub_proc(
                 args,
-                new_console=self._app_attrs.get('opts', {}).get('new_console', False),
+                new_console=opts.get('new_console', False),
+                pipe_size=opts.get('pipe_size', 0),
+                preexec_fn=preexec_fn,
+                use_pty=opts.get('pty', False),
                 name=self.name,
                 **self._app_attrs
             )
@@ -140,12 +282,16 @@ class ProcController(ABC, IGI, metaclass=AIGI):
             logger.warning(f"unable to locate the executable {self._prg} for {self.name}")
             self._proc = self._readstream = self._writestream = self._close_rs = self._close_ws = None
             self._run = False
-            self._proc_children = []
-            self._output_workers = {}
+            self._close_subscriptions()
             self._stop_commanded = False
             self._init_vars()
             return
 
+        # track the resource usage of the app's process tree while it runs
+        self._tracker = ProcTracker(self._proc.pid, self._app_attrs.get('opts', {}).get('track_interval', 5.0))
+        self._tracker.start()
+        await self._notify_state()
+
         # schedule the monitoring and wait until task has ended
         self._monitor_task = asyncio.get_event_loop().create_task(self._monitor_stdout())
         try: await self._monitor_task # this will infinite loop until task is cancelled or subprocess ends
@@ -154,82 +300,344 @@ class ProcController(ABC, IGI, metaclass=AIGI):
         # monitoring has stopped or been cancelled - terminate
         await self._terminate_proc()
 
-    # read stdout line by line and send to active output workers to be processed
+    # read stdout in large blocks and publish each batch of decoded lines to the subscriptions
+    # decoding is controlled by the 'encoding', 'errors' and 'max_line' opts
+    # every line is passed to the output_handler implementation, the archive and all unsampled subscriptions
+    # sampled subscriptions and the scrollback receive the output after flood control
     async def _monitor_stdout(self) -> None:
-        # create an output worker to send app output to the output_handler implementation
-        self.output_worker(self._output_handler)
-        if self._readstream:
-            logger.info(f"{self.name} output monitoring has started")
-            while self._run:
-                line = b''
-                try: line = await self._readstream.readline()
-                except: break
-                if not line or not self._run: break
-                for worker in self._output_workers.values(): worker(line.decode())
+        # all output waiters are served by the shared matcher - it must see every line, so it blocks the reader if it falls behind
+        matcher_sub = self.subscribe(maxsize=1 << 14, overflow='block', batch=True)
+        self._matcher_task = asyncio.get_event_loop().create_task(self._feed_matcher(matcher_sub))
+        if not self._readstream: return
+        opts = self._app_attrs.get('opts', {})
+        splitter = LineSplitter(
+            encoding=opts.get('encoding', 'utf-8'),
+            errors=opts.get('errors', 'replace'),
+            max_line=opts.get('max_line', MAX_LINE),
+            terminal=opts.get('pty', False)
+        )
+        logger.info(f"{self.name} output monitoring has started")
+        flusher = asyncio.get_event_loop().create_task(self._flush_flood()) if self._flood_opts.get('enabled', True) else None
+        try:
+            async for lines in read_lines(self._readstream, splitter):
+                if not self._run: break
+                if self._archive: self._archive.write(lines)
+                relevant = self._handle_lines(lines)
+                if self._flood_opts.get('enabled', True): sampled, kept = self._flood.filter(lines, relevant)
+                else: sampled, kept = lines, None
+                self._scrollback.extend(sampled)
+                await self._publish(lines, sampled, kept)
+        except (OSError, ValueError, LookupError) as e:
+            logger.error(f"{self.name} output monitoring stopped: {e!r}")
+        finally:
+            if flusher: flusher.cancel()
+        if summary := self._flood.flush(): await self._publish_summary(summary)
+        if splitter.truncated: logger.warning(f"{self.name} truncated {splitter.truncated} over-long output lines")
+
+    # queue the lines for every subscription without waiting on any consumer
+    # sampled subscriptions get the flood controlled lines, limited to the 'flood' opts 'rate' - kept is None if flood control is off
+    # the reader only waits for 'block' subscriptions that are full
+    async def _publish(self, lines:list[str], sampled:list[str], kept:set[int]) -> None:
+        blocked = []
+        for sub, limiter in tuple(self._subscriptions.values()):
+            if not limiter: sub.publish(lines)
+            elif kept is None: sub.publish(sampled)
+            elif out := limiter.limit(sampled, kept): sub.publish(out)
+            if sub.overflow == 'block' and sub.full: blocked.append(sub)
+        for sub in blocked: await sub.wait_space()
+
+    # summarize a flood once the output has been quiet for a second - otherwise it is only summarized by the next output
+    async def _flush_flood(self) -> None:
+        while True:
+            await asyncio.sleep(1.0)
+            if summary := self._flood.flush(idle=1.0): await self._publish_summary(summary)
+
+    # flood summaries go wherever the collapsed lines would have gone, they are never rate limited
+    async def _publish_summary(self, summary:list[str]) -> None:
+        self._scrollback.extend(summary)
+        await self._publish([], summary, set(range(len(summary))))
+
+    async def _feed_matcher(self, sub:Subscription) -> None:
+        async for lines in sub: self._matcher.feed(lines)
+
+    # pass each line to the output_handler implementation
+    # returns the indexes of the lines that were handled - these are never collapsed or dropped by flood control
+    def _handle_lines(self, lines:list[str]) -> set[int]:
+        relevant = set()
+        for i, line in enumerate(lines):
+            try:
+                if self._output_handler(line): relevant.add(i)
+            except Exception: logger.exception(f"{self.name} output handler failed on: {line}")
+        return relevant
+
+    # prepare the resource limits described by the 'limits' opt before the app is spawned
+    # the app is placed in its own cgroup when cgroups are delegated to dgsm - otherwise only nice is used
+    # limits that can not be applied are shown as unenforced in the status
+    # returns the function to run in the child process, or None if there are no limits
+    async def _apply_limits(self, cfg:dict) -> Callable[[], None]:
+        self._limits = {}
+        if not cfg or os.name == 'nt': return None
+        try: limits = Limits(**cfg)
+        except (TypeError, ValueError) as e:
+            logger.error(f"invalid limits for {self.name}: {e}")
+            return None
+        if path := await asyncio.to_thread(CGROUPS.create, self.name, limits):
+            self._limits = await asyncio.to_thread(CGROUPS.effective, path)
+            preexec = limits.preexec(os.path.join(path, 'cgroup.procs'))
+        else:
+            if (nice := limits.nice) is None and limits.cpu_weight is not None: nice = weight_to_nice(limits.cpu_weight)
+            if nice is not None: self._limits['nice'] = str(nice)
+            preexec = limits.preexec()
+        for name in limits.unenforced(bool(path)): self._limits[name] = 'unenforced'
+        return preexec
+
+    # formatted resource limits for status messages - empty if the app has no limits
+    def _limits_status(self) -> str:
+        if not self._limits or not self._run: return ''
+        return f'\n  Limits: {", ".join(f"{k}={v}" for k, v in self._limits.items())}'
+
+    # resource usage, limits, pinned cpus and flood control counters for status messages
+    def _status_details(self) -> str:
+        cores = f'\n  Cores: {format_cpus(self._cpus)}' if self._cpus else ''
+        return self._resource_status() + self._limits_status() + cores + self._flood_status()
+
+    # counters of lines collapsed and dropped by flood control
+    @property
+    def flood_stats(self) -> dict[str,int]:
+        dropped = self._dropped + sum(sub.dropped + (limiter.dropped if limiter else 0) for sub, limiter in self._subscriptions.values())
+        return {'collapsed': self._flood.collapsed, 'dropped': dropped}
+
+    # formatted flood control counters for status messages - empty if nothing was collapsed or dropped
+    def _flood_status(self) -> str:
+        stats = self.flood_stats
+        if not any(stats.values()): return ''
+        return f'\n  Output: {stats["collapsed"]} repeated lines collapsed, {stats["dropped"]} lines dropped'
 
     # attempt to stop the process running the app
     async def _terminate_proc(self) -> None:
         self._close_rs()
         self._close_ws()
-        try: # add any more child processes to the list before termination
-            if self._proc:
-                self._proc_children.extend(psutil.Process(self._proc.pid).children(recursive=True))
-        except psutil.NoSuchProcess: pass
-
-        # stop all child processes
-        for child in self._proc_children:
-            try: child.terminate()
-            except psutil.NoSuchProcess: pass
-        
+        if self._archive: self._archive.close()
+        if self._tracker:
+            self._tracker.stop()
+            # pick up any child processes spawned since the last discovery, then stop them all
+            # the root may already be gone, so children are told apart by pid rather than position
+            await asyncio.to_thread(self._tracker.discover)
+            if children := self._tracker.children:
+                if killed := await asyncio.to_thread(terminate_tree, children, self._stop_opts.get('term_grace', 10) / 2):
+                    logger.warning(f"{self.name} had {len(killed)} processes killed after they ignored SIGTERM")
+
         self._readstream = self._writestream = self._close_rs = self._close_ws = None
         self._run = False
-        self._proc_children = []
-        self._output_workers = {}
+        self._tracker = None
+        self._cpus = []
+        self._close_subscriptions()
+        # let the matcher see the last lines before the remaining waiters are given up on
+        if self._matcher_task:
+            try: await asyncio.wait_for(self._matcher_task, 1.0)
+            except asyncio.TimeoutError: pass
+            self._matcher_task = None
+        self._matcher.clear()
         if not self._stop_commanded:
             logger.warning(f"{self.name} was terminated unexpectedly")
             if (msg := await self._on_stop()): await self.message_coordinator(msg)
         self._stop_commanded = False
         self._init_vars()
         self._proc = None
+        await self._notify_state()
 
-    # check app started with timeout
+    # wait for the app to become ready - the readiness probes are configured by the 'ready' opts
+    # the implementation's own online detection (_start_comp) is always one of the probes
+    # gives up after the 'ready' opts 'timeout' seconds, or as soon as the app exits
     async def _wait_for_start(self):
-        try: # wait for the implementation to determine app has started successfully
-            await asyncio.wait_for(self._start_comp, 90)
-            # snapshot the children processes now since the app is fully started
-            self._proc_children = psutil.Process(self._proc.pid).children(recursive=True)
-            for p in self._proc_children:
-                p.cpu_percent()
-        except asyncio.TimeoutError: # app did not start
-            if msg := await self._on_start_fail(): await self.message_coordinator(msg)
-            logger.warning(f"{self.name} failed to start")
+        probes = [*self._default_probes(), *build_probes(self._ready_opts.get('probes'))]
+        self._readiness = await wait_ready(
+            self,
+            probes,
+            timeout=self._ready_opts.get('timeout', 90),
+            require=self._ready_opts.get('require', 'any'),
+            abort=self._spawn_task
+        )
+        if not self._readiness: # app did not start
+            if msg := await self._on_start_fail(): await self.message_coordinator(f'{msg}\n{self._readiness}', progress=f'{self.name}:start')
+            logger.warning(f"{self.name} failed to start: {self._readiness}")
             return
-        logger.info(f"{self.name} has been started")
-        if msg := await self._on_start(): await self.message_coordinator(msg)
-
-    # check process terminated with timeout
-    async def _wait_for_stop(self):
-        try: # wait until the process has ended
-            await asyncio.wait_for(self._proc.wait(), 30)
-            if msg := await self._on_stop(): await self.message_coordinator(msg)
+        # resolve _start_comp for implementations that have not detected startup themselves
+        try: self._start_comp.set_result(True)
+        except asyncio.InvalidStateError: pass
+        # the app is fully started - discover the processes it spawned during startup now
+        if self._tracker: await self._tracker.refresh()
+        if self._cpus: await self.set_affinity(self._cpus)
+        logger.info(f"{self.name} has been started: {self._readiness}")
+        if msg := await self._on_start(): await self.message_coordinator(f'{msg}\nReady: {self._readiness}', progress=f'{self.name}:start')
+
+    # probes that are always part of readiness - implementations resolve _start_comp once they detect startup
+    def _default_probes(self) -> list[Probe]:
+        return [FutureProbe(self._start_comp)]
+
+    # wait for pattern to be output, even if the app is not running yet
+    # returns the match, or None if a timeout occurs - set timeout <= 0 to run this without a time constraint
+    async def wait_for_output(self, pattern:re.Pattern, timeout:float=0.0) -> re.Match:
+        waiter = Waiter(asyncio.get_running_loop(), pattern=pattern)
+        return await self._add_waiter(waiter, timeout, lambda w, _: w.match)()
+
+    # drain the app and report the result
+    async def _wait_for_stop(self, deadline:float=None) -> bool:
+        if deadline is None: deadline = asyncio.get_running_loop().time() + self._stop_opts.get('timeout', 30)
+        if await self._drain(deadline):
+            # let the spawn task finish its cleanup so the app is fully stopped before reporting it
+            if self._spawn_task: await asyncio.shield(self._spawn_task)
+            if msg := await self._on_stop(): await self.message_coordinator(msg, progress=f'{self.name}:stop')
             logger.info(f"{self.name} has been stopped")
-        except asyncio.TimeoutError: # could not stop the subprocess for some reason
-            if msg := await self._on_stop_fail(): await self.message_coordinator(msg)
-            logger.warning(f"{self.name} failed to stop")
-            self._run = True
-            self._stop_commanded = False
-    
+            return True
+        # could not stop the subprocess for some reason
+        if msg := await self._on_stop_fail(): await self.message_coordinator(msg, progress=f'{self.name}:stop')
+        logger.warning(f"{self.name} failed to stop")
+        self._stop_commanded = False
+        return False
+
+    # bring the app down by deadline - returns True if the process has exited
+    # the STOP_SEQUENCE is sent and the app is given until 'term_grace' seconds before the deadline to exit on its own
+    #   apps without a STOP_SEQUENCE have their pipes closed instead
+    # the process tree is then sent SIGTERM, and anything left at the deadline is sent SIGKILL
+    async def _drain(self, deadline:float) -> bool:
+        if not (proc := self._proc): return True
+        loop = asyncio.get_running_loop()
+        term_at = max(deadline - self._stop_opts.get('term_grace', 10), loop.time())
+        remaining = lambda until: max(until - loop.time(), 0)
+        if self.STOP_SEQUENCE:
+            try: await asyncio.wait_for(self._send_sequence(self.STOP_SEQUENCE), remaining(term_at))
+            except asyncio.TimeoutError: logger.warning(f"{self.name} did not complete its stop sequence in time")
+        elif self._monitor_task and not self._monitor_task.done(): self._monitor_task.cancel()
+        for kill, until in ((False, term_at), (True, deadline), (None, None)):
+            # after SIGKILL allow a moment for the process to be reaped
+            if until is None: until = loop.time() + 5
+            try:
+                await asyncio.wait_for(asyncio.shield(proc.wait()), remaining(until))
+                break
+            except asyncio.TimeoutError:
+                if kill is None: break
+            logger.warning(f"{self.name} did not exit in time, sending {'SIGKILL' if kill else 'SIGTERM'}")
+            procs = await asyncio.to_thread(self._tracker.discover) if self._tracker else []
+            if not procs:
+                try: procs = [psutil.Process(proc.pid)]
+                except (psutil.NoSuchProcess, psutil.ZombieProcess): pass
+            await asyncio.to_thread(signal_tree, procs, kill)
+        if proc.returncode is None: return False
+        # the process has exited - grandchildren can keep the pipes open, so stop monitoring now
+        if self._monitor_task and not self._monitor_task.done(): self._monitor_task.cancel()
+        return True
+
+    # send each step of a command sequence to the app, waiting for its pattern before moving to the next step
+    async def _send_sequence(self, steps:tuple[tuple[str, re.Pattern, float], ...]) -> None:
+        for command, pattern, timeout in steps:
+            waiter = self.output_waiter(pattern=pattern, timeout=timeout) if pattern else None
+            try:
+                if not await self.message_app(command): return
+            except (ConnectionError, OSError): return # stdin is already closed
+            if waiter and not await waiter(): logger.warning(f"{self.name} did not respond to '{command}'")
+
+    # back up the world directory given by the 'backup' opts 'path' - returns a summary of the backup
+    # a running app is sent BACKUP_BEGIN, the changed files are reflinked into staging (or hashed in place if the
+    #   filesystem cannot reflink) and BACKUP_END is sent - hashing staged files happens after the app has resumed
+    async def _take_backup(self) -> str:
+        store, world = self._backup_store, self._backup_opts['path']
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        previous = await asyncio.to_thread(store.latest)
+        paused = self.running
+        entries = None
+        if paused: await self._send_sequence(self.BACKUP_BEGIN)
+        try:
+            unchanged, changed = await asyncio.to_thread(store.scan, world, previous)
+            if not (source := await asyncio.to_thread(store.stage, world, changed) if paused else None):
+                entries = await self._store_files(world, changed)
+        finally:
+            if paused: await self._send_sequence(self.BACKUP_END)
+        paused_for = loop.time() - start if paused else 0.0
+        if entries is None: entries = await self._store_files(source, changed)
+        written = sum(w for _, w in entries.values())
+        files = {**unchanged, **{rel: entry for rel, (entry, _) in entries.items()}}
+        info = {'changed': len(changed), 'written': written}
+        snap = await asyncio.to_thread(store.commit, files, info)
+        pruned, _ = await asyncio.to_thread(
+            store.prune,
+            self._backup_opts.get('keep_last', 10),
+            self._backup_opts.get('keep_daily', 7),
+            self._backup_opts.get('keep_weekly', 4)
+        )
+        msg = f"Backed up {self.name} as {snap} - {len(changed)} of {len(files)} files changed, {round(written / 1024**2, 1)} MB written"
+        msg += f" in {round(loop.time() - start, 1)}s"
+        if paused: msg += f", saving paused for {round(paused_for, 1)}s"
+        if pruned: msg += f", {pruned} old backups removed"
+        logger.info(msg)
+        return msg
+
+    # hash and store the changed files on the backup thread pool
+    async def _store_files(self, root:str, changed:dict[str,os.stat_result]) -> dict[str,tuple[dict,int]]:
+        loop = asyncio.get_running_loop()
+        store = self._backup_store
+        pool = store.workers()
+        try: results = await asyncio.gather(*(loop.run_in_executor(pool, store.store_file, root, rel, st) for rel, st in changed.items()))
+        finally: pool.shutdown(wait=False) # the workers exit once idle, without holding up the event loop
+        return dict(zip(changed, results))
+
+    # create the backup store described by the 'backup' opts - the world directory is given by 'path'
+    def _create_backup_store(self, cfg:dict) -> BackupStore:
+        if not cfg: return None
+        if not cfg.get('path'):
+            logger.error(f"backups for {self.name} need the 'path' of the world directory")
+            return None
+        fname = re.sub(r'[^\w.-]', '_', self.name)
+        try:
+            return BackupStore(
+                path=cfg.get('dest', os.path.join(os.getcwd(), 'backups', fname)),
+                chunk_size=cfg.get('chunk_size', CHUNK_SIZE),
+                threads=cfg.get('threads', 2)
+            )
+        except OSError as e:
+            logger.error(f"unable to create the backup store for {self.name}: {e}")
+            return None
+
+    # create the output archive described by the 'archive' opt - True uses the defaults
+    def _create_archive(self, cfg:dict|bool) -> OutputArchive:
+        if not cfg: return None
+        if cfg is True: cfg = {}
+        fname = re.sub(r'[^\w.-]', '_', self.name)
+        max_age = cfg.get('max_age', 86400)
+        try:
+            return OutputArchive(
+                path=cfg.get('path', os.path.join(os.getcwd(), 'archive', fname)),
+                name=fname,
+                max_bytes=cfg.get('max_bytes', 1<<26),
+                max_age=parse_duration(max_age) if type(max_age) is str else max_age,
+                keep=cfg.get('keep', 0),
+                compress=cfg.get('compress', True)
+            )
+        except (OSError, ValueError) as e:
+            logger.error(f"unable to create the output archive for {self.name}: {e}")
+            return None
+
+    # latest resource usage sample of the app's process tree - empty if the app is not running
+    # cpu (%), mem (bytes), threads, fds (handles on windows), read_bytes, write_bytes, procs, ts
+    @property
+    def resource_stats(self) -> dict:
+        return dict(self._tracker.stats) if self._tracker else {}
+
     # returns a tuple containing cpu usage (%), mem usage (GB)
     def _resource_calc(self) -> tuple:
-        if not self._proc: return ''
-        mem = 0
-        cpu = 0
-        for p in self._proc_children:
-            mem += p.memory_info().rss
-            cpu += p.cpu_percent()
-        mem = round(mem / 1024**3, 1)
-        cpu = round(cpu/psutil.cpu_count())
-        return cpu, mem
+        if not (stats := self.resource_stats): return 0, 0
+        return round(stats['cpu']), round(stats['mem'] / 1024**3, 1)
+
+    # formatted resource usage for status messages
+    def _resource_status(self) -> str:
+        if not (stats := self.resource_stats): return ''
+        cpu, mem = self._resource_calc()
+        rstr = f'\n  CPU: {cpu}%'
+        rstr += f'\n  Mem: {mem} GB'
+        rstr += f'\n  Processes: {stats["procs"]}, Threads: {stats["threads"]}, Open files: {stats["fds"]}'
+        rstr += f'\n  Disk I/O: {round(stats["read_bytes"] / 1024**2)} MB read, {round(stats["write_bytes"] / 1024**2)} MB written'
+        return rstr
     
     # awaited when app starts successfully
     # return message as string
@@ -248,7 +656,6 @@ class ProcController(ABC, IGI, metaclass=AIGI):
 
     # awaited when app stops successfully
     async def _on_stop(self) -> str:
-        await asyncio.sleep(2)
         return f"{self.name} has stopped"
 
     # awaited when app fails to stop in alloted time
@@ -269,21 +676,63 @@ class ProcController(ABC, IGI, metaclass=AIGI):
         await self._writestream.drain()
         return True
     
-    # creates an output worker to process app output
-    # fn defines the functionality of the worker - a callable that accepts a single string as input
-    # returns a function that will cancel the worker when called
-    def output_worker(self, fn:Callable[[str], None]):
-        def _worker(output:str):
-            fn(output)
-        
-        # add worker to the active workers dict
+    # open the app's attach socket so terminals can attach to it with 'python -m dgsm attach <name>' (posix only)
+    # returns the path of the socket, or None if attaching is not available - disabled with the 'attach' opts set to False
+    async def start_attach(self, directory:str=None) -> str | None:
+        if self._attach or os.name == 'nt' or self._app_attrs.get('opts', {}).get('attach', True) is False: return None
+        attach = AttachServer(self, socket_path(self.name, directory))
+        try: await attach.start()
+        except OSError as e:
+            logger.error(f"unable to open the attach socket of {self.name}: {e}")
+            return None
+        self._attach = attach
+        return attach.path
+
+    def close_attach(self) -> None:
+        if self._attach: self._attach.close()
+        self._attach = None
+
+    # subscribe to app output - returns a Subscription to consume with 'async for'
+    # filter selects the lines to receive: a sub string, a compiled pattern or a callable returning True for wanted lines
+    # each subscription has its own queue of up to maxsize lines, the reader never waits for a consumer unless overflow is 'block'
+    # overflow is 'drop_oldest', 'drop_new' or 'block' - see Subscription
+    # if batch is True the lines read together are yielded as a list instead of one by one
+    # sampled subscriptions (i.e. display) receive the output after flood control and are limited to the 'flood' opts 'rate' lines/sec
+    # iteration ends when the subscription is closed, or the app stops
+    def subscribe(self, filter:str|re.Pattern|Callable[[str], bool]=None, maxsize:int=1000, overflow:str='drop_oldest', batch=False, sampled=False) -> Subscription:
+        sub = Subscription(filter, maxsize, overflow, batch)
         key = uuid.uuid4().hex
-        self._output_workers[key] = _worker
+        limiter = RateLimiter(self._flood_opts.get('rate', 50), self._flood_opts.get('burst', 200)) if sampled else None
+        self._subscriptions[key] = (sub, limiter)
+        sub._on_close = lambda: self._unsubscribe(key)
+        return sub
+
+    def _unsubscribe(self, key:str) -> None:
+        if entry := self._subscriptions.pop(key, None):
+            sub, limiter = entry
+            self._dropped += sub.dropped + (limiter.dropped if limiter else 0)
 
-        def _cancel_worker():
-            self._output_workers.pop(key, None)
-        
-        return _cancel_worker
+    # close every subscription - their consumers still receive the queued lines
+    def _close_subscriptions(self) -> None:
+        for sub, _ in tuple(self._subscriptions.values()): sub.close()
+
+    # creates an output worker to process app output
+    # fn defines the functionality of the worker - a callable that accepts a single string (line) as input
+    # if batch is True, fn is instead called once per read with the list of lines received
+    # the worker runs in its own task fed by a subscription
+    # critical workers receive every line - once one falls 16k lines behind, reading the app's output waits for it to catch up
+    # non-critical workers (i.e. display) receive the output after flood control, are limited to the 'flood' opts 'rate' lines/sec
+    #   and drop the oldest lines when they fall behind instead of stalling the app
+    # returns a function that will cancel the worker when called
+    def output_worker(self, fn:Callable[[str], None] | Callable[[list[str]], None], batch=False, critical=True):
+        sub = self.subscribe(maxsize=1 << 14, overflow='block' if critical else 'drop_oldest', batch=True, sampled=not critical)
+        async def _work():
+            async for lines in sub:
+                for item in (lines,) if batch else lines:
+                    try: fn(item)
+                    except Exception: logger.exception(f"{self.name} output worker failed")
+        asyncio.get_event_loop().create_task(_work())
+        return sub.close
     
     ### overloaded functions that handle creating and deleting workers - returning a coroutine to await for the work to be complete ###
     
@@ -302,10 +751,32 @@ class ProcController(ABC, IGI, metaclass=AIGI):
     def output_waiter(self, pattern:re.Pattern, timeout:float=3.0) -> Coroutine[Any, Any, re.Match]: pass
     
     # returns dispatched method if app is running
+    # the first argument may also be given by keyword, i.e. output_waiter(pattern=...)
     def output_waiter(self, *args, **kwargs) -> Coroutine[Any, Any, str] | None:
         if not self.running: return None
+        if not args:
+            for kw in ('output_count', 'wait_time', 'sub_string', 'pattern'):
+                if kw in kwargs:
+                    args = (kwargs.pop(kw),)
+                    break
         return self.output_waiter_imp(*args, **kwargs)
-    
+
+    # registers waiter with the shared output matcher and returns the awaitable for its result
+    # the waiter is removed once the awaiter completes, or if the awaiter is discarded without being awaited
+    # result is called with the waiter once it is resolved (satisfied is False if a timeout occurred)
+    def _add_waiter(self, waiter:Waiter, timeout:float, result:Callable[[Waiter, bool], Any]):
+        # owned by a handle in the closure - a running coroutine keeps it alive after awaiter itself is dropped
+        handle = WaiterHandle()
+        async def awaiter():
+            try:
+                if timeout > 0.0: satisfied = await asyncio.wait_for(asyncio.shield(waiter.fut), timeout)
+                else: satisfied = await waiter.fut
+            except asyncio.TimeoutError: satisfied = False
+            finally: handle.stop()
+            return result(waiter, satisfied)
+        handle.stop = self._matcher.add(waiter, owner=handle)
+        return awaiter
+
     # wait until a specified number of responses have been received
     # all output responses are concatenated and returned as a string once the specified number is reached or a timeout occurs
     # if return_partial is True then the current aggregated output is returned when a timeout occurs - otherwise an empty string is returned
@@ -313,58 +784,18 @@ class ProcController(ABC, IGI, metaclass=AIGI):
     @singledispatchmethod
     def output_waiter_imp(self, output_count:int, return_partial=True, timeout:float=3.0) -> Coroutine[Any, Any, str]:
         if output_count <= 0: raise ValueError("output_count must be greater than zero")
-        fut = asyncio.get_event_loop().create_future()
-        aggregated_str = ''
-        count = 0
-        # aggregate all strings until the output count is reached
-        def worker(output:str):
-            nonlocal aggregated_str
-            nonlocal count
-            aggregated_str += output
-            count += 1
-            if count >= output_count: fut.set_result(True)
-        
-        # add worker to the active workers dict
-        stop_worker = self.output_worker(worker)
-        
-        # awaitable coro for the result
-        async def awaiter():
-            nonlocal aggregated_str
-            if timeout > 0.0:
-                try: await asyncio.wait_for(fut, timeout)
-                except asyncio.TimeoutError:
-                    if not return_partial: aggregated_str = ''
-                finally: stop_worker()
-            else:
-                await fut
-                stop_worker()
-            return aggregated_str
-        return awaiter
-    
+        waiter = Waiter(asyncio.get_event_loop(), count=output_count)
+        return self._add_waiter(waiter, timeout, lambda w, ok: w.output if ok or return_partial else '')
+
     # collect and aggregate output for a specified amount of time
     # after time has elapsed, return the aggregated output as a string
     # @overload
     @output_waiter_imp.register
     def _(self, wait_time:float) -> Coroutine[Any, Any, str]:
         if wait_time <= 0: raise ValueError("wait_time must be greater than zero")
-        fut = asyncio.get_event_loop().create_future()
-        aggregated_str = ''
-        # aggregate all output
-        def worker(output:str):
-            nonlocal aggregated_str
-            aggregated_str += output
-        
-        # add worker to the active workers dict
-        stop_worker = self.output_worker(worker)
-        
-        # awaitable coro for the result
-        async def awaiter():
-            try: await asyncio.wait_for(fut, wait_time)
-            except asyncio.TimeoutError: pass
-            finally: stop_worker()
-            return aggregated_str
-        return awaiter
-    
+        waiter = Waiter(asyncio.get_event_loop(), aggregate=True)
+        return self._add_waiter(waiter, wait_time, lambda w, _: w.output)
+
     # wait until a specifed sub string is found in app output
     # if aggregate is true, all output from the time this is called will be concatenated and returned once the sub string is found
     #   otherwise just the specific output response containing the substring is returned
@@ -375,37 +806,9 @@ class ProcController(ABC, IGI, metaclass=AIGI):
     @output_waiter_imp.register
     def _(self, sub_string:str, aggregate=False, return_partial=False, timeout:float=3.0) -> Coroutine[Any, Any, str]:
         if not sub_string: raise ValueError("sub_string must be a non-empty string")
-        fut = asyncio.get_event_loop().create_future()
-        aggregated_str = ''
-        # only return the output if it contains sub_string
-        def worker(output:str):
-            nonlocal aggregated_str
-            if sub_string in output:
-                aggregated_str = f'{output}{os.linesep}'
-                fut.set_result(True)
-        # aggregate all strings until the sub_string is found
-        def worker_agg(output:str):
-            nonlocal aggregated_str
-            aggregated_str += output
-            if sub_string in output: fut.set_result(True)
-        
-        # add worker to the active workers dict
-        stop_worker = self.output_worker(worker if not aggregate else worker_agg)
-        
-        # awaitable coro for the result
-        async def awaiter():
-            nonlocal aggregated_str
-            if timeout > 0.0:
-                try: await asyncio.wait_for(fut, timeout)
-                except asyncio.TimeoutError:
-                    if not return_partial: aggregated_str = ''
-                finally: stop_worker()
-            else:
-                await fut
-                stop_worker()
-            return aggregated_str
-        return awaiter
-    
+        waiter = Waiter(asyncio.get_event_loop(), sub_string=sub_string, aggregate=aggregate)
+        return self._add_waiter(waiter, timeout, lambda w, ok: w.output if ok or (return_partial and aggregate) else '')
+
     # wait until the pattern matches app output
     # return match object when found or None if timeout occurs
     # set timeout <= 0 to run this without a time constraint
@@ -413,24 +816,5 @@ class ProcController(ABC, IGI, metaclass=AIGI):
     @output_waiter_imp.register
     def _(self, pattern:re.Pattern, timeout:float=3.0) -> Coroutine[Any, Any, str]:
         if not pattern: raise ValueError("pattern cannot be None")
-        fut = asyncio.get_event_loop().create_future()
-        match = None
-        def worker(output:str):
-            nonlocal match
-            if match := re.search(pattern, output):
-                fut.set_result(True)
-        
-        # add worker to the active workers dict
-        stop_worker = self.output_worker(worker)
-        
-        # awaitable coro for the result
-        async def awaiter():
-            if timeout > 0.0:
-                try: await asyncio.wait_for(fut, timeout)
-                except asyncio.TimeoutError: pass
-                finally: stop_worker()
-            else:
-                await fut
-                stop_worker()
-            return match
-        return awaiter
+        waiter = Waiter(asyncio.get_event_loop(), pattern=pattern)
+        return self._add_waiter(waiter, timeout, lambda w, _: w.match)
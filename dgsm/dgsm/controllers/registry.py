@@ -0,0 +1,153 @@
+import ast
+from collections.abc import MutableMapping
+import importlib
+import inspect
+import json
+import os
+from dgsm.controllers.proc_controller import ProcController
+from dgsm.utils.log_util import make_logger
+
+
+logger = make_logger(__name__)
+MANIFEST = 'dgsm_controllers.json' # written to the __pycache__ directory next to the scanned modules
+MANIFEST_VERSION = 1
+
+# returns [(class name, ID)] of the classes in the python source at path that define an ID classmethod
+#   ID is None if the method does not simply return a string, the module must be imported to learn it
+# classes without an ID method are skipped - they are either abstract or reuse the ID of the class they extend
+def scan_source(path:str) -> list[tuple[str, str|None]]:
+    with open(path, 'rb') as f: tree = ast.parse(f.read(), path)
+    found = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef): continue
+        for fn in node.body:
+            if not isinstance(fn, ast.FunctionDef) or fn.name != 'ID': continue
+            if any(isinstance(d, ast.Name) and d.id in ('abstractmethod', 'abstractclassmethod') for d in fn.decorator_list): break
+            body = [s for s in fn.body if not (isinstance(s, ast.Expr) and isinstance(s.value, ast.Constant))] # skip docstrings
+            ret = body[0] if len(body) == 1 and isinstance(body[0], ast.Return) else None
+            literal = ret and isinstance(ret.value, ast.Constant) and isinstance(ret.value.value, str)
+            found.append((node.name, ret.value.value if literal else None))
+            break
+    return found
+
+# returns {module file name: [(class name, ID)]} for the .py files in directory
+# scans are cached in a manifest keyed by each file's mtime and size, only new or changed files are parsed
+def scan_directory(directory:str) -> dict[str, list[tuple[str, str|None]]]:
+    manifest_path = os.path.join(directory, '__pycache__', MANIFEST)
+    try:
+        with open(manifest_path) as f: manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION: manifest = {}
+    except (OSError, ValueError): manifest = {}
+    cached = manifest.get('files', {})
+    files, changed = {}, False
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.endswith('.py') or name == '__init__.py' or not os.path.isfile(path): continue
+        st = os.stat(path)
+        entry = cached.get(name)
+        if not entry or entry['mtime'] != st.st_mtime_ns or entry['size'] != st.st_size:
+            try: classes = scan_source(path)
+            except (SyntaxError, ValueError, OSError) as e:
+                logger.warning(f"unable to scan '{path}' for controllers - {e!r}")
+                classes = [(None, None)] # unreadable - importing the module reports the error
+            entry = {'mtime': st.st_mtime_ns, 'size': st.st_size, 'classes': classes}
+            changed = True
+        cached[name] = entry
+        files[name] = [tuple(c) for c in entry['classes']]
+    if changed or set(cached) != set(files):
+        try:
+            os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+            with open(manifest_path, 'w') as f:
+                json.dump({'version': MANIFEST_VERSION, 'files': {n: cached[n] for n in files}}, f)
+        except OSError: pass # read-only install - scan again next time
+    return files
+
+# returns {ID: class} of the concrete ProcController implementations in module
+def controllers_in_module(module) -> dict[str, type[ProcController]]:
+    return {
+        imp.ID().casefold(): imp
+        for _, imp in inspect.getmembers(module, inspect.isclass)
+        if issubclass(imp, ProcController) and not inspect.isabstract(imp) and imp.__module__ == module.__name__
+    }
+
+
+# Dictionary of ProcController implementations by ID that imports modules only when their controllers are used
+# modules are registered by scanning their source for the IDs of the classes they define, without importing them
+#   a module is imported the first time one of its IDs is looked up - a module that fails to import is logged and
+#   its IDs are removed, so a broken controller only affects the apps that use it
+# modules whose IDs are not string literals are imported when an ID is not found (or the IDs are listed)
+# IDs are case insensitive
+class ControllerRegistry(MutableMapping):
+    def __init__(self) -> None:
+        self._loaded:dict[str, type[ProcController]] = {}
+        self._lazy:dict[str, tuple[str, str]] = {} # ID -> (module, class name)
+        self._unresolved:list[str] = [] # modules that must be imported to learn their IDs
+
+    # register the controllers defined in the modules of directory (a package named 'package')
+    # only registers the modules in files if given
+    def scan(self, directory:str, package:str, files:list[str]=None) -> None:
+        for file, classes in scan_directory(directory).items():
+            if files is not None and file not in files: continue
+            module = f'{package}.{os.path.splitext(file)[0]}'
+            for class_name, id in classes:
+                if id is None:
+                    if module not in self._unresolved: self._unresolved.append(module)
+                    continue
+                self._loaded.pop(id.casefold(), None)
+                self._lazy[id.casefold()] = (module, class_name)
+
+    # import module and register the controllers it defines - returns them, or {} if the module failed to import
+    def _import(self, module:str) -> dict[str, type[ProcController]]:
+        try: found = controllers_in_module(importlib.import_module(module))
+        except Exception:
+            logger.exception(f"unable to import controllers from '{module}'")
+            print(f"Unable to import controllers from '{module}' - see the log for details")
+            found = {}
+        for id in [id for id, (mod, _) in self._lazy.items() if mod == module and id not in found]: del self._lazy[id]
+        for id, imp in found.items():
+            self._lazy.pop(id, None)
+            self._loaded[id] = imp
+        return found
+
+    def _resolve_all(self) -> None:
+        while self._unresolved: self._import(self._unresolved.pop(0))
+
+    def __getitem__(self, id:str) -> type[ProcController]:
+        key = id.casefold() if isinstance(id, str) else id
+        if key in self._loaded: return self._loaded[key]
+        if key in self._lazy:
+            module, class_name = self._lazy[key]
+            self._import(module)
+            if key in self._loaded: return self._loaded[key]
+            logger.error(f"'{module}' does not define a controller '{class_name}' with ID '{id}'")
+        elif self._unresolved:
+            self._resolve_all()
+            if key in self._loaded: return self._loaded[key]
+        raise KeyError(id)
+
+    def __setitem__(self, id:str, imp:type[ProcController]) -> None:
+        self._lazy.pop(id.casefold(), None)
+        self._loaded[id.casefold()] = imp
+
+    def __delitem__(self, id:str) -> None:
+        key = id.casefold()
+        if key not in self._loaded and key not in self._lazy: raise KeyError(id)
+        self._loaded.pop(key, None)
+        self._lazy.pop(key, None)
+
+    def __contains__(self, id) -> bool:
+        if not isinstance(id, str): return False
+        if id.casefold() in self._loaded or id.casefold() in self._lazy: return True
+        self._resolve_all()
+        return id.casefold() in self._loaded
+
+    # iterating lists the IDs without importing the modules that define them
+    def __iter__(self):
+        self._resolve_all()
+        return iter(list(self._loaded) + [id for id in self._lazy if id not in self._loaded])
+
+    def __len__(self) -> int:
+        self._resolve_all()
+        return len(self._loaded) + len(self._lazy)
+
+    def __repr__(self) -> str: return f'{type(self).__name__}({sorted(self)})'
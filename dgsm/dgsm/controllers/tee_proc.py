@@ -20,7 +20,7 @@ def get_descriptor(key:str):
 class TeeProc:
     def __init__(self, subproc_args:list[str]) -> None:
         init_logging(fname=os.environ.get('proc_name', ''))
-        self.logger = make_logger()
+        self.logger = make_logger(__name__)
         start_logging()
         self.loop = asyncio.new_event_loop()
         try:
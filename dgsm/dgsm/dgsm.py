@@ -8,13 +8,17 @@ import colorama
 import psutil
 
 from dgsm.utils import ssock
-from dgsm.utils.log_util import make_logger, start_logging, stop_logging
+from dgsm.utils.console_renderer import ConsoleRenderer
+from dgsm.utils.core_allocator import CoreAllocator, format_cpus
+from dgsm.utils.log_util import configure_logging, context_with, make_logger, set_log_context, log_context, start_logging, stop_logging
+from dgsm.utils.session_store import SessionStore
 from dgsm.utils.intf_grouping import IGI, interface_tag
+from dgsm.utils.subscription import Subscription
 from dgsm.utils.upnp_util import get_router, open_ports
 from dgsm.controllers import CONTROLLERS, DEFAULT_ID, ProcController
 
 
-logger = make_logger()
+logger = make_logger(__name__)
 cmd = interface_tag('cmds')
 console_cmd = interface_tag('console_cmds')
 msg_ctx = contextvars.ContextVar('msg_ctx', default={})
@@ -30,9 +34,22 @@ color_table = (red, ''), (blu, ''), (grn, ''), (yel, ''), (res, '') # used for s
 # Coordinates interactions between the discord bot, console, and game server applications
 # creates a socket at 'host':'port' to communicate with the bot
 # composes ProcController implementations to control server applications listen in the configuration
+# if 'cores' is given, each running app is pinned to its own set of cpu cores
+# sleep and exit stop all apps concurrently within 'shutdown_timeout' seconds
+# if 'sessions' is given, player sessions of all apps are recorded in an sqlite database
+# 'logging' configures the log format, rate limiting and per app log files - see log_util.configure_logging
+# 'console' sets the frame rate and backlog of console output - see ConsoleRenderer
 class DGSM_Coordinator(IGI):
-    def __init__(self, apps:dict[str,dict], default_apps:list[str]=[], address='localhost', port=8888) -> None:
+    def __init__(self, apps:dict[str,dict], default_apps:list[str]=[], address='localhost', port=8888, cores:dict=None, shutdown_timeout:float=60, sessions:dict=None, logging:dict=None, console:dict=None) -> None:
+        self._configure_logging(logging)
+        self._console = self._create_console(console)
         self._apps: dict[str, ProcController] = {}
+        self._shutdown_timeout = shutdown_timeout
+        if sessions is True: sessions = {}
+        self._sessions = SessionStore(sessions.get('path', 'sessions.db'), sessions.get('flush_interval', 1.0)) if isinstance(sessions, dict) else None
+        if cores is True: cores = {}
+        self._cores = CoreAllocator(cores.get('reserved', 2)) if isinstance(cores, dict) and cores.get('enabled', True) else None
+        self._cores_lock = asyncio.Lock()
         self._init_apps(apps, default_apps)
         self._apply_upnp(apps, address)
         self._sock = ssock.SSock(
@@ -52,12 +69,35 @@ class DGSM_Coordinator(IGI):
                 print(f"{grn}{app_name}{res} is {red}missing{res} key {yel}'prg'{res} in its configuration. {grn}{app_name}{res} will be unavailable to use.")
                 logger.warning(f"{app_name} is missing key 'prg'.")
                 continue
-            app = CONTROLLERS.get(kwargs.get('id'), CONTROLLERS[DEFAULT_ID])
-            self._apps[app_name.casefold()] = app(app_name, msg_cb=self._app_message_handler, **kwargs)
+            app = CONTROLLERS.get(id, None) if (id := kwargs.get('id')) else CONTROLLERS[DEFAULT_ID]
+            if not app:
+                print(f"{grn}{app_name}{res} uses controller {yel}'{id}'{res} which is {red}not available{res}. {grn}{app_name}{res} will use the default controller.")
+                logger.warning(f"{app_name} uses unavailable controller '{id}', using the default controller")
+                app = CONTROLLERS[DEFAULT_ID]
+            self._apps[app_name.casefold()] = app(app_name, msg_cb=self._app_message_handler, state_cb=self._app_state_handler, sessions=self._sessions, **kwargs)
         for app_name in default_apps:
             if app_name.casefold() in self._apps.keys():
-                asyncio.get_event_loop().create_task(self._apps[app_name.casefold()].cmds.start())
+                app = self._apps[app_name.casefold()]
+                context_with(app=app.name).run(asyncio.get_event_loop().create_task, app.cmds.start())
     
+    # apply the 'logging' config - invalid config is reported and the defaults are used
+    def _configure_logging(self, cfg:dict) -> None:
+        if cfg is True: cfg = {}
+        if not isinstance(cfg, dict): return
+        try: configure_logging(**cfg)
+        except (TypeError, ValueError) as e:
+            print(f"{red}Invalid logging config{res}: {e}")
+            logger.error(f"invalid logging config: {e}")
+
+    # console renderer from the 'console' config - invalid config is reported and the defaults are used
+    def _create_console(self, cfg:dict) -> ConsoleRenderer:
+        if not isinstance(cfg, dict): return ConsoleRenderer(self._prompt)
+        try: return ConsoleRenderer(self._prompt, **cfg)
+        except (TypeError, ValueError) as e:
+            print(f"{red}Invalid console config{res}: {e}")
+            logger.error(f"invalid console config: {e}")
+            return ConsoleRenderer(self._prompt)
+
     # open ports specified in the upnp config
     def _apply_upnp(self, app_cfg:dict[str,dict], def_addr):
         router = None
@@ -98,6 +138,8 @@ class DGSM_Coordinator(IGI):
         except BaseException as e:
             logger.exception(f"stopped due to unrecoverble error: {e.with_traceback}")
         finally:
+            for app in self._apps.values(): app.close_attach()
+            if self._sessions: self._sessions.close()
             stop_logging()
     
     # main loop
@@ -107,9 +149,13 @@ class DGSM_Coordinator(IGI):
         loop = asyncio.get_running_loop()
         self.tasks.append(self._sock.schedule(loop))
         print(f'The following applications have been added to the configuration:')
+        attachable = False
         for app in self._apps.values():
             print(f'  {blu}{app.name}{res} - {app.ID()}')
+            if await app.start_attach(): attachable = True
+        if attachable: print(f'Attach a terminal to an app with {yel}python -m dgsm attach <app>{res}')
         print(f'Waiting for the Discord Bot to connect\nUse {yel}exit{res} to stop')
+        self._console.start()
         self.tasks.append(loop.create_task(self._monitor_console()))
         self.tasks = set(self.tasks)
         psutil.cpu_percent()
@@ -125,7 +171,9 @@ class DGSM_Coordinator(IGI):
     async def _status_all(self) -> None:
         res = 'Apps:\n'
         for app in self._apps.values():
-            res += f'  {app.name}: {app.status}\n'
+            res += f'  {app.name}: {app.status}'
+            if app.cpus: res += f' (cores {format_cpus(app.cpus)})'
+            res += '\n'
         res += 'System:\n'
         res += f'  CPU: {int(psutil.cpu_percent())}% {round(psutil.cpu_freq().current/1000, 2)} GHz\n'
         res += f'  Mem: {round(psutil.virtual_memory().used / 1024**3, 1)}/{round(psutil.virtual_memory().total / 1024**3, 1)} GB ({psutil.virtual_memory().percent}%)'
@@ -135,13 +183,12 @@ class DGSM_Coordinator(IGI):
     @cmd('sleep')
     async def _sleep(self) -> None:
         await self._app_message_handler("Attempting to power off the host")
-        for app in self._apps.values():
-            if app.running:
-                await app.cmds.stop()
+        await self._stop_all()
         for app in self._apps.values():
             if app.running:
                 await self._app_message_handler(f"{app.name} is preventing the host from powering off")
                 return
+        if self._sessions: await asyncio.to_thread(self._sessions.close)
         await self._app_message_handler("Powering off the host")
         await self._sock.stop()
         asyncio.get_event_loop().stop()
@@ -149,6 +196,26 @@ class DGSM_Coordinator(IGI):
         else: shtdwn = "shutdown -h now"
         os.system(shtdwn)
 
+    # stop all running apps concurrently - every app must have exited by the same deadline
+    async def _stop_all(self, force=False) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._shutdown_timeout
+        running = [app for app in self._apps.values() if app.running]
+        stops = [context_with(app=app.name).run(loop.create_task, app.stop(deadline, force)) for app in running]
+        results = await asyncio.gather(*stops, return_exceptions=True)
+        for app, result in zip(running, results):
+            if isinstance(result, BaseException): logger.error(f"unable to stop {app.name}: {result!r}")
+
+    # re-partition the cpu cores whenever an app starts or stops running
+    async def _app_state_handler(self, app:ProcController) -> None:
+        if not self._cores: return
+        async with self._cores_lock:
+            previous = self._cores.assignments
+            assignments = self._cores.update(app.name, app.core_weight if app.running else 0)
+            for other in self._apps.values():
+                cpus = assignments.get(other.name)
+                if other.running and cpus and cpus != previous.get(other.name): await other.set_affinity(cpus)
+
     async def _on_sock_connect(self):
         await self.print_message(f'{grn}Connected{res} to the Discord Bot')
         logger.info('The Discord Bot has Connected')
@@ -210,7 +277,8 @@ class DGSM_Coordinator(IGI):
                 elif not (cmd_func := target.cmds.get(cmd)):
                     await self._app_message_handler(f"{target.name} does not support the command '{user_cmd['cmd']}'")
                     logger.warning(f"user supplied unrecognized command: '{user_cmd['cmd']}'")
-                else: # execute command
+                else: # execute command - records logged by the command and the tasks it starts carry the app's name
+                    token = set_log_context(app=target.name)
                     try:
                         if args := kwargs.get('args'): # args exist
                             logger.info(f"calling {target.name}.{user_cmd['cmd']}({args})")
@@ -221,6 +289,7 @@ class DGSM_Coordinator(IGI):
                     except TypeError:
                         await self._app_message_handler(f"Incorrect number of arguments were given for {target.name}.{user_cmd['cmd']}")
                         logger.warning(f"user supplied incorrect number of args for {target.name}.{user_cmd['cmd']}")
+                    finally: log_context.reset(token)
             case {'cmd': cmd, **kwargs}:
                 if not (cmd_func := self.cmds.get(cmd)):
                     if cmd in ProcController.cmds.keys():
@@ -271,7 +340,7 @@ class DGSM_Coordinator(IGI):
     async def _focus_app(self, app:ProcController=None) -> None:
         if not app: await self.print_message(f"Must specify and app to focus")
         if spotlight.name: self._app_message_handler(f"{spotlight.name} is already focussed")
-        spotlight.focus(app)
+        spotlight.focus(app, self._console)
         await self.print_message(f"Focussing {blu}{app.name}{res}, all input is fed directly to {blu}{app.name}{res}. Use {yel}'--unfocus'{res} to exit this mode", spotlight=True)
     
     @console_cmd('unfocus')
@@ -284,8 +353,7 @@ class DGSM_Coordinator(IGI):
     @console_cmd('exit')
     async def _exit(self) -> None:
         await self._sock.stop()
-        for app in self._apps.values():
-            if app.running: await app.force_stop()
+        await self._stop_all(force=True)
         await asyncio.sleep(1)
         for task in (asyncio.all_tasks() - self.tasks - {asyncio.current_task()}): task.cancel()
         for task in (asyncio.all_tasks() - self.tasks - {asyncio.current_task()}): await asyncio.shield(task)
@@ -294,9 +362,8 @@ class DGSM_Coordinator(IGI):
     
     async def _monitor_console(self) -> None:
         while True:
-            prompt = f'{blu}{spotlight.name}{res}$ ' if spotlight.name else f'{grn}dgsm{res}$ '
             line = ''
-            try: line = await aioconsole.ainput(f'{prompt}')
+            try: line = await aioconsole.ainput(self._prompt())
             except: break
             asyncio.get_running_loop().create_task(self._console_input_handler(line))
     
@@ -335,14 +402,14 @@ class DGSM_Coordinator(IGI):
                 await self.console_cmds.get(cmd)()
             case _: await self._user_cmd_handler(console_cmd)
     
-    # async print to console, pref is inserted at the beginning of each line
+    def _prompt(self) -> str:
+        return f'{blu}{spotlight.name}{res}$ ' if spotlight.name else f'{grn}dgsm{res}$ '
+
+    # print to console on the next frame of the console renderer, pref is inserted at the beginning of each line
     async def print_message(self, message:str | bytes, **kwargs) -> None:
         pref = f'{blu}[{spotlight.name}]{res}: ' if kwargs.get('spotlight') else ''
-        suff = f'\n{blu}{spotlight.name}{res}$ ' if spotlight.name else f'\n{grn}dgsm{res}$ '
-        if isinstance(type(message), bytes): message = message.decode()
-        message = f'\n{pref}'.join(line for line in message.strip(os.linesep).split('\n'))
-        # clear the current line, place cursor at beginning, then print
-        await aioconsole.aprint(f'\033[2K\033[1G{pref}{message}{suff}', end='')
+        if isinstance(message, bytes): message = message.decode()
+        self._console.message('\n'.join(f'{pref}{line}' for line in message.strip(os.linesep).split('\n')))
 
 
 # encapsulate 'spotlighting' behavior
@@ -354,17 +421,19 @@ class spotlight:
     app:ProcController = None
     wstream:asyncio.StreamWriter = None
     context:contextvars.ContextVar[dict]
-    stop_app_worker = None
+    sub:Subscription = None
+    task:asyncio.Task = None
 
     @classmethod
-    def focus(cls, app:ProcController):
+    def focus(cls, app:ProcController, console:ConsoleRenderer):
         cls.name = app.name
         cls.app = app
         cls.wstream = app._writestream
         ctx = msg_ctx.get()
         ctx['spotlight'] = True
         cls.context = ctx
-        cls.stop_app_worker = cls.app.output_worker(cls.to_console)
+        cls.sub = app.subscribe(maxsize=1000, overflow='drop_oldest', sampled=True, batch=True)
+        cls.task = asyncio.get_event_loop().create_task(console.feed(cls.sub, f'{blu}[{app.name}]{res}: ', app.name))
    
     @classmethod
     def unfocus(cls):
@@ -372,8 +441,9 @@ class spotlight:
         cls.app = None
         cls.wstream = None
         cls.context = None
-        if cls.stop_app_worker: cls.stop_app_worker()
-        cls.stop_app_worker = None
+        if cls.sub: cls.sub.close()
+        if cls.task: cls.task.cancel()
+        cls.sub = cls.task = None
    
     @classmethod
     async def to_app(cls, msg:str|bytes):
@@ -382,12 +452,3 @@ class spotlight:
         elif type(msg) is bytes: msg = msg.strip(b' \t\r\n') + f'{os.linesep}'.encode()
         cls.wstream.write(msg)
         await cls.wstream.drain()
-    
-    # the output_worker fn needs a callable not coro - schedule message with cached context
-    @classmethod
-    def to_console(cls, msg:str|bytes):
-        if type(msg) is bytes: msg = msg.decode()
-        async def _aprint(msg:str): await cls.app.message_coordinator(msg)
-        tkn = msg_ctx.set(cls.context)
-        asyncio.get_event_loop().create_task(_aprint(msg))
-        msg_ctx.reset(tkn)
@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+from collections import Counter
+from datetime import datetime
+import gzip
+import re
+import sys
+import time
+from dgsm.controllers import CONTROLLERS, ProcController, update_controllers_from_path
+from dgsm.utils.line_reader import LineSplitter
+
+
+# Replays a recorded log through a controller without starting the app
+#   python -m dgsm.replay --controller minecraft logs/latest.log
+# every line is decoded and handled exactly as live output is, the handlers that fire are reported as they fire
+# the log is replayed as fast as possible, or with its original timing (--realtime) if the lines carry timestamps
+# afterwards the final online/player state, the unmatched 'interesting' lines and the throughput are reported
+
+BLOCK_SIZE = 1 << 20
+INTERESTING = r'(?i)\b(?:join|joined|left|leave|connect|connected|disconnect|disconnected|login|logged|kick|ban|player|online|started|done|error|exception|fail|failed)\b'
+# line prefixes used to recover the original timing - the first that matches a line of the log is used for the whole log
+# dgsm's output archive prefixes every line with the date and time it was read - that prefix is removed before the line is handled
+ARCHIVE_STAMP = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) ')
+TIMESTAMPS = (
+    (ARCHIVE_STAMP, lambda m: datetime.strptime(m.group(1), '%Y-%m-%d %H:%M:%S').timestamp()),
+    (re.compile(r'^(\d\d/\d\d/\d{4} \d\d:\d\d:\d\d)'), lambda m: datetime.strptime(m.group(1), '%m/%d/%Y %H:%M:%S').timestamp()), # valheim
+    (re.compile(r'^\[(\d\d):(\d\d):(\d\d)'), lambda m: int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))), # minecraft
+    (re.compile(r'^\s*(\d+\.\d{3}) '), lambda m: float(m.group(1))), # factorio - seconds since start
+)
+
+
+# Feeds lines through a controller and records what happened
+class Replay:
+    def __init__(self, ctrl:ProcController, interesting:re.Pattern, verbose:bool=True, max_unmatched:int=20) -> None:
+        self.ctrl = ctrl
+        self.interesting = interesting
+        self.verbose = verbose
+        self.max_unmatched = max_unmatched
+        self.fired = Counter()
+        self.unmatched:list[tuple[int,str]] = []
+        self.unmatched_count = 0
+        self.lines = 0
+        self.handle_time = 0.0
+        self._line_no = 0
+        self._wrap_handlers()
+
+    # replace the instance's bound stdout handlers with wrappers that report them firing
+    # the output handler is wrapped as well to count the lines so firings can be reported with their line number
+    def _wrap_handlers(self) -> None:
+        output_handler = self.ctrl._output_handler
+        def _counter(line:str) -> bool:
+            self._line_no += 1
+            return output_handler(line)
+        self.ctrl._output_handler = _counter
+        if not getattr(self.ctrl, '_handler_funcs', None): return
+        def _recorder(name:str, handler):
+            def _record(match:re.Match):
+                self.fired[name] += 1
+                if self.verbose: print(f'  {self._line_no:>9} {name}: {match.groups() or match.group(0)}')
+                return handler(match)
+            return _record
+        names = [attr[1] for attr in type(self.ctrl).handlers.values()]
+        self.ctrl._handler_funcs = tuple(_recorder(n, f) for n, f in zip(names, self.ctrl._handler_funcs))
+
+    def feed(self, lines:list[str]) -> None:
+        start = time.perf_counter()
+        handled = self.ctrl._handle_lines(lines)
+        self.handle_time += time.perf_counter() - start
+        for i, line in enumerate(lines):
+            if i not in handled and self.interesting.search(line):
+                self.unmatched_count += 1
+                if len(self.unmatched) < self.max_unmatched: self.unmatched.append((self.lines + i + 1, line))
+        self.lines += len(lines)
+
+
+# yield batches of decoded lines from the log at path ('-' for stdin) - gzip compressed logs are decompressed
+def read_batches(path:str, encoding:str='utf-8', block_size:int=BLOCK_SIZE):
+    splitter = LineSplitter(encoding=encoding)
+    if path == '-': f = sys.stdin.buffer
+    elif path.endswith('.gz'): f = gzip.open(path, 'rb')
+    else: f = open(path, 'rb')
+    try:
+        while data := f.read(block_size):
+            if lines := splitter.feed(data): yield lines
+        if lines := splitter.flush(): yield lines
+    finally:
+        if f is not sys.stdin.buffer: f.close()
+
+# returns the timestamp pattern and parser matching line, or None
+def detect_timestamps(line:str):
+    return next(((p, parse) for p, parse in TIMESTAMPS if p.search(line)), None)
+
+# replay the log - with realtime the time between timestamped lines is waited (divided by speed)
+async def replay(replayer:Replay, path:str, encoding:str='utf-8', realtime:bool=False, speed:float=1.0) -> None:
+    stamps, last_ts = None, None
+    for lines in read_batches(path, encoding):
+        if stamps is None:
+            stamps = detect_timestamps(lines[0]) or False
+            if realtime and not stamps: print('the log has no timestamps - replaying at full speed')
+        pattern, parse = stamps or (None, None)
+        archived = pattern is ARCHIVE_STAMP
+        if not (realtime and stamps):
+            if archived: lines = [ARCHIVE_STAMP.sub('', line, 1) for line in lines]
+            replayer.feed(lines)
+            await asyncio.sleep(0) # let callbacks scheduled by handlers run
+            continue
+        # feed the lines in runs that share a timestamp, waiting for the gap between runs
+        run = []
+        for line in lines:
+            if m := pattern.search(line):
+                ts = parse(m)
+                if last_ts is not None and ts > last_ts:
+                    if run: replayer.feed(run)
+                    run = []
+                    await asyncio.sleep((ts - last_ts) / speed)
+                last_ts = ts
+                if archived: line = line[m.end():]
+            run.append(line)
+        if run: replayer.feed(run)
+
+def main(argv:list[str]=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m dgsm.replay', description='Replay a recorded log through a controller')
+    parser.add_argument('log', help="path to the log file, .gz logs are decompressed, '-' reads stdin")
+    parser.add_argument('--controller', '-c', required=True, help="ID of the controller, i.e. minecraft")
+    parser.add_argument('--con', '-o', default='', help="path to custom ProcController implementations")
+    parser.add_argument('--realtime', '-r', action='store_true', help="replay with the original timing of the log")
+    parser.add_argument('--speed', '-s', type=float, default=1.0, help="speed up realtime replay by this factor")
+    parser.add_argument('--interesting', '-i', default=INTERESTING, help="pattern of unhandled lines to report")
+    parser.add_argument('--max-unmatched', '-m', type=int, default=20, help="number of unhandled interesting lines to print")
+    parser.add_argument('--quiet', '-q', action='store_true', help="do not print each handler as it fires")
+    parser.add_argument('--encoding', '-e', default='utf-8')
+    parser.add_argument('--regex-engine', default='re', help="'re2' to match handlers with google-re2")
+    args = parser.parse_args(argv)
+
+    if args.con: update_controllers_from_path(args.con)
+    if not (controller := CONTROLLERS.get(args.controller.casefold())):
+        print(f"'{args.controller}' is not a controller ID - available: {', '.join(sorted(CONTROLLERS))}")
+        return 1
+    try: interesting = re.compile(args.interesting)
+    except re.error as e:
+        print(f"invalid --interesting pattern: {e}")
+        return 1
+
+    async def _run() -> Replay:
+        async def _discard(*_, **__): pass
+        ctrl = controller('replay', prg='', msg_cb=_discard, app_info={}, opts={'regex_engine': args.regex_engine})
+        ctrl._start_comp = asyncio.get_running_loop().create_future()
+        replayer = Replay(ctrl, interesting, verbose=not args.quiet, max_unmatched=args.max_unmatched)
+        print(f'Replaying {args.log} through {controller.__name__}')
+        await replay(replayer, args.log, args.encoding, args.realtime, args.speed)
+        return replayer
+
+    start = time.perf_counter()
+    try: replayer = asyncio.run(_run())
+    except (OSError, LookupError) as e:
+        print(f'unable to read {args.log}: {e}')
+        return 1
+    elapsed = time.perf_counter() - start
+
+    ctrl = replayer.ctrl
+    print('Handlers fired:')
+    for name, n in replayer.fired.most_common(): print(f'  {name}: {n}')
+    if not replayer.fired: print('  none')
+    print('Final state:')
+    print(f'  online: {ctrl._app_attrs.get("online", ctrl.running)}')
+    if 'version' in ctrl._app_attrs: print(f'  version: {ctrl._app_attrs["version"]}')
+    if 'players' in ctrl._app_attrs:
+        players = ctrl._app_attrs['players']
+        names = list(players.values()) if isinstance(players, dict) else list(players)
+        print(f'  players ({len(names)}): {", ".join(names)}')
+    print(f'Unhandled interesting lines: {replayer.unmatched_count}')
+    for n, line in replayer.unmatched: print(f'  {n:>9} {line}')
+    if replayer.unmatched_count > len(replayer.unmatched): print(f'  ... {replayer.unmatched_count - len(replayer.unmatched)} more')
+    rate = replayer.lines / replayer.handle_time if replayer.handle_time else 0
+    print(f'{replayer.lines} lines in {elapsed:.2f}s - handlers: {replayer.handle_time:.2f}s, {rate:,.0f} lines/sec')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import re
+import stat
+import sys
+import tempfile
+
+from dgsm.utils.log_util import make_logger
+
+
+logger = make_logger(__name__)
+_UNSAFE = re.compile(r'[^\w.-]+')
+
+# directory holding the attach sockets of this user - $XDG_RUNTIME_DIR/dgsm, or dgsm-<uid> in the temp directory
+def runtime_dir() -> str:
+    if base := os.environ.get('XDG_RUNTIME_DIR'): return os.path.join(base, 'dgsm')
+    return os.path.join(tempfile.gettempdir(), f'dgsm-{os.getuid()}')
+
+# path of the attach socket of the app named name
+def socket_path(name:str, directory:str=None) -> str:
+    return os.path.join(directory or runtime_dir(), f"{_UNSAFE.sub('_', name.casefold()).strip('._') or 'app'}.sock")
+
+
+# Local console endpoint of a single app - a Unix socket any number of terminals can attach to
+# a new client is sent the app's scrollback, then its output as it is read, and every line it sends is written to the app
+# the protocol is plain lines both ways, so any unix socket client works (i.e. socat - UNIX-CONNECT:<path>)
+# clients are fed from their own drop_oldest subscription - a slow terminal loses lines (and is told so) instead of slowing the app
+# clients stay attached while the app is stopped and receive its output again once it is started
+# the socket is only accessible to the user running dgsm - it is not opened in a directory anyone else owns or can access
+class AttachServer:
+    def __init__(self, app, path:str, maxsize:int=1 << 14) -> None:
+        self.app = app # ProcController
+        self.path = path
+        self.maxsize = maxsize
+        self._server:asyncio.AbstractServer = None
+        self._clients:set[asyncio.Task] = set()
+        self._state:asyncio.Future = None # resolved when the app starts or stops
+
+    @property
+    def clients(self) -> int: return len(self._clients)
+
+    async def start(self) -> None:
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # the directory may have been created by someone else beforehand, i.e. a predictable one in /tmp
+        st = os.lstat(directory)
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or stat.S_IMODE(st.st_mode) != 0o700:
+            raise OSError(f"'{directory}' must be a directory owned by this user with mode 0700")
+        if os.path.exists(self.path): # left behind by a dgsm that did not exit cleanly
+            if await self._in_use(): raise OSError(f"'{self.path}' is in use by another dgsm")
+            os.unlink(self.path)
+        # the socket is restricted to the owner once bound - the umask is process wide and is left alone
+        self._server = await asyncio.start_unix_server(self._client, self.path)
+        os.chmod(self.path, 0o600)
+
+    # True if a server is listening at path
+    async def _in_use(self) -> bool:
+        try: _, writer = await asyncio.wait_for(asyncio.open_unix_connection(self.path), 1.0)
+        except (OSError, asyncio.TimeoutError): return False
+        writer.close()
+        return True
+
+    def close(self) -> None:
+        if not self._server: return
+        self._server.close()
+        self._server = None
+        for task in self._clients: task.cancel()
+        try: os.unlink(self.path)
+        except OSError: pass
+
+    # called by the app whenever it starts or stops running
+    def state_changed(self) -> None:
+        if self._state and not self._state.done(): self._state.set_result(None)
+
+    async def _wait_state(self) -> None:
+        if self._state is None or self._state.done(): self._state = asyncio.get_running_loop().create_future()
+        await self._state
+
+    async def _client(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._clients.add(task)
+        logger.info(f"console attached to {self.app.name} ({self.clients} attached)")
+        loop = asyncio.get_running_loop()
+        # the client is detached when it closes the connection, or writing to it fails
+        tasks = {loop.create_task(self._input(reader, writer)), loop.create_task(self._output(writer))}
+        try: await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError: pass
+        finally:
+            for t in tasks: t.cancel()
+            self._clients.discard(task)
+            writer.close()
+            logger.info(f"console detached from {self.app.name} ({self.clients} attached)")
+
+    # forward the scrollback, then the app's output - for as long as the client is attached
+    async def _output(self, writer:asyncio.StreamWriter) -> None:
+        try: await self._forward(writer)
+        except OSError: pass
+
+    async def _forward(self, writer:asyncio.StreamWriter) -> None:
+        # the scrollback is taken and the subscription made without yielding in between, so no line is missed or repeated
+        lines = self.app._scrollback.tail(len(self.app._scrollback))
+        sub = self.app.subscribe(maxsize=self.maxsize, batch=True) if self.app.running else None
+        await self._write(writer, lines)
+        while True:
+            if not sub:
+                await self._write(writer, [f'[{self.app.name} is not running - waiting for it to start]'])
+                while not self.app.running: await self._wait_state()
+                sub = self.app.subscribe(maxsize=self.maxsize, batch=True)
+            dropped = 0
+            try:
+                async for lines in sub:
+                    if sub.dropped > dropped:
+                        lines = [f'[{sub.dropped - dropped} lines dropped]', *lines]
+                        dropped = sub.dropped
+                    await self._write(writer, lines)
+            finally: sub.close()
+            sub = None
+            await self._write(writer, [f'[{self.app.name} stopped]'])
+
+    async def _write(self, writer:asyncio.StreamWriter, lines:list[str]) -> None:
+        if not lines: return
+        writer.write(('\n'.join(lines) + '\n').encode('utf-8', 'replace'))
+        await writer.drain()
+
+    # every line sent by the client is written to the app
+    async def _input(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                if not (line := line.decode('utf-8', 'replace').strip('\r\n')): continue
+                if not await self.app.message_app(line): await self._write(writer, [f'[{self.app.name} is not running]'])
+        except (OSError, asyncio.CancelledError): pass
+
+
+# attach the current terminal to the socket at path until either side closes it
+# output is written to stdout as it arrives, lines typed on stdin are sent to the app
+async def attach(path:str) -> int:
+    try: reader, writer = await asyncio.open_unix_connection(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"Nothing to attach to at '{path}' - is dgsm running?", file=sys.stderr)
+        return 1
+    loop = asyncio.get_running_loop()
+    stdin = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stdin), sys.stdin)
+
+    async def _send():
+        while line := await stdin.readline():
+            writer.write(line)
+            await writer.drain()
+    sender = loop.create_task(_send())
+    out = sys.stdout.buffer
+    try:
+        while data := await reader.read(1 << 16):
+            out.write(data)
+            out.flush()
+    except (OSError, asyncio.IncompleteReadError): pass
+    finally:
+        sender.cancel()
+        writer.close()
+    return 0
@@ -0,0 +1,188 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from dgsm.utils.log_util import make_logger
+
+
+logger = make_logger(__name__)
+IS_LINUX = hasattr(os, 'sched_setaffinity')
+if IS_LINUX: import fcntl
+FICLONE = 0x40049409 # linux ioctl to share the extents of a file (reflink) - btrfs, xfs, bcachefs, ...
+CHUNK_SIZE = 1 << 18
+
+# lower the cpu and i/o priority of the calling thread - both are per thread on linux
+def _idle_thread() -> None:
+    if not IS_LINUX: return
+    tid = threading.get_native_id()
+    try: os.setpriority(os.PRIO_PROCESS, tid, 19)
+    except OSError: pass
+    try:
+        import psutil
+        psutil.Process(tid).ionice(psutil.IOPRIO_CLASS_IDLE)
+    except Exception: pass
+
+# copy src to dst by sharing its extents - returns False if the filesystem does not support it
+def reflink(src:str, dst:str) -> bool:
+    if not IS_LINUX: return False
+    try:
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        try: os.remove(dst)
+        except OSError: pass
+        return False
+
+
+# Deduplicated store of directory snapshots
+# files are split into fixed size chunks that are stored once by their blake2b hash under <path>/chunks
+# each snapshot is a manifest under <path>/snapshots listing the chunks of every file
+# files with the same size and mtime as in the previous snapshot are not read again
+# hashing and restoring run on a thread pool at idle cpu and i/o priority - the pool only exists while an operation runs
+class BackupStore:
+    def __init__(self, path:str, chunk_size:int=CHUNK_SIZE, threads:int=2) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.threads = threads
+        self._chunks = os.path.join(path, 'chunks')
+        self._snapshots = os.path.join(path, 'snapshots')
+        self._staging = os.path.join(path, 'staging')
+        os.makedirs(self._chunks, exist_ok=True)
+        os.makedirs(self._snapshots, exist_ok=True)
+
+    # a new thread pool for hashing or restoring files - shut it down when the operation is done
+    def workers(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='backup', initializer=_idle_thread)
+
+    # ids of all snapshots, oldest first
+    def snapshots(self) -> list[str]:
+        return sorted(f[:-5] for f in os.listdir(self._snapshots) if f.endswith('.json'))
+
+    def load(self, snapshot:str) -> dict:
+        with open(os.path.join(self._snapshots, f'{snapshot}.json')) as f: return json.load(f)
+
+    def latest(self) -> dict:
+        return self.load(snaps[-1]) if (snaps := self.snapshots()) else {'files': {}}
+
+    # walk root and compare every file to the previous manifest by size and mtime
+    # returns the entries of the unchanged files and the stat of each changed file by relative path
+    # the stats are recorded in the new snapshot, so scan while the app is not saving
+    def scan(self, root:str, previous:dict) -> tuple[dict[str,dict], dict[str,os.stat_result]]:
+        unchanged, changed = {}, {}
+        prev = previous.get('files', {})
+        for dirpath, _, files in os.walk(root):
+            for fname in files:
+                full = os.path.join(dirpath, fname)
+                rel = os.path.relpath(full, root).replace(os.sep, '/')
+                try: st = os.stat(full)
+                except OSError: continue # removed during the scan
+                if (entry := prev.get(rel)) and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+                    unchanged[rel] = entry
+                else: changed[rel] = st
+        return unchanged, changed
+
+    # reflink the changed files into the staging directory so they can be hashed after the app resumes saving
+    # returns the staging directory, or None if the filesystem cannot reflink - the files must then be read in place
+    def stage(self, root:str, changed:dict[str,os.stat_result]) -> str:
+        shutil.rmtree(self._staging, ignore_errors=True)
+        for rel in changed:
+            dst = os.path.join(self._staging, rel)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if not reflink(os.path.join(root, rel), dst):
+                shutil.rmtree(self._staging, ignore_errors=True)
+                return None
+        return self._staging
+
+    # split the file at rel under root into chunks and store the chunks that are not in the store yet
+    # st is the stat of the file from the scan
+    # returns the manifest entry of the file and the number of bytes written to the store
+    def store_file(self, root:str, rel:str, st:os.stat_result) -> tuple[dict, int]:
+        chunks, written = [], 0
+        with open(os.path.join(root, rel), 'rb') as f:
+            while data := f.read(self.chunk_size):
+                digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+                chunks.append(digest)
+                written += self._put(digest, data)
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'mode': st.st_mode & 0o7777, 'chunks': chunks}, written
+
+    def _put(self, digest:str, data:bytes) -> int:
+        path = self._chunk_path(digest)
+        if os.path.exists(path): return 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{threading.get_native_id()}.tmp'
+        with open(tmp, 'wb') as f: f.write(data)
+        os.replace(tmp, path)
+        return len(data)
+
+    def _chunk_path(self, digest:str) -> str:
+        return os.path.join(self._chunks, digest[:2], digest)
+
+    # write the manifest of a new snapshot - returns its id
+    def commit(self, files:dict[str,dict], info:dict=None) -> str:
+        shutil.rmtree(self._staging, ignore_errors=True)
+        snapshot = datetime.now().strftime('%Y%m%d-%H%M%S')
+        while os.path.exists(os.path.join(self._snapshots, f'{snapshot}.json')): snapshot += '_'
+        manifest = {'id': snapshot, 'created': time.time(), **(info or {}), 'files': files}
+        tmp = os.path.join(self._snapshots, f'{snapshot}.json.tmp')
+        with open(tmp, 'w') as f: json.dump(manifest, f)
+        os.replace(tmp, os.path.join(self._snapshots, f'{snapshot}.json'))
+        return snapshot
+
+    # delete snapshots outside of the retention policy and the chunks no other snapshot uses
+    # keeps the newest keep_last snapshots and the newest snapshot of each of the last keep_daily days and keep_weekly weeks
+    # returns the number of snapshots and chunks deleted
+    def prune(self, keep_last:int=10, keep_daily:int=0, keep_weekly:int=0) -> tuple[int,int]:
+        snaps = self.snapshots()
+        keep = set(snaps[-keep_last:]) if keep_last > 0 else set()
+        for fmt, count in (('%Y%m%d', keep_daily), ('%G%V', keep_weekly)):
+            periods = {}
+            for snap in reversed(snaps): # newest first - the first snapshot seen in a period is kept
+                period = datetime.strptime(snap[:15], '%Y%m%d-%H%M%S').strftime(fmt)
+                if period not in periods and len(periods) < count: periods[period] = snap
+            keep.update(periods.values())
+        removed = [s for s in snaps if s not in keep]
+        for snap in removed: os.remove(os.path.join(self._snapshots, f'{snap}.json'))
+        return len(removed), self.gc() if removed else 0
+
+    # delete chunks that are not referenced by any snapshot
+    def gc(self) -> int:
+        used = set()
+        for snap in self.snapshots():
+            for entry in self.load(snap)['files'].values(): used.update(entry['chunks'])
+        deleted = 0
+        for dirpath, _, files in os.walk(self._chunks):
+            for fname in files:
+                if fname not in used:
+                    os.remove(os.path.join(dirpath, fname))
+                    deleted += 1
+        return deleted
+
+    # restore a snapshot into root - files that already match the snapshot by size and mtime are left untouched
+    # files in root that are not part of the snapshot are deleted
+    # returns the number of files written and deleted
+    def restore(self, snapshot:str, root:str) -> tuple[int,int]:
+        files = self.load(snapshot)['files']
+        unchanged, changed = self.scan(root, {'files': files})
+        extra = [rel for rel in changed if rel not in files]
+        missing = [rel for rel in files if rel not in unchanged]
+        for rel in extra: os.remove(os.path.join(root, rel))
+        with self.workers() as pool:
+            for future in [pool.submit(self._restore_file, root, rel, files[rel]) for rel in missing]: future.result()
+        return len(missing), len(extra)
+
+    def _restore_file(self, root:str, rel:str, entry:dict) -> None:
+        full = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        tmp = f'{full}.restore.tmp'
+        with open(tmp, 'wb') as f:
+            for digest in entry['chunks']:
+                with open(self._chunk_path(digest), 'rb') as c: f.write(c.read())
+        os.chmod(tmp, entry['mode'])
+        os.replace(tmp, full)
+        os.utime(full, ns=(entry['mtime_ns'], entry['mtime_ns']))
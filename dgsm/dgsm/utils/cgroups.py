@@ -0,0 +1,177 @@
+import ctypes
+import math
+import os
+import platform
+import re
+
+from dgsm.utils.log_util import make_logger
+
+
+logger = make_logger(__name__)
+IS_WINDOWS = os.name == 'nt'
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+CONTROLLERS = ('cpu', 'memory', 'io')
+SIZE = re.compile(r'(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?', re.IGNORECASE)
+SIZE_UNITS = {'': 1, 'k': 1<<10, 'm': 1<<20, 'g': 1<<30, 't': 1<<40}
+IONICE_CLASSES = {'realtime': 1, 'rt': 1, 'best-effort': 2, 'be': 2, 'idle': 3}
+IOPRIO_SET = {'x86_64': 251, 'amd64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'arm64': 30, 'armv7l': 314, 'armv6l': 314} # syscall numbers
+CGROUP_ONLY = ('cpu_quota', 'memory_high', 'memory_max', 'io_weight') # limits that can not be enforced without a cgroup
+
+# parse a size such as 512M, 8G or 1073741824 into bytes - 'max' is returned as is
+def parse_size(size:str|int) -> int|str:
+    if isinstance(size, int) or size == 'max': return size
+    if not (m := SIZE.fullmatch(str(size).strip())): raise ValueError(f"'{size}' is not a valid size")
+    return int(float(m.group(1)) * SIZE_UNITS[m.group(2).casefold()])
+
+# approximate the nice value that gives the same share of cpu as a cgroup cpu.weight (100 == nice 0)
+def weight_to_nice(weight:int) -> int:
+    return max(-20, min(19, round(-math.log(weight / 100) / math.log(1.25))))
+
+# returns a function that sets the io priority of the calling process, or None if it is not supported here
+# libc is loaded before fork so the child only makes the syscall
+def ioprio_setter(ioclass:int, level:int):
+    if not (nr := IOPRIO_SET.get(platform.machine().casefold())): return None
+    try: syscall = ctypes.CDLL(None, use_errno=True).syscall
+    except (OSError, AttributeError): return None
+    ioprio = ioclass << 13 | level
+    return lambda: syscall(nr, 1, 0, ioprio) # IOPRIO_WHO_PROCESS, this process
+
+
+# Resource limits for an app from the 'limits' opts
+# cgroup values are written to the app's cgroup, the rest are applied to the child process before it executes
+class Limits:
+    def __init__(self, cpu_weight:int=None, cpu_quota:float=None, memory_high:str|int=None, memory_max:str|int=None,
+                 io_weight:int=None, nice:int=None, ionice:str=None, oom_score_adj:int=None, **kwargs) -> None:
+        if kwargs: logger.warning(f"unknown limits ignored: {', '.join(kwargs)}")
+        self.cpu_weight = cpu_weight
+        self.cpu_quota = cpu_quota # percent of a single cpu
+        self.memory_high = parse_size(memory_high) if memory_high is not None else None
+        self.memory_max = parse_size(memory_max) if memory_max is not None else None
+        self.io_weight = io_weight
+        self.nice = nice
+        self.ionice = ionice
+        self.oom_score_adj = oom_score_adj
+
+    # returns cgroup interface files and values for the configured limits
+    def cgroup_files(self) -> dict[str,str]:
+        files = {}
+        if self.cpu_weight is not None: files['cpu.weight'] = str(self.cpu_weight)
+        if self.cpu_quota is not None: files['cpu.max'] = f'{int(self.cpu_quota * 1000)} 100000'
+        if self.memory_high is not None: files['memory.high'] = str(self.memory_high)
+        if self.memory_max is not None: files['memory.max'] = str(self.memory_max)
+        if self.io_weight is not None: files['io.weight'] = f'default {self.io_weight}'
+        return files
+
+    # names of the configured limits that are not applied - cgroup is False if the app is not placed in a cgroup
+    def unenforced(self, cgroup:bool) -> list[str]:
+        names = [] if cgroup else [name for name in CGROUP_ONLY if getattr(self, name) is not None]
+        if self.ionice and not ((ionice := self._ionice()) and ioprio_setter(*ionice)): names.append('ionice')
+        return names
+
+    # returns a function to be run in the child process after fork, before exec
+    # cgroup_procs is the cgroup.procs file of the app's cgroup, or None to fall back to nice
+    # everything the child needs is prepared here - only plain syscalls are made after fork
+    def preexec(self, cgroup_procs:str=None):
+        nice = self.nice
+        if nice is None and cgroup_procs is None and self.cpu_weight is not None: nice = weight_to_nice(self.cpu_weight)
+        set_ioprio = ioprio_setter(*ionice) if (ionice := self._ionice()) else None
+        oom = self.oom_score_adj
+        # errors are ignored - raising here would prevent the app from starting
+        def _preexec():
+            if cgroup_procs:
+                try:
+                    with open(cgroup_procs, 'w') as f: f.write('0')
+                except OSError: pass
+            if nice is not None:
+                try: os.setpriority(os.PRIO_PROCESS, 0, nice)
+                except OSError: pass
+            if set_ioprio: set_ioprio()
+            if oom is not None:
+                try:
+                    with open('/proc/self/oom_score_adj', 'w') as f: f.write(str(oom))
+                except OSError: pass
+        return _preexec
+
+    def _ionice(self) -> tuple:
+        if not self.ionice: return None
+        cls, _, level = str(self.ionice).casefold().partition(':')
+        if cls not in IONICE_CLASSES: return None
+        if IONICE_CLASSES[cls] == 3: return (3, 0)
+        return (IONICE_CLASSES[cls], int(level) if level else 4)
+
+
+# Creates a cgroup v2 subtree per app beneath the cgroup DGSM is running in
+# an app's cgroup is kept after it stops and reused the next time it starts
+# the cgroup must be delegated to the user running DGSM (i.e. a systemd unit with Delegate=yes)
+# root and base can point to a fake cgroupfs for testing
+class CgroupManager:
+    def __init__(self, root:str=CGROUP_ROOT, base:str=None) -> None:
+        self.root = root
+        self.base = base
+        self._available = None
+
+    # returns True if app cgroups can be created - the result is cached after the first check
+    def available(self) -> bool:
+        if self._available is None: self._available = self._prepare()
+        return self._available
+
+    # create or update the cgroup for an app and write its limits - returns the cgroup path or None
+    def create(self, name:str, limits:Limits) -> str:
+        if not self.available(): return None
+        fname = re.sub(r'[^\w.-]', '_', name)
+        path = os.path.join(self.base, f'app-{fname}')
+        try: os.makedirs(path, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"unable to create cgroup {path}: {e}")
+            return None
+        for fname, value in limits.cgroup_files().items():
+            try:
+                with open(os.path.join(path, fname), 'w') as f: f.write(value)
+            except OSError as e: logger.warning(f"unable to set {fname}={value} for {name}: {e}")
+        return path
+
+    # returns the limits in effect for the cgroup at path
+    def effective(self, path:str) -> dict[str,str]:
+        values = {}
+        for fname in ('cpu.weight', 'cpu.max', 'memory.high', 'memory.max', 'io.weight'):
+            try:
+                with open(os.path.join(path, fname)) as f: values[fname] = f.read().strip().replace('\n', ', ')
+            except OSError: pass
+        return values
+
+    # locate the cgroup of this process and enable the controllers for its children
+    # a cgroup with processes in it cannot enable controllers for its children,
+    # so this process is moved into a leaf cgroup of its own first if necessary
+    def _prepare(self) -> bool:
+        if IS_WINDOWS or not os.path.exists(os.path.join(self.root, 'cgroup.controllers')): return False
+        if not self.base:
+            try:
+                with open('/proc/self/cgroup') as f:
+                    rel = next(line.split('::', 1)[1].strip() for line in f if line.startswith('0::'))
+            except (OSError, StopIteration): return False
+            self.base = os.path.join(self.root, rel.lstrip('/'))
+        try:
+            with open(os.path.join(self.base, 'cgroup.controllers')) as f: available = f.read().split()
+        except OSError: return False
+        enable = ' '.join(f'+{c}' for c in CONTROLLERS if c in available)
+        if not enable: return False
+        try:
+            self._write(os.path.join(self.base, 'cgroup.subtree_control'), enable)
+            return True
+        except OSError: pass
+        try:
+            leaf = os.path.join(self.base, 'dgsm')
+            os.makedirs(leaf, exist_ok=True)
+            self._write(os.path.join(leaf, 'cgroup.procs'), str(os.getpid()))
+            self._write(os.path.join(self.base, 'cgroup.subtree_control'), enable)
+            return True
+        except OSError as e:
+            logger.info(f"cgroups are not delegated to dgsm, falling back to nice: {e}")
+            return False
+
+    def _write(self, path:str, value:str) -> None:
+        with open(path, 'w') as f: f.write(value)
+
+
+CGROUPS = CgroupManager()
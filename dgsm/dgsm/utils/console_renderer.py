@@ -0,0 +1,94 @@
+import asyncio
+from collections import deque
+import time
+from typing import Callable
+
+import aioconsole
+
+from dgsm.utils.subscription import Subscription
+
+
+CLEAR_LINE = '\033[2K\033[1G' # clear the current line (the prompt) and place the cursor at its beginning
+
+# Console output at a capped frame rate
+# output and messages are buffered and written at most 'fps' times per second, each frame is a single write
+#   that clears the prompt, prints everything buffered since the last frame in the order it arrived and redraws the prompt once
+# app output (see feed) is kept in a backlog of at most 'backlog' lines - when the console falls behind the oldest lines are
+#   dropped and the next frame says how many were skipped from each source. messages (i.e. command responses) are never dropped
+class ConsoleRenderer:
+    def __init__(self, prompt:Callable[[], str], fps:float=30.0, backlog:int=2000) -> None:
+        self.prompt = prompt
+        self.interval = 1.0 / max(float(fps), 1.0)
+        self.backlog = max(int(backlog), 1)
+        self.frames = 0
+        self.dropped = 0
+        self._buffer:deque[tuple[str, str]] = deque() # (source, text) in arrival order - source is None for messages
+        self._lines = 0 # output lines in the buffer
+        self._held:list[str] = [] # messages that were ahead of dropped output - still written before the rest of the buffer
+        self._skipped:dict[str, int] = {} # source -> lines dropped since the last frame
+        self._wake = asyncio.Event()
+        self._task:asyncio.Task = None
+
+    def start(self) -> asyncio.Task:
+        if not self._task: self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    def stop(self) -> None:
+        if self._task: self._task.cancel()
+        self._task = None
+
+    # queue a message for the next frame
+    def message(self, text:str) -> None:
+        self._buffer.append((None, text))
+        self._wake.set()
+
+    # queue app output of source for the next frame - the oldest lines are dropped once the backlog is full
+    def output(self, lines:list[str], skipped:int=0, source:str='') -> None:
+        if (over := len(lines) - self.backlog) > 0:
+            lines = lines[over:]
+            skipped += over
+        if skipped: self._skipped[source] = self._skipped.get(source, 0) + skipped
+        self._buffer.extend((source, line) for line in lines)
+        self._lines += len(lines)
+        while self._lines > self.backlog:
+            src, text = self._buffer.popleft()
+            if src is None:
+                self._held.append(text)
+                continue
+            self._lines -= 1
+            self._skipped[src] = self._skipped.get(src, 0) + 1
+        self._wake.set()
+
+    # render the lines of sub, each prefixed with prefix, until it is closed - sub should be a batch subscription
+    # skipped lines are reported for source, which defaults to the prefix
+    async def feed(self, sub:Subscription, prefix:str='', source:str=None) -> None:
+        dropped = 0
+        async for lines in sub:
+            if prefix: lines = [f'{prefix}{line}' for line in lines]
+            self.output(lines, sub.dropped - dropped, prefix if source is None else source)
+            dropped = sub.dropped
+
+    # the text of the next frame - empties the buffers
+    def _frame(self) -> str:
+        lines = self._held
+        for source, count in self._skipped.items():
+            lines.append(f"[{count} lines{f' of {source}' if source else ''} skipped - the console is behind]")
+            self.dropped += count
+        lines.extend(text for _, text in self._buffer)
+        self._buffer.clear()
+        self._lines = 0
+        self._held = []
+        self._skipped = {}
+        return f"{CLEAR_LINE}{chr(10).join(lines)}\n{self.prompt()}"
+
+    async def _run(self) -> None:
+        last = 0.0
+        while True:
+            await self._wake.wait()
+            # wait out the rest of the frame so everything arriving until then is written together
+            if (delay := last + self.interval - time.monotonic()) > 0: await asyncio.sleep(delay)
+            self._wake.clear()
+            if not self._buffer and not self._held and not self._skipped: continue
+            last = time.monotonic()
+            self.frames += 1
+            await aioconsole.aprint(self._frame(), end='')
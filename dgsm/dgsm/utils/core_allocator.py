@@ -0,0 +1,92 @@
+import os
+import psutil
+
+from dgsm.utils.log_util import make_logger
+
+
+logger = make_logger(__name__)
+IS_LINUX = hasattr(os, 'sched_setaffinity')
+_GONE = (psutil.NoSuchProcess, psutil.ZombieProcess)
+
+# returns the cpus this process is allowed to run on
+def usable_cpus() -> list[int]:
+    if IS_LINUX: return sorted(os.sched_getaffinity(0))
+    try: return sorted(psutil.Process().cpu_affinity())
+    except (AttributeError, psutil.Error): return list(range(psutil.cpu_count() or 1))
+
+# format a list of cpus as ranges, i.e. [0, 1, 2, 3, 6] -> '0-3,6'
+def format_cpus(cpus:list[int]) -> str:
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1: ranges[-1][1] = cpu
+        else: ranges.append([cpu, cpu])
+    return ','.join(f'{a}-{b}' if a != b else str(a) for a, b in ranges)
+
+# pin every thread of every process in procs to cpus - returns the number of threads that were pinned
+# sched_setaffinity only applies to a single thread on linux, so threads that already exist are pinned individually
+def set_tree_affinity(procs:list[psutil.Process], cpus:list[int]) -> int:
+    pinned = 0
+    for p in procs:
+        try:
+            if not IS_LINUX:
+                p.cpu_affinity(cpus)
+                pinned += p.num_threads()
+                continue
+            for thread in p.threads():
+                try:
+                    os.sched_setaffinity(thread.id, cpus)
+                    pinned += 1
+                except ProcessLookupError: pass # thread ended
+        except (*_GONE, ProcessLookupError): pass
+        except (psutil.AccessDenied, PermissionError) as e: logger.warning(f"unable to set cpu affinity of process {p.pid}: {e}")
+    return pinned
+
+
+# Partitions the usable cpus into disjoint sets, one per running app, sized by each app's weight
+# 'reserved' cpus are kept out of every set for dgsm and the os - the highest numbered cpus are reserved
+#   so cpu 0, which usually handles most interrupts, is given to an app only when there is nothing else
+# when more apps are running than cpus are available, apps share cpus round robin
+class CoreAllocator:
+    def __init__(self, reserved:int=2, cpus:list[int]=None) -> None:
+        self.cpus = sorted(cpus) if cpus else usable_cpus()
+        self.reserved = max(0, min(reserved, len(self.cpus) - 1))
+        self._weights:dict[str,float] = {}
+        self.assignments:dict[str,list[int]] = {}
+
+    # cpus apps can be assigned to - spare cpus are handed out from the lowest numbered cpu after 0
+    @property
+    def pool(self) -> list[int]:
+        pool = self.cpus[:len(self.cpus) - self.reserved]
+        return pool[1:] + pool[:1]
+
+    # add or remove an app - weight <= 0 removes it
+    # returns the new assignments of all apps
+    def update(self, name:str, weight:float) -> dict[str,list[int]]:
+        if weight > 0: self._weights[name] = weight
+        else: self._weights.pop(name, None)
+        return self.rebalance()
+
+    # recompute the cpu sets of all apps
+    # each app gets at least one cpu, the rest are split by weight (largest remainder)
+    # apps are laid out in the order they started so a change only shifts the apps that started after it
+    def rebalance(self) -> dict[str,list[int]]:
+        pool = self.pool
+        if not self._weights:
+            self.assignments = {}
+            return {}
+        names = list(self._weights)
+        if len(names) >= len(pool):
+            self.assignments = {name: [pool[i % len(pool)]] for i, name in enumerate(names)}
+            return dict(self.assignments)
+        total = sum(self._weights.values())
+        spare = len(pool) - len(names)
+        shares = {n: spare * self._weights[n] / total for n in names}
+        counts = {n: 1 + int(shares[n]) for n in names}
+        left = len(pool) - sum(counts.values())
+        for n in sorted(names, key=lambda n: shares[n] - int(shares[n]), reverse=True)[:left]: counts[n] += 1
+        assignments, start = {}, 0
+        for n in names:
+            assignments[n] = sorted(pool[start:start + counts[n]])
+            start += counts[n]
+        self.assignments = assignments
+        return dict(assignments)
@@ -0,0 +1,101 @@
+import re
+import time
+
+
+# numbers and hex values are masked so lines that only differ by them are treated as repeats
+_VARIANT = re.compile(r'0x[0-9a-f]+|\d+', re.IGNORECASE)
+
+# Collapses runs of identical or near-identical lines
+# the first line of a run is passed through, the repeats are counted and replaced by a single summary line
+# the summary is emitted when the run ends, or every 'summary_interval' seconds while it continues
+# a run that ends because the output stops is summarized by flush
+# lines marked as critical are never collapsed
+class FloodControl:
+    def __init__(self, summary_interval:float=5.0) -> None:
+        self.summary_interval = summary_interval
+        self.collapsed = 0
+        self._last_line = None
+        self._last_key = None
+        self._repeats = 0
+        self._summary_ts = 0.0
+        self._seen_ts = 0.0 # last time lines were filtered
+
+    # returns the lines that survive deduplication and the indexes of the critical lines within them
+    # critical is a set of indexes into lines that must always be passed through
+    def filter(self, lines:list[str], critical:set[int]=frozenset()) -> tuple[list[str], set[int]]:
+        out = []
+        kept = set()
+        for i, line in enumerate(lines):
+            if i in critical:
+                self._end_run(out)
+                kept.add(len(out))
+                out.append(line)
+                continue
+            key = None if line == self._last_line else _VARIANT.sub('#', line)
+            if key is None or key == self._last_key:
+                self._repeats += 1
+                self.collapsed += 1
+                continue
+            self._end_run(out)
+            self._last_line = line
+            self._last_key = key
+            self._summary_ts = time.monotonic()
+            out.append(line)
+        # report long running floods periodically instead of waiting for them to end
+        if self._repeats and time.monotonic() - self._summary_ts >= self.summary_interval:
+            out.append(self._summary())
+        self._seen_ts = time.monotonic()
+        return out, kept
+
+    # end the current run - returns its summary if repeats are pending and no lines were filtered for 'idle' seconds
+    def flush(self, idle:float=0.0) -> list[str]:
+        if not self._repeats or time.monotonic() - self._seen_ts < idle: return []
+        out = []
+        self._end_run(out)
+        return out
+
+    def _end_run(self, out:list[str]) -> None:
+        if self._repeats: out.append(self._summary())
+        self._last_line = self._last_key = None
+
+    def _summary(self) -> str:
+        msg = f'[last line repeated {self._repeats} time{"s" if self._repeats != 1 else ""}]'
+        self._repeats = 0
+        self._summary_ts = time.monotonic()
+        return msg
+
+
+# Token bucket limiting the number of lines per second delivered to a single consumer
+# lines beyond the limit are dropped and counted - the consumer is told how many were dropped once lines flow again
+class RateLimiter:
+    def __init__(self, rate:float=50.0, burst:float=200.0) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.dropped = 0
+        self._tokens = self.burst
+        self._ts = time.monotonic()
+        self._pending_drops = 0
+
+    # returns the lines allowed through - lines at the indexes in 'keep' are always allowed and cost no tokens
+    def limit(self, lines:list[str], keep:set[int]=frozenset()) -> list[str]:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._ts) * self.rate)
+        self._ts = now
+        allowed = min(len(lines) - len(keep), int(self._tokens))
+        self._tokens -= allowed
+        if allowed + len(keep) == len(lines): out = lines
+        elif not keep: out = lines[:allowed]
+        else:
+            out = []
+            for i, line in enumerate(lines):
+                if i in keep: out.append(line)
+                elif allowed > 0:
+                    out.append(line)
+                    allowed -= 1
+        if dropped := len(lines) - len(out):
+            self.dropped += dropped
+            self._pending_drops += dropped
+        elif self._pending_drops and out:
+            out = [f'[{self._pending_drops} lines dropped]', *out]
+            self._pending_drops = 0
+        return out
@@ -1,6 +1,8 @@
 from abc import ABCMeta
 from collections import UserDict
+from collections.abc import Mapping
 from typing import Callable, Hashable
+import weakref
 
 
 TAGS = '__intf_tags'
@@ -17,45 +19,112 @@ def interface_tag(intf_name:Hashable):
         return wrapped
     return decorator
 
+# live BoundInterfaces - rebuilt in place whenever any InterfaceGroup is changed
+_bound:'weakref.WeakSet[BoundInterface]' = weakref.WeakSet()
+_version = 0
+
+# incremented whenever an interface changes - anything derived from an interface can compare it to know it is stale
+def interface_version() -> int: return _version
+
+# rebuild every bound table after an interface changed
+def _invalidate() -> None:
+    global _version
+    _version += 1
+    for table in list(_bound): table._build()
+
+
 # Object for holding a group of descriptors that share the same interface_group
 # Each class will have one TagGroup per unique interface_group added to its definition at instantiation
+# maps each tag to (defining class, method name) - accessing the group from an instance returns that instance's BoundInterface
 class InterfaceGroup(UserDict):
-    def __init__(self, name) -> None:
+    def __init__(self, name, owner:type=None) -> None:
         self.name = name
-        self._accessing_inst = None
+        self.owner = owner
         super().__init__()
-        
+
     def __getitem__(self, key):
-        if not (attr := self.data.get(key, None)): return None
-        return getattr(attr[0], attr[1]).__get__(self._accessing_inst) if self._accessing_inst else attr
-    
+        return self.data.get(key, None)
+
+    # changing the interface after the class is defined rebuilds the bound tables of existing instances
     def __setitem__(self, key, item):
         # this brach is used during meta class init
         if type(item) is tuple: return super().__setitem__(key, item)
-        
+
         # replace existing method in interface
-        if self._accessing_inst and (attr := self.data.get(key, None)):
-            setattr(attr[0], attr[1], item)
-            return super().__setitem__(key, (attr[0], attr[1]))
-        
+        if attr := self.data.get(key, None): setattr(attr[0], attr[1], item)
         # add a new method to interface
-        setattr(self._accessing_inst.__class__, item.__name__, item)
-        rval = super().__setitem__(key, (self._accessing_inst.__class__, item.__name__))
-        # propagate new method to subclasses
-        for cls in type(self._accessing_inst).__subclasses__():
-            if not getattr(cls, self.name, None): setattr(cls, self.name, InterfaceGroup(self.name))
-            getattr(cls, self.name).update({key: (type(self._accessing_inst), item.__name__)})
-        return rval
-    
+        else:
+            setattr(self.owner, item.__name__, item)
+            super().__setitem__(key, (self.owner, item.__name__))
+            # propagate new method to subclasses that do not implement it themselves
+            subclasses = self.owner.__subclasses__()
+            while subclasses:
+                cls = subclasses.pop()
+                subclasses.extend(cls.__subclasses__())
+                group = cls.__dict__.get(self.name)
+                if group is None: setattr(cls, self.name, group := InterfaceGroup(self.name, cls))
+                if key not in group.data: group.data[key] = (self.owner, item.__name__)
+        _invalidate()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        _invalidate()
+
     def __getattr__(self, name):
-        if attr := getattr(super(), name, None): return attr
+        if name == 'data': raise AttributeError(name) # not initialized yet
         if not (attr := self.data.get(name, None)):
-            raise AttributeError(f"'{type(self._accessing_inst).__name__}' object does not implement '{name}' in the '{self.name}' interface")
-        return getattr(attr[0], attr[1]).__get__(self._accessing_inst) if self._accessing_inst else attr
-    
+            raise AttributeError(f"'{getattr(self.owner, '__name__', None)}' does not implement '{name}' in the '{self.name}' interface")
+        return attr
+
+    # non-data descriptor - the bound table is stored on the instance, so later lookups never reach this method
     def __get__(self, inst, _):
-        self._accessing_inst = inst
-        return self
+        if inst is None: return self
+        table = inst.__dict__[self.name] = BoundInterface(self.name, inst)
+        return table
+
+
+# Mapping of the methods of an instance's interface group, bound to the instance
+# built once per instance and group, and rebuilt only when an InterfaceGroup is changed
+# methods are available by tag (interface['start'] or interface.get('start')) or as attributes (interface.start)
+#   a tag that is not implemented is None
+# setting or deleting a tag changes the interface of the instance's class, as it did before tables were bound per instance
+# funcs holds the bound methods in the order of the tags, i.e. to dispatch by index
+class BoundInterface(Mapping):
+    def __init__(self, name, inst) -> None:
+        self.name = name
+        self._inst = weakref.ref(inst)
+        self._table:dict = {}
+        self.funcs:tuple = ()
+        self.version = -1
+        self._build()
+        _bound.add(self)
+
+    def _build(self) -> None:
+        if (inst := self._inst()) is None: return
+        group = self._group()
+        self._table = {tag: getattr(attr[0], attr[1]).__get__(inst) for tag, attr in group.data.items()}
+        self.funcs = tuple(self._table.values())
+        self.version = _version
+
+    def __getitem__(self, key): return self._table.get(key, None)
+    def __setitem__(self, key, item) -> None: self._group()[key] = item
+    def __delitem__(self, key) -> None: del self._group()[key]
+    def _group(self) -> InterfaceGroup: return getattr(type(self._inst()), self.name)
+    def __iter__(self): return iter(self._table)
+    def __len__(self) -> int: return len(self._table)
+    def __contains__(self, key) -> bool: return key in self._table
+    def get(self, key, default=None): return self._table.get(key, default)
+
+    def __getattr__(self, name):
+        if name.startswith('_'): raise AttributeError(name)
+        try: return self._table[name]
+        except KeyError: pass
+        raise AttributeError(f"'{type(self._inst()).__name__}' object does not implement '{name}' in the '{self.name}' interface")
+
+    def __repr__(self) -> str: return f'<{self.name} of {self._inst()!r}: {list(self._table)}>'
+    # tables are compared and hashed by identity, they are tracked in a WeakSet
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
 
 
 # Interface Group Introspector
@@ -71,7 +140,7 @@ class IGIMeta(type):
             base_groups = getattr(base, TAGS, [])
             for group_name in base_groups:
                 if group_name not in tag_groups:
-                    setattr(cls, group_name, InterfaceGroup(group_name))
+                    setattr(cls, group_name, InterfaceGroup(group_name, cls))
                     tag_groups.append(group_name)
                 # add base class's TagGroup info to our TagGroup
                 getattr(cls, group_name).update(getattr(base, group_name))
@@ -81,7 +150,7 @@ class IGIMeta(type):
             method_tags = getattr(member, TAGS, {})
             for group_name, tag in method_tags.items():
                 if group_name not in tag_groups:
-                    setattr(cls, group_name, InterfaceGroup(group_name))
+                    setattr(cls, group_name, InterfaceGroup(group_name, cls))
                     tag_groups.append(group_name)
                 getattr(cls, group_name).update({tag: (cls, member.__name__)})
         return super().__init__(clsname, bases, attrs)
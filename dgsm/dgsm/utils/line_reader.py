@@ -0,0 +1,80 @@
+import asyncio
+import errno
+import re
+from typing import AsyncIterator
+
+
+BLOCK_SIZE = 1 << 16
+MAX_LINE = 1 << 16
+TRUNCATED = ' [truncated]'
+# escape sequences (CSI, OSC and two character escapes) and the remaining control characters except tab
+CONTROL = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)?|\x1b[@-_]|[\x00-\x08\x0b-\x1f\x7f]')
+
+# returns line as a terminal would leave it - control sequences removed and carriage returns applied
+# text after a carriage return overwrites the line, only the last non-empty segment is kept
+def clean_terminal_line(line:str) -> str:
+    if '\r' in line: line = next((seg for seg in reversed(line.split('\r')) if seg), '')
+    if '\x1b' in line or not line.isprintable(): line = CONTROL.sub('', line)
+    return line
+
+# Splits a byte stream into decoded lines
+# data is fed in arbitrarily sized blocks - every complete line in a block is decoded with a single call
+# a partial line is carried over to the next block
+# lines longer than max_line are truncated - the remainder is discarded up to the next newline
+# if terminal is True the output is from a pseudo-terminal - control sequences are stripped and carriage returns applied
+class LineSplitter:
+    def __init__(self, encoding:str='utf-8', errors:str='replace', max_line:int=MAX_LINE, terminal:bool=False) -> None:
+        self.encoding = encoding
+        self.errors = errors
+        self.max_line = max_line
+        self.terminal = terminal
+        self.truncated = 0
+        self._partial = b''
+        self._discarding = False
+
+    # returns list of complete lines contained in data with line endings removed
+    def feed(self, data:bytes) -> list[str]:
+        if self._discarding: # drop the remainder of an over-long line
+            if (nl := data.find(b'\n')) < 0: return []
+            data = data[nl+1:]
+            self._discarding = False
+        buf = self._partial + data if self._partial else data
+        lines = []
+        if (end := buf.rfind(b'\n')) >= 0:
+            lines = buf[:end].decode(self.encoding, self.errors).split('\n')
+            for i, line in enumerate(lines):
+                if line.endswith('\r'): line = lines[i] = line[:-1]
+                if self.terminal: line = lines[i] = clean_terminal_line(line)
+                if len(line) > self.max_line: lines[i] = self._truncate(line)
+            buf = buf[end+1:]
+        # an incomplete line that is already too long is emitted now instead of growing without bound
+        if len(buf) > self.max_line:
+            lines.append(self._truncate(buf[:self.max_line].decode(self.encoding, self.errors)))
+            self._discarding = True
+            buf = b''
+        self._partial = buf
+        return lines
+
+    # return any remaining partial line
+    def flush(self) -> list[str]:
+        if not self._partial: return []
+        line = self._partial.decode(self.encoding, self.errors).rstrip('\r')
+        self._partial = b''
+        return [clean_terminal_line(line) if self.terminal else line]
+
+    def _truncate(self, line:str) -> str:
+        self.truncated += 1
+        return f'{line[:self.max_line]}{TRUNCATED}'
+
+
+# read stream in large blocks and yield each batch of complete lines as it becomes available
+# reading a pseudo-terminal fails with EIO once the app closes it - this is treated as the end of the stream
+async def read_lines(stream:asyncio.StreamReader, splitter:LineSplitter, block_size:int=BLOCK_SIZE) -> AsyncIterator[list[str]]:
+    while True:
+        try: data = await stream.read(block_size)
+        except OSError as e:
+            if e.errno != errno.EIO: raise
+            break
+        if not data: break
+        if lines := splitter.feed(data): yield lines
+    if lines := splitter.flush(): yield lines
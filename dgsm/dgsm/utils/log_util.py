@@ -1,29 +1,162 @@
+import contextvars
+import copy
+from datetime import datetime
+import json
 import logging
-import inspect
 import os
 import queue
+import re
+import sys
+import threading
+import time
 from logging import handlers
 
 
 ### helpers for non-blocking logging ###
+# records are filtered, rate limited and given their context on the logging caller's side, then passed through a queue
+# formatting and writing happens on the queue listener's thread, off the event loop
 
 # handlers used by queue listener
 _q = _q_handler = _listener = None
 _handlers = []
+_default_handler:logging.Handler = None
+_limiter:'KeyRateLimiter' = None
+_loggers:list[logging.Logger] = []
+_level = 'INFO'
 @property
 def log_handlers():
     return _handlers
 
+# fields added to every record logged in the current context, i.e. {'app': 'MyMinecraftWorld'}
+# tasks copy the context when they are created, so tasks started by an app's command log with that app's fields
+log_context:contextvars.ContextVar[dict] = contextvars.ContextVar('log_context', default={})
+
+# set fields on the current context - returns the token to reset it with
+def set_log_context(**fields) -> contextvars.Token:
+    return log_context.set({**log_context.get(), **fields})
+
+# copy of the current context with fields set - i.e. context_with(...).run(loop.create_task, coro)
+# (create_task only takes a context from python 3.11, a task created inside run() copies the context it runs in)
+def context_with(**fields) -> contextvars.Context:
+    ctx = contextvars.copy_context()
+    ctx.run(set_log_context, **fields)
+    return ctx
+
+
+# Writes each record as one JSON object per line
+# {"ts": ..., "level": ..., "logger": ..., "msg": ..., <context fields>, "suppressed": ..., "exc": ...}
+class JsonFormatter(logging.Formatter):
+    def format(self, record:logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(getattr(record, 'ctx', {}))
+        if suppressed := getattr(record, 'suppressed', 0): entry['suppressed'] = suppressed
+        if record.exc_info and not record.exc_text: record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text: entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+TEXT_FORMATTER = logging.Formatter(fmt='%(asctime)s - %(levelname)-6s - %(name)s - %(message)s')
+FORMATTERS = {'json': JsonFormatter, 'text': lambda: TEXT_FORMATTER}
+
+
+# Token bucket per message key - a flood of the same message can not fill the disk
+# the key of a record is its 'key' extra if given (logger.warning(..., extra={'key': 'unknown_app'})),
+#   otherwise the line it was logged from, so messages that only differ by their values share a key
+# the next record let through for a key reports how many were suppressed before it
+# at most max_keys keys are tracked, the least recently used are forgotten first
+class KeyRateLimiter(logging.Filter):
+    def __init__(self, rate:float=1.0, burst:float=10.0, max_keys:int=1024) -> None:
+        super().__init__()
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_keys = max_keys
+        self.suppressed = 0
+        self._buckets:dict = {} # key -> [tokens, last update, suppressed]
+        self._lock = threading.Lock() # records are logged from threads as well
+
+    def filter(self, record:logging.LogRecord) -> bool:
+        if not self.rate: return True
+        key = getattr(record, 'key', None) or (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            if (bucket := self._buckets.pop(key, None)) is None:
+                bucket = [self.burst, now, 0]
+                if len(self._buckets) >= self.max_keys: del self._buckets[next(iter(self._buckets))]
+            self._buckets[key] = bucket # most recently used last
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1.0:
+                bucket[2] += 1
+                self.suppressed += 1
+                return False
+            bucket[0] -= 1.0
+            record.suppressed, bucket[2] = bucket[2], 0
+        return True
+
+
+# Queue handler that keeps the record's context and traceback for the listener's formatters
+# the message is rendered here, on the logging caller's side, since args may not be safe to format later
+class ContextQueueHandler(handlers.QueueHandler):
+    def prepare(self, record:logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        if suppressed := getattr(record, 'suppressed', 0):
+            record.msg += f' ({suppressed} similar message{"s" if suppressed != 1 else ""} suppressed)'
+        record.args = None
+        record.ctx = {**log_context.get(), **({'app': record.app} if getattr(record, 'app', None) else {})}
+        if record.exc_info:
+            record.exc_text = record.exc_text or TEXT_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# Writes the records of each app to its own file at directory/<app>.log - records without an app are ignored
+# files are opened when an app first logs and rotate like the main log
+class AppShardHandler(logging.Handler):
+    _UNSAFE = re.compile(r'[^\w.-]+')
+
+    def __init__(self, directory:str, formatter:logging.Formatter=None, when:str='H', interval:int=6, backup_count:int=12) -> None:
+        super().__init__()
+        self.directory = directory
+        self.rotation = {'when': when, 'interval': interval, 'backupCount': backup_count}
+        self._files:dict[str, logging.Handler] = {}
+        if formatter: self.setFormatter(formatter)
+
+    def emit(self, record:logging.LogRecord) -> None:
+        if not (app := getattr(record, 'ctx', {}).get('app')): return
+        try:
+            if not (handler := self._files.get(app)):
+                os.makedirs(self.directory, exist_ok=True)
+                name = self._UNSAFE.sub('_', app).strip('._') or 'app'
+                handler = handlers.TimedRotatingFileHandler(os.path.join(self.directory, f'{name}.log'), delay=True, **self.rotation)
+                handler.setFormatter(self.formatter)
+                self._files[app] = handler
+            handler.emit(record)
+        except Exception: self.handleError(record)
+
+    def close(self) -> None:
+        for handler in self._files.values(): handler.close()
+        self._files = {}
+        super().close()
+
+
 # create the queue and default handler
-def init_logging(default:bool=True, fname:str=''):
+def init_logging(default:bool=True, fname:str='', fmt:str='json'):
     global _q
     global _q_handler
+    global _default_handler
+    global _limiter
     if _q: return
     _q = queue.Queue(-1)
-    _q_handler = handlers.QueueHandler(_q)
+    _q_handler = ContextQueueHandler(_q)
+    _limiter = KeyRateLimiter()
+    _q_handler.addFilter(_limiter)
 
     if default:
-        formatter = logging.Formatter(fmt='%(asctime)s - %(levelname)-6s - %(name)s - %(message)s')
         lpath = os.path.join(os.getcwd(), 'logs')
         if not os.path.exists(lpath): os.mkdir(lpath)
         fname = fname if fname else __package__.split(".")[0]
@@ -34,16 +167,36 @@ def init_logging(default:bool=True, fname:str=''):
             backupCount=12,
             delay=True
         )
-        handler.setFormatter(formatter)
+        handler.setFormatter(FORMATTERS[fmt]())
+        _default_handler = handler
         add_handler(handler)
 
+# apply the 'logging' config - must be called before start_logging
+#   format: 'json' (one JSON object per line) or 'text'
+#   rate, burst: messages per second allowed for each message key and how many may be logged at once
+#   per_app: also write the records of each app to logs/apps/<app>.log
+def configure_logging(format:str='json', rate:float=1.0, burst:float=10.0, per_app:bool=False, level:str='INFO') -> None:
+    if not _q_handler: init_logging()
+    if format not in FORMATTERS: raise ValueError(f"logging format must be one of {', '.join(FORMATTERS)}")
+    formatter = FORMATTERS[format]()
+    if _default_handler: _default_handler.setFormatter(formatter)
+    _limiter.rate, _limiter.burst = rate, max(burst, 1.0)
+    if per_app and not any(isinstance(h, AppShardHandler) for h in _handlers):
+        add_handler(AppShardHandler(os.path.join(os.getcwd(), 'logs', 'apps'), formatter))
+    global _level
+    _level = level
+    for logger in _loggers: logger.setLevel(level)
+
 # create a logger, attach the queue, return the logger
+# name should be the module's __name__ - defaults to the __name__ of the calling module
 def make_logger(name:str='') -> logging.Logger:
     if not _q_handler: init_logging()
-    if not name: name = os.path.basename(inspect.stack()[1].filename)
+    if not name: name = sys._getframe(1).f_globals.get('__name__', 'dgsm')
     _logger = logging.getLogger(name)
-    _logger.addHandler(_q_handler)
-    _logger.setLevel('INFO')
+    if _q_handler not in _logger.handlers: _logger.addHandler(_q_handler)
+    _logger.propagate = False # the queue is attached to every logger, propagating would log records twice
+    _logger.setLevel(_level)
+    if _logger not in _loggers: _loggers.append(_logger)
     return _logger
 
 # removes all current handlers for logger and replaces with q_handler for non-blocking logging
@@ -52,7 +205,7 @@ def set_q_handler(logger:logging.Logger):
     for handler in logger.handlers:
         logger.removeHandler(handler)
     logger.addHandler(_q_handler)
-    logger.setLevel('INFO')
+    logger.setLevel(_level)
 
 # add handlers to the listener
 def add_handler(handler:logging.Handler) -> None:
@@ -62,10 +215,11 @@ def add_handler(handler:logging.Handler) -> None:
 def start_logging():
     global _listener
     if _listener: return
-    _listener = handlers.QueueListener(_q, *_handlers)
+    _listener = handlers.QueueListener(_q, *_handlers, respect_handler_level=True)
     _listener.start()
 
 def stop_logging():
     global _listener
+    if not _listener: return
     _listener.stop()
-    _listener = None
\ No newline at end of file
+    _listener = None
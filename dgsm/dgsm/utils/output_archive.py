@@ -0,0 +1,231 @@
+import atexit
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import itertools
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+
+from dgsm.utils.log_util import make_logger
+
+
+logger = make_logger(__name__)
+_STOP = object()
+
+# Archive of raw app output on disk
+# batches of lines are handed to a writer thread so the event loop never touches the disk
+# output is written to segments which are rotated by size and age
+# closed segments are gzip compressed in the background
+# an index of every segment's time range is kept in <name>.index.json for fast lookups - it is rebuilt from the segments if it is lost
+# each writer thread has its own queue, so a new segment is opened while the last one is still being closed
+class OutputArchive:
+    def __init__(self, path:str, name:str, max_bytes:int=1<<26, max_age:float=86400, keep:int=0, compress:bool=True) -> None:
+        self.path = path
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.keep = keep
+        self.compress = compress
+        self._q:queue.SimpleQueue = None # queue of the current writer thread
+        self._thread:threading.Thread = None
+        self._closing:list[threading.Thread] = [] # writers that were sent _STOP and may still be closing their segment
+        self._compressing:set[str] = set() # files of segments being compressed - never deleted by retention
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{name}-archive-gz')
+        self._index_path = os.path.join(path, f'{name}.index.json')
+        os.makedirs(path, exist_ok=True)
+        self._index:list[dict] = self._load_index()
+        # segments left uncompressed by an unclean shutdown are compressed now
+        if compress:
+            for seg in self._index:
+                if not seg['file'].endswith('.gz'): self._submit_compress(seg)
+        atexit.register(self.join)
+
+    # queue a batch of lines to be written - never blocks
+    def write(self, lines:list[str], ts:float=None) -> None:
+        if not self._thread or not self._thread.is_alive():
+            self._q = queue.SimpleQueue()
+            self._thread = threading.Thread(target=self._writer, args=(self._q,), name=f'{self.name}-archive', daemon=True)
+            self._thread.start()
+        self._q.put((time.time() if ts is None else ts, lines))
+
+    # close the current segment - the next write opens a new one
+    def close(self) -> None:
+        if not self._thread: return
+        self._q.put(_STOP)
+        self._closing = [t for t in self._closing if t.is_alive()] + [self._thread]
+        self._q = self._thread = None
+
+    # close and wait until everything queued is on disk
+    def join(self) -> None:
+        self.close()
+        for thread in self._closing: thread.join()
+        self._compressor.shutdown(wait=True)
+
+    # returns index entries of all segments that overlap the time range [start, end]
+    def segments(self, start:float=0, end:float=None) -> list[dict]:
+        with self._lock:
+            return [
+                dict(seg) for seg in self._index
+                if seg['end'] >= start and (end is None or seg['start'] <= end)
+            ]
+
+    # returns an open text file for a segment returned by segments()
+    def open_segment(self, seg:dict):
+        fpath = os.path.join(self.path, seg['file'])
+        if fpath.endswith('.gz'): return gzip.open(fpath, 'rt', encoding='utf-8', errors='replace')
+        return open(fpath, encoding='utf-8', errors='replace')
+
+    ### writer thread ###
+
+    def _writer(self, q:queue.SimpleQueue) -> None:
+        f = seg = None
+        while True:
+            try: item = q.get(timeout=self._time_left(seg))
+            except queue.Empty: item = None
+            if item is _STOP:
+                if f: self._close_segment(f, seg)
+                return
+            # gather everything already queued into one write
+            batches = [item] if item else []
+            stop = False
+            while True:
+                try: item = q.get_nowait()
+                except queue.Empty: break
+                if item is _STOP:
+                    stop = True
+                    break
+                batches.append(item)
+            try:
+                if f and (seg['bytes'] >= self.max_bytes or self._time_left(seg) == 0):
+                    self._close_segment(f, seg)
+                    f = seg = None
+                if batches:
+                    if not f: f, seg = self._open_segment(batches[0][0])
+                    self._write_batches(f, seg, batches)
+            except OSError as e:
+                logger.error(f"{self.name} output archive write failed: {e}")
+            if stop:
+                if f: self._close_segment(f, seg)
+                return
+
+    def _write_batches(self, f, seg:dict, batches:list[tuple[float,list[str]]]) -> None:
+        chunks = []
+        for ts, lines in batches:
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+            chunks.append(''.join(f'{stamp} {line}\n' for line in lines))
+            seg['lines'] += len(lines)
+        data = ''.join(chunks).encode('utf-8', 'replace')
+        f.write(data)
+        seg['bytes'] += len(data)
+        seg['end'] = batches[-1][0]
+
+    # seconds until the open segment is due for rotation - None if there is no open segment
+    def _time_left(self, seg:dict) -> float:
+        if not seg or not self.max_age: return None
+        return max(seg['start'] + self.max_age - time.time(), 0)
+
+    # the segment file is created exclusively - a writer that is being closed may open a segment of the same second
+    def _open_segment(self, ts:float):
+        base = f"{self.name}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(ts))}"
+        for n in itertools.count():
+            fname = f'{base}.{n}.log' if n else f'{base}.log'
+            if os.path.exists(os.path.join(self.path, f'{fname}.gz')): continue
+            try: f = open(os.path.join(self.path, fname), 'xb', buffering=1<<16)
+            except FileExistsError: continue
+            break
+        seg = {'file': fname, 'start': ts, 'end': ts, 'bytes': 0, 'lines': 0, 'open': True}
+        # a writer that was closed may still open its segment after the next writer - the index stays in order of start
+        with self._lock: bisect.insort(self._index, seg, key=lambda seg: seg['start'])
+        self._save_index()
+        return f, seg
+
+    def _close_segment(self, f, seg:dict) -> None:
+        f.close()
+        with self._lock: seg.pop('open', None)
+        self._save_index()
+        if self.compress: self._submit_compress(seg)
+        self._apply_retention()
+
+    ### background maintenance ###
+
+    def _submit_compress(self, seg:dict) -> None:
+        with self._lock: self._compressing.add(seg['file'])
+        self._compressor.submit(self._compress, seg)
+
+    def _compress(self, seg:dict) -> None:
+        fname = seg['file']
+        src = os.path.join(self.path, fname)
+        try:
+            with open(src, 'rb') as fin, gzip.open(f'{src}.gz', 'wb') as fout:
+                shutil.copyfileobj(fin, fout, 1<<20)
+            with self._lock: seg['file'] = f"{seg['file']}.gz"
+            self._save_index()
+            os.remove(src)
+        except OSError as e:
+            logger.error(f"{self.name} unable to compress archive segment {seg['file']}: {e}")
+        finally:
+            with self._lock: self._compressing.discard(fname)
+
+    # delete the oldest closed segments beyond 'keep'
+    # segments still being compressed are left for a later pass
+    def _apply_retention(self) -> None:
+        if not self.keep: return
+        with self._lock:
+            closed = [seg for seg in self._index if not seg.get('open')]
+            expired = [seg for seg in closed[:max(len(closed) - self.keep, 0)] if seg['file'].removesuffix('.gz') not in self._compressing]
+            for seg in expired: self._index.remove(seg)
+        for seg in expired:
+            for fname in (seg['file'], f"{seg['file']}.gz"):
+                try: os.remove(os.path.join(self.path, fname))
+                except FileNotFoundError: pass
+        if expired: self._save_index()
+
+    def _load_index(self) -> list[dict]:
+        try:
+            with open(self._index_path) as f: index = json.load(f)
+        except FileNotFoundError: return self._rebuild_index()
+        except (OSError, ValueError) as e:
+            logger.warning(f"{self.name} archive index is unreadable and will be rebuilt: {e}")
+            return self._rebuild_index()
+        index = [seg for seg in index if os.path.exists(os.path.join(self.path, seg['file']))]
+        for seg in index: seg.pop('open', None) # left open by an unclean shutdown
+        return index
+
+    # index of the segments on disk - the start of a segment is in its name, its end is the time it was last written
+    # (line counts are not recovered)
+    # a .gz next to the segment it was compressed from is an interrupted compression and is removed
+    def _rebuild_index(self) -> list[dict]:
+        pattern = re.compile(rf'{re.escape(self.name)}-(\d{{8}}-\d{{6}})(?:\.(\d+))?\.log(\.gz)?')
+        found = []
+        for fname in os.listdir(self.path):
+            if not (m := pattern.fullmatch(fname)): continue
+            fpath = os.path.join(self.path, fname)
+            try:
+                if m.group(3) and os.path.exists(fpath[:-3]):
+                    os.remove(fpath)
+                    continue
+                st = os.stat(fpath)
+            except OSError: continue
+            start = time.mktime(time.strptime(m.group(1), '%Y%m%d-%H%M%S'))
+            seg = {'file': fname, 'start': start, 'end': max(st.st_mtime, start), 'bytes': st.st_size, 'lines': 0}
+            found.append((start, int(m.group(2) or 0), seg))
+        index = [seg for *_, seg in sorted(found, key=lambda item: item[:2])]
+        if index:
+            logger.info(f"{self.name} archive index rebuilt from {len(index)} segments")
+            with self._lock: self._index = index
+            self._save_index()
+        return index
+
+    def _save_index(self) -> None:
+        with self._save_lock:
+            with self._lock: data = json.dumps(self._index, indent=1)
+            tmp = f'{self._index_path}.tmp'
+            with open(tmp, 'w') as f: f.write(data)
+            os.replace(tmp, self._index_path)
@@ -0,0 +1,125 @@
+import asyncio
+import re
+from typing import Callable
+import uuid
+import weakref
+from dgsm.utils.pattern_set import BACKREF, scoped
+
+
+MAX_AGGREGATE = 1 << 20
+
+
+# State of a single output waiter
+# aggregating waiters collect every line (up to 'cap' characters) until they are resolved
+# count waiters resolve after 'count' lines, sub_string/pattern waiters resolve on the first matching line
+class Waiter:
+    def __init__(self, loop:asyncio.AbstractEventLoop, count:int=0, sub_string:str=None, pattern:re.Pattern=None, aggregate:bool=False, cap:int=MAX_AGGREGATE) -> None:
+        self.fut = loop.create_future()
+        self.count = count
+        self.sub_string = sub_string
+        self.pattern = pattern
+        self.aggregate = aggregate or count > 0
+        self.cap = cap
+        self.match:re.Match = None
+        self.line = ''
+        self.truncated = False
+        self._parts:list[str] = []
+        self._size = 0
+        self._seen = 0
+
+    @property
+    def output(self) -> str:
+        if not self.aggregate: return self.line
+        return ''.join(self._parts)
+
+    def collect(self, line:str) -> None:
+        if self._size < self.cap:
+            self._parts.append(f'{line}\n')
+            self._size += len(line) + 1
+        else: self.truncated = True
+        self._seen += 1
+        if self.count and self._seen >= self.count: self.resolve(True)
+
+    def hit(self, line:str, match:re.Match=None) -> None:
+        self.line = f'{line}\n'
+        self.match = match
+        self.resolve(True)
+
+    def resolve(self, satisfied:bool) -> None:
+        if not self.fut.done(): self.fut.set_result(satisfied)
+
+
+# Owner of a waiter for OutputMatcher.add - holds the function that removes the waiter
+# a coroutine keeps the cells of its function's closure alive, not the function itself, so a waiter that must live as long as
+#   an awaiter function or any coroutine it started is owned by a handle in the awaiter's closure
+class WaiterHandle:
+    __slots__ = ('stop', '__weakref__')
+
+
+# Shared matcher for all output waiters of an app
+# every line is checked against all sub_string waiters with one combined regex,
+# and against all pattern waiters with one combined prefilter - individual waiters are only checked on lines that hit
+class OutputMatcher:
+    def __init__(self) -> None:
+        self._waiters:dict[str,Waiter] = {}
+        self._aggregators:list[Waiter] = []
+        self._sub_waiters:list[Waiter] = []
+        self._pat_waiters:list[Waiter] = []
+        self._lone_waiters:list[Waiter] = []
+        self._sub_re:re.Pattern = None
+        self._pat_re:re.Pattern = None
+        self._dirty = False
+
+    def __len__(self) -> int: return len(self._waiters)
+
+    # register a waiter - returns a function that removes it
+    # the waiter is also removed automatically once 'owner' is garbage collected
+    def add(self, waiter:Waiter, owner:object=None) -> Callable[[], None]:
+        key = uuid.uuid4().hex
+        self._waiters[key] = waiter
+        self._dirty = True
+        if owner is not None: weakref.finalize(owner, self.remove, key)
+        return lambda: self.remove(key)
+
+    def remove(self, key:str) -> None:
+        if self._waiters.pop(key, None): self._dirty = True
+
+    # resolve every pending waiter as unsatisfied and remove them
+    def clear(self) -> None:
+        for waiter in self._waiters.values(): waiter.resolve(False)
+        self._waiters.clear()
+        self._dirty = True
+
+    def feed(self, lines:list[str]) -> None:
+        if not self._waiters: return
+        if self._dirty: self._rebuild()
+        aggregators, sub_re, pat_re = self._aggregators, self._sub_re, self._pat_re
+        for line in lines:
+            for w in aggregators:
+                if not w.fut.done(): w.collect(line)
+            if sub_re and sub_re.search(line):
+                for w in self._sub_waiters:
+                    if not w.fut.done() and w.sub_string in line: w.hit(line)
+            if pat_re and pat_re.search(line):
+                for w in self._pat_waiters:
+                    if not w.fut.done() and (m := w.pattern.search(line)): w.hit(line, m)
+            for w in self._lone_waiters:
+                if not w.fut.done() and (m := w.pattern.search(line)): w.hit(line, m)
+
+    # rebuild the combined patterns from the registered waiters
+    def _rebuild(self) -> None:
+        waiters = [w for w in self._waiters.values() if not w.fut.done()]
+        self._aggregators = [w for w in waiters if w.aggregate]
+        self._sub_waiters = [w for w in waiters if w.sub_string]
+        pats = [w for w in waiters if w.pattern is not None]
+        self._lone_waiters = [w for w in pats if BACKREF.search(w.pattern.pattern)]
+        self._pat_waiters = [w for w in pats if w not in self._lone_waiters]
+        subs = sorted({w.sub_string for w in self._sub_waiters}, key=len, reverse=True)
+        self._sub_re = re.compile('|'.join(re.escape(s) for s in subs)) if subs else None
+        self._pat_re = None
+        if self._pat_waiters:
+            try: self._pat_re = re.compile('|'.join(scoped(w.pattern) for w in self._pat_waiters))
+            except re.error: # i.e. the same group name in two patterns - check each pattern on its own
+                self._lone_waiters.extend(self._pat_waiters)
+                self._pat_waiters = []
+        self._dirty = False
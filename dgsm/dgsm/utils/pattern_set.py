@@ -0,0 +1,91 @@
+import re
+try: from re import _parser as sre_parse
+except ImportError: import sre_parse
+try: import re2
+except ImportError: re2 = None
+
+
+_INLINE_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'), (re.VERBOSE, 'x'), (re.ASCII, 'a'))
+# backreferences are numbered relative to their own pattern - these cannot be combined with other patterns
+BACKREF = re.compile(r'\\[1-9]|\(\?P=')
+
+# returns the pattern's flags as inline flag characters
+def inline_flags(pattern:re.Pattern) -> str:
+    return ''.join(c for f, c in _INLINE_FLAGS if pattern.flags & f)
+
+# wraps a compiled pattern in a group that carries its own flags so it can be joined with other patterns
+def scoped(pattern:re.Pattern, name:str='') -> str:
+    flags = inline_flags(pattern)
+    inner = f'(?{flags}:{pattern.pattern})' if flags else pattern.pattern
+    return f'(?P<{name}>{inner})' if name else f'(?:{inner})'
+
+# returns the longest run of literal characters that every match of pattern must contain
+# returns an empty string if no such literal can be determined
+def required_literal(pattern:re.Pattern) -> str:
+    if not isinstance(pattern.pattern, str) or pattern.flags & re.VERBOSE: return ''
+    try: parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except (re.error, TypeError): return ''
+    runs = ['']
+    def walk(items):
+        for op, av in items:
+            if op is sre_parse.LITERAL: runs[-1] += chr(av)
+            elif op is sre_parse.SUBPATTERN and not av[1] and not av[2]: walk(av[3]) # plain group - contents are inline
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1: # repeated at least once
+                runs.append('')
+                walk(av[2])
+                runs.append('')
+            else: runs.append('')
+    walk(parsed)
+    return max(runs, key=len)
+
+
+# Matches a line against an ordered set of patterns
+# the patterns are compiled into a single alternation with a named group per pattern
+# a literal prefilter built from the substrings every pattern requires rejects most lines with one cheap search
+# search returns the first pattern in order that matches, identical to searching each pattern in turn
+class PatternSet:
+    def __init__(self, patterns:list[re.Pattern|str], engine:str='re') -> None:
+        self.patterns = [re.compile(p) if isinstance(p, str) else p for p in patterns]
+        self.engine = engine if engine == 're2' and re2 else 're'
+        self._prefilter = self._compile_prefilter()
+        self._combined = self._compile_combined()
+
+    def __len__(self) -> int: return len(self.patterns)
+
+    # returns (index, match) of the first pattern that matches line or None if no pattern matches
+    def search(self, line:str) -> tuple[int,re.Match] | None:
+        if self._prefilter and not self._prefilter.search(line): return None
+        if not self._combined: return self._scan(line, len(self.patterns))
+        if not (m := self._combined.search(line)): return None
+        # patterns before the one matched first in the line still take precedence
+        idx = int(m.lastgroup[1:]) if self.engine == 're' else next(
+            i for i in range(len(self.patterns)) if m.group(f'p{i}') is not None
+        )
+        if hit := self._scan(line, idx): return hit
+        return idx, self.patterns[idx].search(line)
+
+    def _scan(self, line:str, end:int) -> tuple[int,re.Match] | None:
+        for i in range(end):
+            if m := self.patterns[i].search(line): return i, m
+        return None
+
+    def _compile(self, pattern:str):
+        if self.engine == 're2':
+            try: return re2.compile(pattern)
+            except Exception: pass # pattern uses syntax re2 does not support
+        return re.compile(pattern)
+
+    # alternation of the literals required by each pattern - None if any pattern has no required literal
+    def _compile_prefilter(self):
+        if not self.patterns: return None
+        literals = []
+        for p in self.patterns:
+            if not (lit := required_literal(p)): return None
+            flags = inline_flags(p).replace('x', '').replace('m', '').replace('s', '')
+            literals.append(f'(?{flags}:{re.escape(lit)})' if flags else re.escape(lit))
+        return self._compile('|'.join(literals))
+
+    def _compile_combined(self):
+        if len(self.patterns) < 2 or any(BACKREF.search(p.pattern) for p in self.patterns): return None
+        try: return self._compile('|'.join(scoped(p, f'p{i}') for i, p in enumerate(self.patterns)))
+        except re.error: return None # i.e. the same group name in two patterns
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+import psutil
+
+from dgsm.utils.log_util import make_logger
+
+
+logger = make_logger(__name__)
+IS_WINDOWS = os.name == 'nt'
+_GONE = (psutil.NoSuchProcess, psutil.ZombieProcess)
+
+# send SIGTERM (TerminateProcess on windows), or SIGKILL if kill is True, to every process in procs
+# waits up to timeout seconds for them to exit - returns the processes that are still alive
+# only wait on processes that are not children of this process
+def signal_tree(procs:list[psutil.Process], kill:bool=False, timeout:float=0.0) -> list[psutil.Process]:
+    for p in procs:
+        try:
+            if kill: p.kill()
+            else: p.terminate()
+        except _GONE: pass
+        except psutil.AccessDenied as e: logger.warning(f"unable to signal process {p.pid}: {e}")
+    # never wait without a timeout - waiting would reap the app process out from under asyncio's child watcher
+    if timeout <= 0: return [p for p in procs if p.is_running()]
+    _, alive = psutil.wait_procs(procs, timeout)
+    return alive
+
+# terminate every process in procs, then kill the ones still alive after grace seconds
+# returns the processes that had to be killed
+def terminate_tree(procs:list[psutil.Process], grace:float=5.0) -> list[psutil.Process]:
+    if not (alive := signal_tree(procs, timeout=grace)): return []
+    signal_tree(alive, kill=True)
+    return alive
+
+# Tracks the resource usage of a process and all of its descendants
+# the process tree is rediscovered every 'interval' seconds so children spawned after startup are counted
+# all psutil calls are made on a worker thread - the latest sample is cached in 'stats'
+class ProcTracker:
+    def __init__(self, pid:int, interval:float=5.0) -> None:
+        self.pid = pid
+        self.interval = interval
+        self.stats:dict = {}
+        self._procs:dict[int,psutil.Process] = {}
+        self._task:asyncio.Task = None
+        self._cpus = psutil.cpu_count() or 1
+        try: self._root = psutil.Process(pid)
+        except _GONE: self._root = None
+
+    # the tracked processes - the root process is first while it is running
+    @property
+    def processes(self) -> list[psutil.Process]:
+        return list(self._procs.values())
+
+    # the tracked descendants of the root process
+    @property
+    def children(self) -> list[psutil.Process]:
+        return [p for pid, p in self._procs.items() if pid != self.pid]
+
+    def start(self, loop:asyncio.AbstractEventLoop=None) -> asyncio.Task:
+        if not loop: loop = asyncio.get_running_loop()
+        self._task = loop.create_task(self._run())
+        return self._task
+
+    def stop(self) -> None:
+        if self._task and not self._task.done(): self._task.cancel()
+        self._task = None
+
+    # rediscover and sample the process tree now
+    async def refresh(self) -> dict:
+        self.stats = await asyncio.to_thread(self._sample)
+        return self.stats
+
+    async def _run(self) -> None:
+        while True:
+            try: await self.refresh()
+            except Exception: logger.exception(f"unable to sample process {self.pid}")
+            await asyncio.sleep(self.interval)
+
+    # update the set of processes in the tree - returns the tracked processes
+    # existing Process objects are kept so cpu_percent measures the time since the previous sample
+    def discover(self) -> list[psutil.Process]:
+        if not self._root: return []
+        try: tree = [self._root, *self._root.children(recursive=True)]
+        except _GONE: tree = [p for p in self._procs.values() if p.is_running()]
+        except psutil.AccessDenied: tree = [self._root]
+        procs = {}
+        for p in tree:
+            if (known := self._procs.get(p.pid)) and known == p: procs[p.pid] = known
+            else:
+                procs[p.pid] = p
+                try: p.cpu_percent() # first call primes the measurement
+                except (*_GONE, psutil.AccessDenied): pass
+        self._procs = procs
+        return self.processes
+
+    # collect usage of every process in the tree - processes that ended since discovery are skipped
+    def _sample(self) -> dict:
+        stats = {'cpu': 0.0, 'mem': 0, 'threads': 0, 'fds': 0, 'read_bytes': 0, 'write_bytes': 0, 'procs': 0}
+        gone = set()
+        for p in self.discover():
+            try:
+                with p.oneshot():
+                    stats['cpu'] += p.cpu_percent()
+                    stats['mem'] += p.memory_info().rss
+                    stats['threads'] += p.num_threads()
+                    stats['fds'] += p.num_handles() if IS_WINDOWS else p.num_fds()
+                    try:
+                        io = p.io_counters()
+                        stats['read_bytes'] += io.read_bytes
+                        stats['write_bytes'] += io.write_bytes
+                    except (AttributeError, psutil.AccessDenied, NotImplementedError): pass
+                stats['procs'] += 1
+            except _GONE: gone.add(p.pid)
+            except psutil.AccessDenied: pass
+        if gone: self._procs = {pid: p for pid, p in self._procs.items() if pid not in gone}
+        stats['cpu'] /= self._cpus
+        stats['ts'] = time.time()
+        return stats
@@ -0,0 +1,170 @@
+import asyncio
+import itertools
+import struct
+
+
+# source rcon packet types - EXECCOMMAND and AUTH_RESPONSE share the same value
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+MAX_PACKET = 1 << 20 # sanity limit - the protocol allows 4096 bytes but some servers (factorio) send larger packets
+
+class RconError(ConnectionError): pass
+class RconAuthError(RconError): pass
+
+def encode_packet(request_id:int, kind:int, body:str) -> bytes:
+    payload = struct.pack('<ii', request_id, kind) + body.encode('utf-8') + b'\x00\x00'
+    return struct.pack('<i', len(payload)) + payload
+
+# read one packet - returns (request_id, type, body)
+async def read_packet(reader:asyncio.StreamReader) -> tuple[int, int, str]:
+    size, = struct.unpack('<i', await reader.readexactly(4))
+    if not 10 <= size <= MAX_PACKET: raise RconError(f'invalid packet size {size}')
+    data = await reader.readexactly(size)
+    request_id, kind = struct.unpack('<ii', data[:8])
+    return request_id, kind, data[8:-2].decode('utf-8', 'replace')
+
+
+# A single authenticated rcon connection
+# requests are pipelined - each is tagged with its own id and responses are matched back to the request by id
+# responses longer than one packet are split by the server, so every command is followed by an empty
+#   RESPONSE_VALUE packet - servers answer it after the last fragment of the response, which marks the response complete
+#   (minecraft answers it with 'Unknown request 0', which is only used as the marker)
+# a server that never answers the marker is detected when a command times out with part of its response received
+#   - that response is returned, and later responses on the connection are complete once nothing arrived for them for 'idle' seconds
+class RconConnection:
+    _ids = itertools.count(1)
+
+    def __init__(self, host:str, port:int, password:str, timeout:float=5.0, idle:float=0.5) -> None:
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.idle = idle
+        self._reader:asyncio.StreamReader = None
+        self._writer:asyncio.StreamWriter = None
+        self._read_task:asyncio.Task = None
+        self._pending:dict[int, tuple[list[str], asyncio.Future]] = {} # request id -> (fragments, future)
+        self._markers:dict[int, int] = {} # marker id -> request id
+        self._idle:dict[int, asyncio.TimerHandle] = {} # request id -> completes the response if the marker does not follow
+        self._markerless = False # the server does not answer the marker
+
+    @property
+    def closed(self) -> bool: return self._writer is None or self._writer.is_closing()
+
+    @property
+    def load(self) -> int: return len(self._pending)
+
+    async def connect(self) -> None:
+        try:
+            self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+            await asyncio.wait_for(self._authenticate(), self.timeout)
+        except RconError:
+            self.close()
+            raise
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            self.close()
+            raise RconError(f'unable to connect to {self.host}:{self.port} - {e!r}') from e
+        self._read_task = asyncio.get_running_loop().create_task(self._read_loop())
+
+    # source servers send an empty RESPONSE_VALUE before the AUTH_RESPONSE, minecraft only sends the AUTH_RESPONSE
+    async def _authenticate(self) -> None:
+        auth_id = next(self._ids)
+        self._writer.write(encode_packet(auth_id, SERVERDATA_AUTH, self.password))
+        await self._writer.drain()
+        while True:
+            request_id, kind, _ = await read_packet(self._reader)
+            if kind != SERVERDATA_AUTH_RESPONSE: continue
+            if request_id == -1: raise RconAuthError(f'rcon password rejected by {self.host}:{self.port}')
+            if request_id == auth_id: return
+
+    # send command and return the complete response
+    async def execute(self, command:str) -> str:
+        if self.closed: raise RconError('connection is closed')
+        loop = asyncio.get_running_loop()
+        request_id, marker_id = next(self._ids), next(self._ids)
+        fut = loop.create_future()
+        self._pending[request_id] = ([], fut)
+        self._markers[marker_id] = request_id
+        try:
+            self._writer.write(encode_packet(request_id, SERVERDATA_EXECCOMMAND, command) + encode_packet(marker_id, SERVERDATA_RESPONSE_VALUE, ''))
+            await self._writer.drain()
+            return await asyncio.wait_for(asyncio.shield(fut), self.timeout)
+        except RconError: raise
+        except asyncio.TimeoutError as e: # before OSError - it is a subclass of it from python 3.11
+            if not (parts := self._pending[request_id][0]): raise RconError(f"no rcon response to '{command}' after {self.timeout}s") from e
+            self._markerless = True
+            return ''.join(parts)
+        except OSError as e: raise RconError(f'rcon request failed - {e!r}') from e
+        finally:
+            self._pending.pop(request_id, None)
+            self._markers.pop(marker_id, None)
+            if handle := self._idle.pop(request_id, None): handle.cancel()
+
+    async def _read_loop(self) -> None:
+        error = None
+        try:
+            while True:
+                request_id, _, body = await read_packet(self._reader)
+                if (entry := self._pending.get(request_id)):
+                    entry[0].append(body)
+                    if self._markerless:
+                        if handle := self._idle.pop(request_id, None): handle.cancel()
+                        self._idle[request_id] = asyncio.get_running_loop().call_later(self.idle, self._complete, request_id)
+                elif owner := self._markers.get(request_id): self._complete(owner)
+        except (OSError, asyncio.IncompleteReadError, RconError) as e: error = e
+        except asyncio.CancelledError: pass
+        finally:
+            for _, fut in self._pending.values():
+                if not fut.done(): fut.set_exception(RconError(f'rcon connection lost - {error!r}'))
+            self.close()
+
+    def _complete(self, request_id:int) -> None:
+        if entry := self._pending.get(request_id):
+            parts, fut = entry
+            if not fut.done(): fut.set_result(''.join(parts))
+
+    def close(self) -> None:
+        if self._writer and not self._writer.is_closing(): self._writer.close()
+        if self._read_task and not self._read_task.done() and self._read_task is not asyncio.current_task(): self._read_task.cancel()
+
+
+# Pool of up to 'size' rcon connections to one server
+# connections are opened when they are first needed - a command is sent on the connection with the fewest requests in flight
+#   and a new connection is only opened while every open connection is busy
+# connections closed by the server (i.e. it restarted) are dropped and replaced by new ones when needed
+# failed commands are not retried, the server may have executed them already
+class RconPool:
+    def __init__(self, host:str='localhost', port:int=25575, password:str='', size:int=2, timeout:float=5.0, idle:float=0.5) -> None:
+        self.host = host
+        self.port = int(port)
+        self.password = str(password)
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.idle = idle
+        self._conns:list[RconConnection] = []
+        self._lock = asyncio.Lock()
+
+    async def execute(self, command:str) -> str:
+        return await (await self._acquire()).execute(command)
+
+    async def _acquire(self) -> RconConnection:
+        if conn := self._pick(): return conn
+        async with self._lock: # connect one at a time so concurrent commands do not open more than 'size' connections
+            if conn := self._pick(): return conn
+            conn = RconConnection(self.host, self.port, self.password, self.timeout, self.idle)
+            await conn.connect()
+            self._conns.append(conn)
+            return conn
+
+    # the open connection with the fewest requests in flight - None if a new connection should be opened
+    def _pick(self) -> RconConnection | None:
+        self._conns = [c for c in self._conns if not c.closed]
+        conn = min(self._conns, key=lambda c: c.load, default=None)
+        if conn and (conn.load == 0 or len(self._conns) >= self.size): return conn
+        return None
+
+    def close(self) -> None:
+        for conn in self._conns: conn.close()
+        self._conns = []
@@ -0,0 +1,234 @@
+import asyncio
+import importlib
+import os
+import re
+import socket
+from typing import Any, Callable, Coroutine
+
+from dgsm.utils.log_util import make_logger
+from dgsm.utils.server_query import A2S_INFO
+
+
+logger = make_logger(__name__)
+
+# Base readiness probe
+# a probe is checked every 'interval' seconds (growing by 'backoff' up to 'max_interval') after an initial 'delay'
+#   until it passes or 'timeout' seconds have passed
+# implementations override check, which returns True once the app is ready
+class Probe:
+    kind = 'probe'
+
+    def __init__(self, timeout:float=None, interval:float=2.0, delay:float=0.0, backoff:float=1.0, max_interval:float=30.0, **kwargs) -> None:
+        if kwargs: logger.warning(f"unknown {self.kind} probe options ignored: {', '.join(kwargs)}")
+        self.timeout = timeout
+        self.interval = interval
+        self.delay = delay
+        self.backoff = backoff
+        self.max_interval = max_interval
+        self.error = '' # reason the last check failed
+
+    def __str__(self) -> str: return self.kind
+
+    async def check(self, ctrl) -> bool: return False
+
+    # poll check until it passes - returns True if it passed before the timeout
+    async def wait(self, ctrl) -> bool:
+        async def _poll():
+            interval = self.interval
+            if self.delay: await asyncio.sleep(self.delay)
+            while True:
+                try:
+                    if await self.check(ctrl): return True
+                except Exception as e: self.error = repr(e)
+                await asyncio.sleep(interval)
+                interval = min(interval * self.backoff, self.max_interval)
+        try: return await asyncio.wait_for(_poll(), self.timeout) if self.timeout else await _poll()
+        except asyncio.TimeoutError:
+            if not self.error: self.error = 'timed out'
+            return False
+
+
+# passes when the future is resolved with a truthy value - used for the controller's own online detection
+class FutureProbe(Probe):
+    kind = 'online'
+
+    def __init__(self, fut:asyncio.Future, label:str='online', **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.fut = fut
+        self.label = label
+
+    def __str__(self) -> str: return self.label
+
+    async def wait(self, ctrl) -> bool:
+        try: return bool(await asyncio.wait_for(asyncio.shield(self.fut), self.timeout))
+        except asyncio.TimeoutError:
+            self.error = 'timed out'
+            return False
+
+
+# passes when the app outputs a line matching pattern
+class StdoutProbe(Probe):
+    kind = 'stdout'
+
+    def __init__(self, pattern:str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.pattern = re.compile(pattern)
+
+    def __str__(self) -> str: return f"stdout '{self.pattern.pattern}'"
+
+    async def wait(self, ctrl) -> bool:
+        if await ctrl.wait_for_output(self.pattern, self.timeout or 0.0): return True
+        self.error = 'timed out'
+        return False
+
+
+# passes once a tcp connection to host:port is accepted
+class TcpProbe(Probe):
+    kind = 'tcp'
+
+    def __init__(self, port:int, host:str='localhost', connect_timeout:float=2.0, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = int(port)
+        self.connect_timeout = connect_timeout
+
+    def __str__(self) -> str: return f'tcp {self.host}:{self.port}'
+
+    async def check(self, ctrl) -> bool:
+        try: _, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.connect_timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            self.error = str(e) or 'connect timed out'
+            return False
+        writer.close()
+        try: await writer.wait_closed()
+        except OSError: pass
+        return True
+
+
+# passes once a datagram sent to host:port is answered - 'payload' defaults to an A2S_INFO query
+#   which is answered by source engine query compatible servers (Valheim, Rust, ARK, ...)
+# if 'expect' is given the response must contain it
+class UdpProbe(Probe):
+    kind = 'udp'
+
+    def __init__(self, port:int, host:str='localhost', payload:str|bytes=A2S_INFO, expect:str|bytes=b'', reply_timeout:float=2.0, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = int(port)
+        self.payload = payload.encode() if isinstance(payload, str) else payload
+        self.expect = expect.encode() if isinstance(expect, str) else expect
+        self.reply_timeout = reply_timeout
+
+    def __str__(self) -> str: return f'udp {self.host}:{self.port}'
+
+    async def check(self, ctrl) -> bool:
+        loop = asyncio.get_running_loop()
+        reply = loop.create_future()
+        class _Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                if not reply.done(): reply.set_result(data)
+            def error_received(self, exc):
+                if not reply.done(): reply.set_exception(exc)
+        transport, _ = await loop.create_datagram_endpoint(_Protocol, remote_addr=(self.host, self.port), family=socket.AF_INET)
+        try:
+            transport.sendto(self.payload)
+            data = await asyncio.wait_for(reply, self.reply_timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            self.error = str(e) or 'no reply'
+            return False
+        finally: transport.close()
+        if self.expect and self.expect not in data:
+            self.error = 'unexpected reply'
+            return False
+        return True
+
+
+# passes once a file exists at path
+class FileProbe(Probe):
+    kind = 'file'
+
+    def __init__(self, path:str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.path = path
+
+    def __str__(self) -> str: return f'file {self.path}'
+
+    async def check(self, ctrl) -> bool:
+        if os.path.exists(self.path): return True
+        self.error = 'does not exist'
+        return False
+
+
+# passes when a custom coroutine returns True - the coroutine is called with the controller
+# 'call' is either the name of a controller method or 'package.module:function'
+class CustomProbe(Probe):
+    kind = 'custom'
+
+    def __init__(self, call:str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.call = call
+        self._fn:Callable[[Any], Coroutine[Any, Any, bool]] = None
+        if ':' in call:
+            module, _, attr = call.partition(':')
+            self._fn = getattr(importlib.import_module(module), attr)
+
+    def __str__(self) -> str: return f'custom {self.call}'
+
+    async def check(self, ctrl) -> bool:
+        if self._fn: return bool(await self._fn(ctrl))
+        return bool(await getattr(ctrl, self.call)())
+
+
+PROBES:dict[str,type[Probe]] = {p.kind: p for p in (StdoutProbe, TcpProbe, UdpProbe, FileProbe, CustomProbe)}
+
+# create probes from the 'ready' opts 'probes' list - invalid probes are logged and skipped
+def build_probes(cfgs:list[dict]) -> list[Probe]:
+    probes = []
+    for cfg in cfgs or []:
+        cfg = dict(cfg)
+        try: probes.append(PROBES[cfg.pop('type')](**cfg))
+        except KeyError: logger.error(f"readiness probe {cfg} needs a 'type' of {', '.join(PROBES)}")
+        except (TypeError, ValueError, ImportError, AttributeError, re.error) as e: logger.error(f"invalid readiness probe {cfg}: {e}")
+    return probes
+
+
+# Outcome of waiting for readiness
+# probe is the probe that completed readiness (the last one required), elapsed is seconds since waiting began
+class Readiness:
+    def __init__(self, ready:bool, probe:Probe=None, elapsed:float=0.0, failed:list[Probe]=None) -> None:
+        self.ready = ready
+        self.probe = probe
+        self.elapsed = elapsed
+        self.failed = failed or []
+
+    def __bool__(self) -> bool: return self.ready
+
+    def __str__(self) -> str:
+        if self.ready: return f'{self.probe} passed after {self.elapsed:.1f}s'
+        if not self.failed: return f'not ready after {self.elapsed:.1f}s'
+        return f'not ready after {self.elapsed:.1f}s - ' + ', '.join(f'{p}: {p.error or "failed"}' for p in self.failed)
+
+
+# wait for the probes - with require 'any' the first probe to pass makes the app ready, with 'all' every probe must pass
+# gives up after timeout seconds, or as soon as abort completes (i.e. the app exited)
+async def wait_ready(ctrl, probes:list[Probe], timeout:float, require:str='any', abort:asyncio.Future=None) -> Readiness:
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    tasks = {loop.create_task(p.wait(ctrl)): p for p in probes}
+    pending = set(tasks)
+    watch = {abort} if abort else set()
+    end = start + timeout
+    passed, failed = None, []
+    try:
+        while pending and (remaining := end - loop.time()) > 0:
+            done, _ = await asyncio.wait(pending | watch, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if abort and abort in done: break
+            for task in done:
+                pending.discard(task)
+                if task.result(): passed = tasks[task]
+                else: failed.append(tasks[task])
+            if failed and require == 'all': break
+            if passed and (require != 'all' or not pending): return Readiness(True, passed, loop.time() - start)
+        return Readiness(False, elapsed=loop.time() - start, failed=failed + [tasks[t] for t in pending])
+    finally:
+        for task in tasks: task.cancel()
@@ -0,0 +1,58 @@
+from collections import deque
+from itertools import islice
+import re
+import time
+
+
+DURATION = re.compile(r'(\d+(?:\.\d+)?)([dhms]?)', re.IGNORECASE)
+UNITS = {'d': 86400, 'h': 3600, 'm': 60, 's': 1, '': 1}
+
+# parse a duration string such as '90', '45s', '5m', '1h30m' or '2d' into seconds
+# raises ValueError if the string is not a duration
+def parse_duration(duration:str) -> float:
+    duration = ''.join(duration.split()).casefold()
+    if not duration or DURATION.sub('', duration): raise ValueError(f"'{duration}' is not a valid duration")
+    return sum(float(val) * UNITS[unit] for val, unit in DURATION.findall(duration))
+
+
+# Fixed size in-memory buffer of the most recent app output
+# bounded by both number of lines and total size of the stored text
+# when either bound is exceeded the oldest lines are dropped
+class Scrollback:
+    def __init__(self, max_lines:int=2000, max_bytes:int=1<<20) -> None:
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self._lines:deque[tuple[float,str]] = deque()
+        self._size = 0
+
+    def __len__(self) -> int: return len(self._lines)
+
+    # add a batch of lines - all lines in the batch share the same timestamp
+    def extend(self, lines:list[str], ts:float=None) -> None:
+        if ts is None: ts = time.time()
+        buf = self._lines
+        for line in lines:
+            buf.append((ts, line))
+            self._size += len(line) + 1
+        while buf and (len(buf) > self.max_lines or self._size > self.max_bytes):
+            self._size -= len(buf.popleft()[1]) + 1
+
+    # returns the last n lines
+    def tail(self, n:int) -> list[str]:
+        lines = [line for _, line in islice(reversed(self._lines), max(n, 0))]
+        lines.reverse()
+        return lines
+
+    # returns all lines received within the last 'seconds'
+    def since(self, seconds:float) -> list[str]:
+        cutoff = time.time() - seconds
+        lines = []
+        for ts, line in reversed(self._lines):
+            if ts < cutoff: break
+            lines.append(line)
+        lines.reverse()
+        return lines
+
+    def clear(self) -> None:
+        self._lines.clear()
+        self._size = 0
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import socket
+import struct
+import time
+
+
+A2S_HEADER = b'\xff\xff\xff\xff'
+A2S_INFO = A2S_HEADER + b'TSource Engine Query\x00'
+A2S_PLAYER = A2S_HEADER + b'U'
+A2S_CHALLENGE = 0x41
+A2S_INFO_REPLY = 0x49
+A2S_PLAYER_REPLY = 0x44
+ANONYMOUS = '00000000-0000-0000-0000-000000000000' # id minecraft reports for players that hide from the sample
+
+# Player information reported by a server's query protocol
+# names is None if the protocol does not list players, and may list fewer players than 'players' (i.e. a minecraft sample)
+class QueryResult:
+    def __init__(self, players:int, max_players:int, names:list[str]=None, version:str='', latency:float=0.0) -> None:
+        self.players = players
+        self.max_players = max_players
+        self.names = names
+        self.version = version
+        self.latency = latency
+        self.time = time.monotonic()
+
+    # True if names lists every player that is online
+    @property
+    def complete(self) -> bool: return self.names is not None and len(self.names) == self.players and all(self.names)
+
+    def __str__(self) -> str: return f'{self.players}/{self.max_players} players'
+
+    # True if other reports the same players - used to ignore results taken while a player was joining or leaving
+    def agrees(self, other:'QueryResult') -> bool:
+        return other is not None and self.players == other.players and sorted(self.names or []) == sorted(other.names or [])
+
+
+# returns players (in the order they joined) made consistent with result, or None if nothing needs to change
+# a complete name list replaces the players - otherwise only the count is known, and if it is lower
+#   the players that joined first are dropped, they are the ones most likely left behind by a missed disconnect
+def reconcile(players:list[str], result:QueryResult) -> list[str] | None:
+    if result.complete:
+        remaining = list(result.names)
+        kept = []
+        for name in players:
+            if name in remaining:
+                remaining.remove(name)
+                kept.append(name)
+        new = kept + remaining
+    elif result.players < len(players): new = players[len(players) - result.players:]
+    else: return None
+    return new if new != players else None
+
+
+### Steam server queries (A2S) - https://developer.valvesoftware.com/wiki/Server_queries ###
+
+# read a null terminated string from data at offset - returns the string and the offset after it
+def _cstring(data:bytes, offset:int) -> tuple[str, int]:
+    end = data.index(b'\x00', offset)
+    return data[offset:end].decode('utf-8', 'replace'), end + 1
+
+class _Datagram(asyncio.DatagramProtocol):
+    def __init__(self) -> None:
+        self.replies:asyncio.Queue[bytes] = asyncio.Queue()
+    def datagram_received(self, data, addr): self.replies.put_nowait(data)
+    def error_received(self, exc): self.replies.put_nowait(exc)
+
+# send request and return the reply - answers a challenge by repeating the request with the challenge appended
+# challenge is appended to the first request as well (A2S_PLAYER requests one by sending -1)
+async def _a2s_request(host:str, port:int, request:bytes, timeout:float, challenge:bytes=b'') -> bytes:
+    loop = asyncio.get_running_loop()
+    transport, proto = await loop.create_datagram_endpoint(_Datagram, remote_addr=(host, port), family=socket.AF_INET)
+    try:
+        async def _exchange():
+            payload = request + challenge
+            for _ in range(3):
+                transport.sendto(payload)
+                reply = await proto.replies.get()
+                if isinstance(reply, Exception): raise reply
+                if reply[:4] == b'\xfe\xff\xff\xff': raise ValueError('split A2S replies are not supported')
+                if reply[:4] != A2S_HEADER or len(reply) < 5: raise ValueError('invalid A2S reply')
+                if reply[4] != A2S_CHALLENGE: return reply[4:]
+                payload = request + reply[5:9]
+            raise ValueError('A2S challenge was not accepted')
+        return await asyncio.wait_for(_exchange(), timeout)
+    finally: transport.close()
+
+async def a2s_info(host:str, port:int, timeout:float=3.0) -> QueryResult:
+    start = time.monotonic()
+    data = await _a2s_request(host, port, A2S_INFO, timeout)
+    if data[0] != A2S_INFO_REPLY: raise ValueError('invalid A2S_INFO reply')
+    offset = 2 # header and protocol version
+    for _ in range(4): _, offset = _cstring(data, offset) # name, map, folder, game
+    players, max_players, bots = data[offset+2], data[offset+3], data[offset+4] # after the steam app id (short)
+    offset += 9 # app id, players, max players, bots, server type, environment, visibility, vac
+    version, _ = _cstring(data, offset)
+    return QueryResult(players - bots, max_players, version=version, latency=time.monotonic() - start)
+
+# names of the players online - some servers (i.e. valheim) report empty names
+async def a2s_player(host:str, port:int, timeout:float=3.0) -> list[str]:
+    data = await _a2s_request(host, port, A2S_PLAYER, timeout, challenge=b'\xff\xff\xff\xff')
+    if data[0] != A2S_PLAYER_REPLY: raise ValueError('invalid A2S_PLAYER reply')
+    names, offset = [], 2
+    for _ in range(data[1]):
+        name, offset = _cstring(data, offset + 1) # after the player index
+        names.append(name)
+        offset += 8 # score (long) and duration (float)
+    return names
+
+async def query_a2s(host:str, port:int, timeout:float=3.0) -> QueryResult:
+    result = await a2s_info(host, port, timeout)
+    if result.players:
+        try: result.names = await a2s_player(host, port, timeout)
+        except (OSError, ValueError, IndexError, asyncio.TimeoutError): pass # the count is still valid
+    else: result.names = []
+    return result
+
+
+### Minecraft Server List Ping - https://wiki.vg/Server_List_Ping ###
+
+def _varint(value:int) -> bytes:
+    value &= 0xffffffff
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value: out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+async def _read_varint(reader:asyncio.StreamReader) -> int:
+    value = 0
+    for shift in range(0, 35, 7):
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80: return value
+    raise ValueError('varint is too long')
+
+def _packet(packet_id:int, data:bytes=b'') -> bytes:
+    body = _varint(packet_id) + data
+    return _varint(len(body)) + body
+
+# the player sample lists at most 12 players, and players can hide from it - it only replaces the player list when it is complete
+async def query_slp(host:str, port:int, timeout:float=3.0) -> QueryResult:
+    async def _ping():
+        start = time.monotonic()
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            addr = host.encode('utf-8')
+            handshake = _varint(-1) + _varint(len(addr)) + addr + struct.pack('>H', port) + _varint(1) # protocol -1, next state status
+            writer.write(_packet(0x00, handshake) + _packet(0x00))
+            await writer.drain()
+            await _read_varint(reader) # packet length
+            if await _read_varint(reader) != 0x00: raise ValueError('invalid status response')
+            status = json.loads((await reader.readexactly(await _read_varint(reader))).decode('utf-8'))
+        finally: writer.close()
+        players = status.get('players', {})
+        sample = [p.get('name', '') if p.get('id') != ANONYMOUS else '' for p in players.get('sample', [])]
+        return QueryResult(players.get('online', 0), players.get('max', 0), sample, status.get('version', {}).get('name', ''), time.monotonic() - start)
+    return await asyncio.wait_for(_ping(), timeout)
+
+
+QUERIES = {'a2s': query_a2s, 'slp': query_slp}
@@ -0,0 +1,135 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from dgsm.utils.log_util import make_logger
+
+
+logger = make_logger(__name__)
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sessions (app TEXT NOT NULL, player TEXT NOT NULL, joined REAL NOT NULL, left REAL);
+CREATE INDEX IF NOT EXISTS sessions_app_left ON sessions (app, left);
+CREATE INDEX IF NOT EXISTS sessions_app_joined ON sessions (app, joined);
+CREATE INDEX IF NOT EXISTS sessions_open ON sessions (app, player) WHERE left IS NULL;
+CREATE TABLE IF NOT EXISTS occupancy (app TEXT NOT NULL, ts REAL NOT NULL, players INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS occupancy_app_ts ON occupancy (app, ts);
+'''
+_CLOSE = object()
+
+# format seconds as i.e. '2d 3h', '3h 12m', '5m' or '40s'
+def format_duration(seconds:float) -> str:
+    seconds = int(seconds)
+    d, rem = divmod(seconds, 86400)
+    h, rem = divmod(rem, 3600)
+    m, s = divmod(rem, 60)
+    if d: return f'{d}d {h}h'
+    if h: return f'{h}h {m}m'
+    if m: return f'{m}m'
+    return f'{s}s'
+
+
+# SQLite store of player sessions and of the number of players online over time
+# events are queued without blocking and written by a background thread in batches - one transaction per batch
+#   a batch is written once 'flush_interval' seconds have passed since its first event, or once it holds 'batch_size' events
+# queries open their own read-only connection, the database is in WAL mode so they do not wait for the writer
+# run the queries in a thread (i.e. asyncio.to_thread), they read from disk
+class SessionStore:
+    def __init__(self, path:str='sessions.db', flush_interval:float=1.0, batch_size:int=500) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue:queue.SimpleQueue = queue.SimpleQueue()
+        with sqlite3.connect(path) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            # sessions left open by an unclean exit end with the last recorded event of their app
+            conn.execute('''UPDATE sessions SET left = MAX(joined, COALESCE(
+                (SELECT MAX(ts) FROM occupancy o WHERE o.app = sessions.app), joined)) WHERE left IS NULL''')
+        conn.close()
+        self._thread = threading.Thread(target=self._writer, name='sessions', daemon=True)
+        self._thread.start()
+
+    ### events - count is the number of players online after the event ###
+    def join(self, app:str, player:str, count:int, ts:float=None) -> None:
+        self._queue.put(('join', app, player, count, ts or time.time()))
+
+    def leave(self, app:str, player:str, count:int, ts:float=None) -> None:
+        self._queue.put(('leave', app, player, count, ts or time.time()))
+
+    # end every open session of app, i.e. when it stops
+    def end_all(self, app:str, ts:float=None) -> None:
+        self._queue.put(('end_all', app, None, 0, ts or time.time()))
+
+    # wait until every queued event is written - returns False on timeout
+    def flush(self, timeout:float=5.0) -> bool:
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    # write the queued events and stop the writer
+    def close(self, timeout:float=5.0) -> None:
+        if not self._thread.is_alive(): return
+        self._queue.put(_CLOSE)
+        self._thread.join(timeout)
+
+    def _writer(self) -> None:
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        running = True
+        while running:
+            batch, markers = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _CLOSE: running = False
+                elif isinstance(item, threading.Event): markers.append(item)
+                else: batch.append(item)
+                if not running or markers or len(batch) >= self.batch_size: break
+                try: item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty: break
+            if batch:
+                try:
+                    with conn: self._write(conn, batch)
+                except sqlite3.Error: logger.exception(f"unable to record {len(batch)} player session events")
+            for done in markers: done.set()
+        conn.close()
+
+    def _write(self, conn:sqlite3.Connection, batch:list[tuple]) -> None:
+        for kind, app, player, count, ts in batch:
+            if kind == 'join': conn.execute('INSERT INTO sessions (app, player, joined) VALUES (?, ?, ?)', (app, player, ts))
+            elif kind == 'leave':
+                conn.execute('''UPDATE sessions SET left = ? WHERE rowid = (SELECT rowid FROM sessions
+                    WHERE app = ? AND player = ? AND left IS NULL ORDER BY joined LIMIT 1)''', (ts, app, player))
+            else: conn.execute('UPDATE sessions SET left = ? WHERE app = ? AND left IS NULL', (ts, app))
+            conn.execute('INSERT INTO occupancy (app, ts, players) VALUES (?, ?, ?)', (app, ts, count))
+
+    ### queries - 'since' is a unix timestamp, sessions are clipped to the period after it ###
+    def _read(self, sql:str, params:tuple) -> list[tuple]:
+        conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+        try: return conn.execute(sql, params).fetchall()
+        finally: conn.close()
+
+    # players with the most playtime - returns [(player, seconds played, sessions)]
+    def top(self, app:str, since:float=0.0, limit:int=10) -> list[tuple[str, float, int]]:
+        now = time.time()
+        return self._read('''SELECT player, SUM(COALESCE(left, :now) - MAX(joined, :since)) AS played, COUNT(*) FROM sessions
+            WHERE app = :app AND (left >= :since OR left IS NULL) GROUP BY player ORDER BY played DESC LIMIT :limit''',
+            {'app': app, 'since': since, 'now': now, 'limit': limit})
+
+    # most players online at once - returns (players, time it was first reached) or None if nothing was recorded
+    def peak(self, app:str, since:float=0.0) -> tuple[int, float] | None:
+        rows = self._read('''SELECT players, ts FROM occupancy WHERE app = ? AND ts >= ?
+            ORDER BY players DESC, ts LIMIT 1''', (app, since))
+        return rows[0] if rows else None
+
+    # most recent sessions that were active after since - returns [(player, joined, left)], left is None while online
+    def recent(self, app:str, since:float=0.0, limit:int=20) -> list[tuple[str, float, float|None]]:
+        return self._read('''SELECT player, joined, left FROM sessions WHERE app = ? AND (left >= ? OR left IS NULL)
+            ORDER BY joined DESC LIMIT ?''', (app, since, limit))
+
+    # number of sessions, distinct players and total playtime after since - returns (sessions, players, seconds)
+    def totals(self, app:str, since:float=0.0) -> tuple[int, int, float]:
+        now = time.time()
+        return self._read('''SELECT COUNT(*), COUNT(DISTINCT player), COALESCE(SUM(COALESCE(left, :now) - MAX(joined, :since)), 0)
+            FROM sessions WHERE app = :app AND (left >= :since OR left IS NULL)''', {'app': app, 'since': since, 'now': now})[0]
@@ -0,0 +1,127 @@
+import asyncio
+from collections import deque
+import re
+from typing import Callable
+
+
+OVERFLOW = ('drop_oldest', 'drop_new', 'block')
+
+# turn a subscription filter into a predicate on lines
+# filter is None (every line), a sub string, a compiled pattern, or a callable returning True for lines to keep
+def line_filter(filter:str|re.Pattern|Callable[[str], bool]|None) -> Callable[[str], bool] | None:
+    if filter is None or callable(filter) and not isinstance(filter, re.Pattern): return filter
+    if isinstance(filter, re.Pattern): return lambda line: filter.search(line) is not None
+    if isinstance(filter, str): return lambda line: filter in line
+    raise TypeError(f'unsupported subscription filter {filter!r}')
+
+
+# Bounded queue of app output for a single consumer
+# the reader publishes lines without waiting - when the queue holds maxsize lines the overflow policy applies:
+#   'drop_oldest' discards the oldest queued lines, 'drop_new' discards the incoming lines,
+#   'block' queues them anyway and makes the reader wait (see wait_space) until the consumer catches up
+# iterate with 'async for' - yields single lines, or the lists of lines published together if batch is True
+# iteration ends once the subscription is closed and the queue is empty
+class Subscription:
+    def __init__(self, filter:str|re.Pattern|Callable[[str], bool]=None, maxsize:int=1000, overflow:str='drop_oldest', batch:bool=False) -> None:
+        if overflow not in OVERFLOW: raise ValueError(f"overflow must be one of {', '.join(OVERFLOW)}")
+        if maxsize <= 0: raise ValueError("maxsize must be greater than zero")
+        self.filter = line_filter(filter)
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.batch = batch
+        self.closed = False
+        self.received = 0 # lines accepted by the filter
+        self.delivered = 0 # lines handed to the consumer
+        self.dropped = 0 # lines lost to the overflow policy
+        self.max_lag = 0 # most lines ever waiting in the queue
+        self._queue:deque[list[str]] = deque() # batches of lines
+        self._head = 0 # lines of the first batch already delivered
+        self._size = 0
+        self._ready:asyncio.Future = None # resolved when lines are queued or the subscription is closed
+        self._space:asyncio.Future = None # resolved when a blocked reader may continue
+        self._on_close:Callable[[], None] = None
+
+    # number of lines waiting to be consumed
+    @property
+    def lag(self) -> int: return self._size
+
+    @property
+    def full(self) -> bool: return self._size >= self.maxsize
+
+    # queue the lines that pass the filter - never waits
+    def publish(self, lines:list[str]) -> None:
+        if self.closed: return
+        if self.filter: lines = [line for line in lines if self.filter(line)]
+        if not lines: return
+        self.received += len(lines)
+        if self.overflow == 'drop_new' and (room := self.maxsize - self._size) < len(lines):
+            self.dropped += len(lines) - room
+            if room <= 0: return
+            lines = lines[:room]
+        self._queue.append(lines)
+        self._size += len(lines)
+        if self.overflow == 'drop_oldest':
+            while self._size > self.maxsize:
+                over = self._size - self.maxsize
+                if over >= (drop := len(self._queue[0]) - self._head):
+                    self._queue.popleft()
+                    self._head = 0
+                else:
+                    self._head += over
+                    drop = over
+                self._size -= drop
+                self.dropped += drop
+        self.max_lag = max(self.max_lag, self._size)
+        self._wake()
+
+    # wait until the queue is below maxsize again - used by the reader for 'block' subscriptions
+    async def wait_space(self) -> None:
+        while self.full and not self.closed:
+            if self._space is None or self._space.done(): self._space = asyncio.get_running_loop().create_future()
+            await self._space
+
+    # stop the subscription - queued lines are still delivered before iteration ends
+    def close(self) -> None:
+        if self.closed: return
+        self.closed = True
+        self._wake()
+        if self._space and not self._space.done(): self._space.set_result(None)
+        if self._on_close: self._on_close()
+
+    def _wake(self) -> None:
+        if self._ready and not self._ready.done(): self._ready.set_result(None)
+
+    def _take(self) -> list[str] | str:
+        first = self._queue[0]
+        if self.batch:
+            out = self._queue.popleft()
+            if self._head: out = out[self._head:]
+            self._head = 0
+            count = len(out)
+        else:
+            out = first[self._head]
+            self._head += 1
+            if self._head == len(first):
+                self._queue.popleft()
+                self._head = 0
+            count = 1
+        self._size -= count
+        self.delivered += count
+        if self._space and not self._space.done() and not self.full: self._space.set_result(None)
+        return out
+
+    def __aiter__(self): return self
+
+    async def __anext__(self) -> list[str] | str:
+        while not self._queue:
+            if self.closed: raise StopAsyncIteration
+            if self._ready is None or self._ready.done(): self._ready = asyncio.get_running_loop().create_future()
+            await self._ready
+        return self._take()
+
+    async def __aenter__(self): return self
+
+    async def __aexit__(self, *_) -> None: self.close()
+
+    def __str__(self) -> str:
+        return f'{self.lag}/{self.maxsize} queued, {self.delivered} delivered, {self.dropped} dropped, max lag {self.max_lag}'
@@ -0,0 +1,52 @@
+import asyncio
+import os
+import stat
+
+import pytest
+
+from dgsm.utils.attach import AttachServer
+
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason='unix sockets')
+
+# the socket is only accessible to its owner and the process umask is left alone
+def test_socket_permissions(tmp_path):
+    path = str(tmp_path / 'attach' / 'app.sock')
+    async def run():
+        server = AttachServer(None, path)
+        await server.start()
+        try: return stat.S_IMODE(os.stat(path).st_mode)
+        finally: server.close()
+    umask = os.umask(0o022)
+    try:
+        assert asyncio.run(run()) == 0o600
+        assert os.umask(0o022) == 0o022
+    finally: os.umask(umask)
+
+def _start(path:str) -> None:
+    async def run():
+        server = AttachServer(None, path)
+        await server.start()
+        server.close()
+    asyncio.run(run())
+
+# a socket directory created beforehand with other permissions, by another user or as a symlink is refused
+def test_unsafe_directory(tmp_path):
+    shared = tmp_path / 'shared'
+    shared.mkdir(mode=0o777)
+    os.chmod(shared, 0o777)
+    with pytest.raises(OSError, match='mode 0700'): _start(str(shared / 'app.sock'))
+    private = tmp_path / 'private'
+    private.mkdir(mode=0o700)
+    link = tmp_path / 'link'
+    link.symlink_to(private)
+    with pytest.raises(OSError, match='mode 0700'): _start(str(link / 'app.sock'))
+    _start(str(private / 'app.sock'))
+
+@pytest.mark.skipif(os.name == 'nt' or os.getuid() != 0, reason='needs root to create a directory owned by another user')
+def test_directory_of_another_user(tmp_path):
+    other = tmp_path / 'other'
+    other.mkdir(mode=0o700)
+    os.chown(other, 12345, 12345)
+    with pytest.raises(OSError, match='owned by this user'): _start(str(other / 'app.sock'))
+    assert not (other / 'app.sock').exists()
@@ -0,0 +1,119 @@
+import os
+import shutil
+import stat
+
+import pytest
+
+from dgsm.utils import backup_store
+from dgsm.utils.backup_store import BackupStore
+
+
+CHUNK = 8
+
+def _write(root, rel:str, data:bytes, mode:int=0o644, mtime_ns:int=None) -> None:
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    os.chmod(path, mode)
+    if mtime_ns is not None: os.utime(path, ns=(mtime_ns, mtime_ns))
+
+# the files under root as {rel: (data, mode, mtime_ns)}
+def _tree(root) -> dict[str, tuple]:
+    tree = {}
+    for dirpath, _, files in os.walk(root):
+        for fname in files:
+            full = os.path.join(dirpath, fname)
+            st = os.stat(full)
+            with open(full, 'rb') as f: tree[os.path.relpath(full, root)] = (f.read(), stat.S_IMODE(st.st_mode), st.st_mtime_ns)
+    return tree
+
+# take a backup of world the way the controller does without a running app - returns the snapshot and bytes written
+def _backup(store:BackupStore, world) -> tuple[str, int]:
+    unchanged, changed = store.scan(str(world), store.latest())
+    with store.workers() as pool:
+        entries = dict(zip(changed, pool.map(lambda rel: store.store_file(str(world), rel, changed[rel]), changed)))
+    files = {**unchanged, **{rel: entry for rel, (entry, _) in entries.items()}}
+    return store.commit(files), sum(written for _, written in entries.values())
+
+def _chunks(store:BackupStore) -> set[str]:
+    return {f for _, _, files in os.walk(store._chunks) for f in files}
+
+@pytest.fixture
+def world(tmp_path):
+    world = tmp_path / 'world'
+    _write(world, 'level.dat', b'level data 0123456789', 0o600, 1_600_000_000_123_456_789)
+    _write(world, 'region/r.0.0.mca', b'A' * CHUNK + b'B' * CHUNK + b'C' * 3, 0o640, 1_600_000_100_000_000_000)
+    _write(world, 'empty', b'', 0o644, 1_600_000_200_000_000_000)
+    return world
+
+@pytest.fixture
+def store(tmp_path):
+    return BackupStore(str(tmp_path / 'backups'), chunk_size=CHUNK, threads=2)
+
+
+def test_restore_round_trip(store, world):
+    before = _tree(world)
+    snap, _ = _backup(store, world)
+    _write(world, 'level.dat', b'corrupted')
+    (world / 'empty').unlink()
+    written, deleted = store.restore(snap, str(world))
+    assert (written, deleted) == (2, 0)
+    assert _tree(world) == before
+
+def test_restore_removes_extra_files(store, world):
+    before = _tree(world)
+    snap, _ = _backup(store, world)
+    _write(world, 'region/r.1.0.mca', b'new region')
+    _write(world, 'stray/file', b'x')
+    assert store.restore(snap, str(world)) == (0, 2)
+    assert _tree(world) == before
+
+def test_unchanged_files_reuse_chunks(store, world):
+    _, written = _backup(store, world)
+    assert written == len(b'level data 0123456789') + 2 * CHUNK + 3
+    chunks = _chunks(store)
+    # nothing changed - nothing is read or written
+    unchanged, changed = store.scan(str(world), store.latest())
+    assert not changed and set(unchanged) == {'level.dat', 'region/r.0.0.mca', 'empty'}
+    # one chunk of a file changed - only that chunk is stored
+    _write(world, 'region/r.0.0.mca', b'A' * CHUNK + b'D' * CHUNK + b'C' * 3, 0o640, 1_600_000_300_000_000_000)
+    _, written = _backup(store, world)
+    assert written == CHUNK
+    assert len(_chunks(store) - chunks) == 1
+
+def test_prune_keeps_chunks_of_surviving_snapshots(store, world):
+    first, _ = _backup(store, world)
+    old = set(store.load(first)['files']['level.dat']['chunks'])
+    _write(world, 'level.dat', b'other level data', 0o600, 1_600_000_400_000_000_000)
+    second, _ = _backup(store, world)
+    assert first != second
+    assert store.prune(keep_last=1) == (1, len(old)) # the old level.dat shares no chunks with the new one
+    assert store.snapshots() == [second]
+    used = {digest for entry in store.load(second)['files'].values() for digest in entry['chunks']}
+    assert _chunks(store) == used
+    before = _tree(world)
+    _write(world, 'level.dat', b'gone')
+    store.restore(second, str(world))
+    assert _tree(world) == before
+
+# without reflink the changed files are not staged and are hashed in place instead
+def test_stage_without_reflink(store, world, monkeypatch):
+    monkeypatch.setattr(backup_store, 'reflink', lambda src, dst: False)
+    _, changed = store.scan(str(world), store.latest())
+    assert store.stage(str(world), changed) is None
+    assert not os.path.exists(store._staging)
+    snap, _ = _backup(store, world)
+    before = _tree(world)
+    _write(world, 'level.dat', b'corrupted')
+    store.restore(snap, str(world))
+    assert _tree(world) == before
+
+# staged copies are hashed while the world keeps changing
+def test_stage_with_reflink(store, world, monkeypatch):
+    def copy(src:str, dst:str) -> bool:
+        shutil.copyfile(src, dst)
+        return True
+    monkeypatch.setattr(backup_store, 'reflink', copy)
+    _, changed = store.scan(str(world), store.latest())
+    assert (staging := store.stage(str(world), changed)) == store._staging
+    assert sorted(os.path.relpath(os.path.join(d, f), staging) for d, _, files in os.walk(staging) for f in files) == sorted(changed)
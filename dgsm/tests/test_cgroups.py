@@ -0,0 +1,64 @@
+import os
+import subprocess
+
+import psutil
+import pytest
+
+from dgsm.utils.cgroups import CgroupManager, Limits, ioprio_setter, parse_size
+
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason='cgroups are linux only')
+
+# a cgroupfs with dgsm running in base, which has the cpu and memory controllers available
+def _cgroupfs(tmp_path, controllers:str='cpu memory'):
+    base = tmp_path / 'dgsm.service'
+    base.mkdir()
+    (tmp_path / 'cgroup.controllers').write_text('cpu io memory pids\n')
+    (base / 'cgroup.controllers').write_text(f'{controllers}\n')
+    (base / 'cgroup.subtree_control').write_text('')
+    return base
+
+
+def test_parse_size():
+    assert parse_size('512M') == 512 << 20
+    assert parse_size('1.5g') == 3 << 29
+    assert parse_size('8GiB') == 8 << 30
+    assert parse_size(1024) == 1024
+    assert parse_size('max') == 'max'
+    with pytest.raises(ValueError): parse_size('lots')
+
+def test_unavailable_without_cgroupfs(tmp_path):
+    cgroups = CgroupManager(root=str(tmp_path), base=str(tmp_path))
+    assert not cgroups.available()
+    assert cgroups.create('app', Limits(memory_max='1G')) is None
+
+def test_create_writes_limits(tmp_path):
+    base = _cgroupfs(tmp_path)
+    cgroups = CgroupManager(root=str(tmp_path), base=str(base))
+    assert cgroups.available()
+    assert (base / 'cgroup.subtree_control').read_text() == '+cpu +memory'
+    path = cgroups.create('my app', Limits(cpu_weight=50, cpu_quota=150, memory_max='2G', io_weight=10))
+    assert path == str(base / 'app-my_app')
+    assert cgroups.effective(path) == {
+        'cpu.weight': '50', 'cpu.max': '150000 100000', 'memory.max': str(2 << 30), 'io.weight': 'default 10'
+    }
+
+def test_preexec_joins_cgroup(tmp_path):
+    procs = tmp_path / 'cgroup.procs'
+    procs.write_text('')
+    Limits(memory_max='1G').preexec(str(procs))()
+    assert procs.read_text() == '0'
+
+def test_unenforced():
+    limits = Limits(cpu_weight=50, memory_high='1G', memory_max='2G', ionice='loud')
+    assert limits.unenforced(cgroup=True) == ['ionice']
+    assert limits.unenforced(cgroup=False) == ['memory_high', 'memory_max', 'ionice']
+    assert Limits(nice=5).unenforced(cgroup=False) == []
+
+@pytest.mark.skipif(not ioprio_setter(3, 0), reason='ioprio_set is not available on this platform')
+def test_preexec_sets_ionice():
+    proc = subprocess.Popen(['sleep', '5'], preexec_fn=Limits(ionice='idle').preexec())
+    try: assert psutil.Process(proc.pid).ionice().ioclass == psutil.IOPRIO_CLASS_IDLE
+    finally:
+        proc.kill()
+        proc.wait()
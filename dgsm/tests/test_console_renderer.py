@@ -0,0 +1,45 @@
+import asyncio
+from types import SimpleNamespace
+
+from dgsm.dgsm import DGSM_Coordinator
+from dgsm.utils.console_renderer import CLEAR_LINE, ConsoleRenderer
+
+
+def _lines(console:ConsoleRenderer) -> list[str]:
+    return console._frame().removeprefix(CLEAR_LINE).removesuffix('\n$ ').split('\n')
+
+def _console(**kwargs) -> ConsoleRenderer:
+    return asyncio.run(_create(**kwargs))
+
+async def _create(**kwargs) -> ConsoleRenderer: return ConsoleRenderer(lambda: '$ ', **kwargs)
+
+
+# output and messages are written in the order they arrived
+def test_frame_keeps_arrival_order():
+    console = _console()
+    console.output(['a1', 'a2'], source='a')
+    console.message('response')
+    console.output(['a3'], source='a')
+    assert _lines(console) == ['a1', 'a2', 'response', 'a3']
+    assert console._frame() == f'{CLEAR_LINE}\n$ '
+
+# only the oldest output is dropped - messages are kept and drops are reported for each source
+def test_backlog_drops_per_source():
+    console = _console(backlog=3)
+    console.message('first')
+    console.output(['a1', 'a2'], source='a')
+    console.output(['b1', 'b2', 'b3'], source='b', skipped=4)
+    console.message('last')
+    assert _lines(console) == [
+        'first', '[4 lines of b skipped - the console is behind]', '[2 lines of a skipped - the console is behind]', 'b1', 'b2', 'b3', 'last',
+    ]
+    assert console.dropped == 6
+
+# invalid console config is reported and the defaults are used
+def test_invalid_config(capsys):
+    async def create(cfg): return DGSM_Coordinator._create_console(SimpleNamespace(_prompt=lambda: '$ '), cfg)
+    for cfg in ({'fps': 'fast'}, {'backlgo': 10}):
+        console = asyncio.run(create(cfg))
+        assert (console.interval, console.backlog) == (1 / 30, 2000)
+        assert 'Invalid console config' in capsys.readouterr().out
+    assert asyncio.run(create({'fps': 10, 'backlog': 50})).backlog == 50
@@ -0,0 +1,85 @@
+import pytest
+
+from dgsm.utils import flood_control
+from dgsm.utils.flood_control import FloodControl, RateLimiter
+
+
+# stands in for the time module - only moves when advanced
+class _Clock:
+    def __init__(self) -> None: self.now = 1000.0
+    def monotonic(self) -> float: return self.now
+    def advance(self, seconds:float) -> None: self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(flood_control, 'time', clock)
+    return clock
+
+
+def test_repeats_collapsed(clock):
+    flood = FloodControl(summary_interval=5)
+    lines = ['start', 'Can\'t keep up! Running 2013ms behind', 'Can\'t keep up! Running 2101ms behind', 'Can\'t keep up! Running 2013ms behind', 'done']
+    assert flood.filter(lines) == (['start', lines[1], '[last line repeated 2 times]', 'done'], set())
+    assert flood.collapsed == 2
+    # a run continues across batches and ends with the first different line
+    assert flood.filter(['done', 'done']) == ([], set())
+    assert flood.filter(['other']) == (['[last line repeated 2 times]', 'other'], set())
+
+def test_critical_lines_pass(clock):
+    flood = FloodControl()
+    out, kept = flood.filter(['tick 1', 'tick 2', 'Steve joined the game', 'tick 3'], critical={2})
+    assert out == ['tick 1', '[last line repeated 1 time]', 'Steve joined the game', 'tick 3']
+    assert kept == {2}
+
+# a flood that never ends is summarized every summary_interval seconds
+def test_summary_interval(clock):
+    flood = FloodControl(summary_interval=5)
+    assert flood.filter(['spam 1', 'spam 2']) == (['spam 1'], set())
+    clock.advance(4.9)
+    assert flood.filter(['spam 3']) == ([], set())
+    clock.advance(0.1)
+    assert flood.filter(['spam 4']) == (['[last line repeated 3 times]'], set())
+    clock.advance(1)
+    assert flood.filter(['spam 5']) == ([], set())
+    clock.advance(4)
+    assert flood.filter(['spam 6']) == (['[last line repeated 2 times]'], set())
+
+# a run pending when the output goes quiet is summarized once idle, and at eof without waiting
+def test_flush(clock):
+    flood = FloodControl()
+    assert flood.flush() == []
+    flood.filter(['spam 1', 'spam 2', 'spam 3'])
+    clock.advance(0.5)
+    assert flood.flush(idle=1.0) == []
+    clock.advance(0.5)
+    assert flood.flush(idle=1.0) == ['[last line repeated 2 times]']
+    assert flood.flush() == []
+    # the run is over - the same line is passed through again
+    assert flood.filter(['spam 4', 'spam 5']) == (['spam 4'], set())
+    assert flood.flush() == ['[last line repeated 1 time]']
+
+
+def test_rate_limit(clock):
+    limiter = RateLimiter(rate=10, burst=5)
+    lines = [f'line {i}' for i in range(8)]
+    assert limiter.limit(lines) == lines[:5]
+    assert limiter.dropped == 3
+    # nothing refilled yet
+    assert limiter.limit(['a']) == []
+    # half a second refills 5 tokens - the consumer is told what it missed
+    clock.advance(0.5)
+    assert limiter.limit(['b', 'c']) == ['[4 lines dropped]', 'b', 'c']
+    assert limiter.dropped == 4
+    # tokens never exceed the burst
+    clock.advance(60)
+    assert len(limiter.limit(lines)) == 5
+
+# kept lines pass without tokens and do not use any up
+def test_rate_limit_keep(clock):
+    limiter = RateLimiter(rate=1, burst=2)
+    assert limiter.limit(['a', 'joined', 'b', 'c', 'left'], keep={1, 4}) == ['a', 'joined', 'b', 'left']
+    assert limiter.limit(['d', 'joined'], keep={1}) == ['joined']
+    assert limiter.dropped == 2
+    clock.advance(1)
+    assert limiter.limit(['e']) == ['[2 lines dropped]', 'e']
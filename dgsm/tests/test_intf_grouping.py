@@ -0,0 +1,64 @@
+from dgsm.utils.intf_grouping import IGI, BoundInterface, interface_tag, interface_version
+
+
+cmd = interface_tag('cmds')
+
+class Base(IGI):
+    def __init__(self, name:str) -> None: self.name = name
+    @cmd('start')
+    def _start(self): return f'{self.name} started'
+    @cmd()
+    def stop(self): return f'{self.name} stopped'
+
+class Child(Base):
+    @cmd('start')
+    def _child_start(self): return f'{self.name} child started'
+
+def _classes():
+    class A(Base): pass
+    class B(A): pass
+    return A, B
+
+
+# every instance has its own table, bound to itself and built once
+def test_instances_are_isolated():
+    a, b = Base('a'), Base('b')
+    assert isinstance(a.cmds, BoundInterface) and a.cmds is a.cmds and a.cmds is not b.cmds
+    assert (a.cmds['start'](), b.cmds.start(), b.cmds.get('stop')()) == ('a started', 'b started', 'b stopped')
+    assert [f() for f in a.cmds.funcs] == ['a started', 'a stopped']
+    # lookups return the methods bound when the table was built instead of binding them again
+    assert a.cmds['start'] is a.cmds.start is a.cmds.funcs[0]
+    assert Child('c').cmds.start() == 'c child started'
+    assert list(Child('c').cmds) == ['start', 'stop']
+
+def test_missing_tag():
+    a = Base('a')
+    assert a.cmds['missing'] is None and a.cmds.get('missing') is None and 'missing' not in a.cmds
+    try: a.cmds.missing
+    except AttributeError as e: assert "does not implement 'missing'" in str(e)
+    else: raise AssertionError('missing tag did not raise')
+
+# changing the interface on the class rebuilds the tables of existing instances
+def test_class_mutation_rebuilds_tables():
+    A, B = _classes()
+    a, b = A('a'), B('b')
+    funcs, version = a.cmds.funcs, interface_version()
+    A.cmds['stop'] = lambda self: f'{self.name} halted'
+    assert interface_version() > version and a.cmds.funcs is not funcs
+    assert (a.cmds.stop(), b.cmds.stop()) == ('a halted', 'b halted')
+    def status(self): return f'{self.name} is fine'
+    A.cmds['status'] = status
+    assert (a.cmds.status(), b.cmds['status']()) == ('a is fine', 'b is fine')
+    del A.cmds['status']
+    assert 'status' not in a.cmds and b.cmds.status() == 'b is fine' # B keeps the method it inherited
+
+# setting a tag on an instance's table changes its class, like the interface group did before tables were bound
+def test_instance_assignment_forwards_to_class():
+    A, B = _classes()
+    a, other, b = A('a'), A('other'), B('b')
+    def seed(self): return f'{self.name} seed'
+    a.cmds['seed'] = seed
+    assert (a.cmds.seed(), other.cmds['seed'](), b.cmds.seed()) == ('a seed', 'other seed', 'b seed')
+    del a.cmds['seed']
+    assert other.cmds['seed'] is None
+    assert Base('base').cmds['seed'] is None
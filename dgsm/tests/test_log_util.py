@@ -0,0 +1,12 @@
+import asyncio
+
+from dgsm.utils.log_util import context_with, log_context
+
+
+# a task created inside the context's run() logs with its fields, the caller's context is unchanged
+def test_context_with_task():
+    async def fields(): return log_context.get()
+    async def run():
+        task = context_with(app='valheim').run(asyncio.get_running_loop().create_task, fields())
+        return await task, log_context.get()
+    assert asyncio.run(run()) == ({'app': 'valheim'}, {})
@@ -0,0 +1,114 @@
+import gzip
+import json
+import os
+import time
+
+from dgsm.utils.output_archive import OutputArchive
+
+
+TS = time.mktime((2024, 5, 1, 12, 0, 0, 0, 0, -1))
+
+def _read(archive:OutputArchive, seg:dict) -> list[str]:
+    with archive.open_segment(seg) as f: return [line.rstrip('\n').split(' ', 2)[2] for line in f]
+
+def _files(path) -> list[str]:
+    return sorted(f for f in os.listdir(path) if not f.endswith('.json'))
+
+
+def test_write_close_write(tmp_path):
+    archive = OutputArchive(str(tmp_path), 'app')
+    archive.write(['a', 'b'], TS)
+    archive.close()
+    archive.write(['c'], TS + 10)
+    archive.join()
+    segs = archive.segments()
+    assert [_read(archive, seg) for seg in segs] == [['a', 'b'], ['c']]
+    assert all(seg['file'].endswith('.gz') and 'open' not in seg for seg in segs)
+    assert [seg['file'] for seg in archive.segments(TS + 5)] == [segs[1]['file']]
+
+# a write after close starts a new writer instead of waiting for the old one to close its segment
+def test_write_does_not_wait_for_closing_writer(tmp_path, monkeypatch):
+    archive = OutputArchive(str(tmp_path), 'app', compress=False)
+    close_segment = archive._close_segment
+    def slow_close(f, seg):
+        time.sleep(0.5)
+        close_segment(f, seg)
+    monkeypatch.setattr(archive, '_close_segment', slow_close)
+    archive.write(['a'], TS)
+    time.sleep(0.1)
+    archive.close()
+    start = time.monotonic()
+    archive.write(['b'], TS + 1)
+    assert time.monotonic() - start < 0.1
+    archive.join()
+    assert [_read(archive, seg) for seg in archive.segments()] == [['a'], ['b']]
+
+# segments of the same second opened by a closing writer and the next one get files of their own
+def test_same_second_segments(tmp_path):
+    archive = OutputArchive(str(tmp_path), 'app', compress=False)
+    for i in range(3):
+        archive.write([str(i)], TS)
+        archive.close()
+    archive.join()
+    assert sorted(_read(archive, seg) for seg in archive.segments()) == [['0'], ['1'], ['2']]
+    assert len(_files(tmp_path)) == 3
+
+def test_retention(tmp_path):
+    archive = OutputArchive(str(tmp_path), 'app', keep=2, compress=False)
+    for i in range(4):
+        archive.write([str(i)], TS + i)
+        archive.close()
+    archive.join()
+    assert [_read(archive, seg) for seg in archive.segments()] == [['2'], ['3']]
+    assert _files(tmp_path) == sorted(seg['file'] for seg in archive.segments())
+
+# retention leaves a segment alone while it is compressed
+def test_retention_spares_compressing_segments(tmp_path):
+    archive = OutputArchive(str(tmp_path), 'app', keep=1, compress=False)
+    for i in range(2):
+        archive.write([str(i)], TS + i)
+        archive.close()
+    archive.join()
+    archive = OutputArchive(str(tmp_path), 'app', keep=1, compress=False)
+    oldest = archive.segments()[0]
+    archive._compressing.add(oldest['file'])
+    archive.write(['2'], TS + 2)
+    archive.close()
+    archive.join()
+    assert oldest['file'] in [seg['file'] for seg in archive.segments()]
+    archive._compressing.clear()
+    archive._apply_retention()
+    assert [_read(archive, seg) for seg in archive.segments()] == [['2']]
+
+# segments left uncompressed by an unclean shutdown are compressed when the archive is opened
+def test_compress_on_load(tmp_path):
+    archive = OutputArchive(str(tmp_path), 'app', compress=False)
+    archive.write(['a'], TS)
+    archive.join()
+    archive = OutputArchive(str(tmp_path), 'app')
+    archive.join()
+    assert _files(tmp_path) == [archive.segments()[0]['file']]
+    assert _files(tmp_path)[0].endswith('.log.gz')
+    with open(tmp_path / 'app.index.json') as f: assert json.load(f)[0]['file'].endswith('.gz')
+    assert _read(archive, archive.segments()[0]) == ['a']
+
+# an unreadable index is rebuilt from the segments on disk, so retention still applies to them
+def test_rebuild_index(tmp_path):
+    archive = OutputArchive(str(tmp_path), 'app', compress=False)
+    for i in range(3):
+        archive.write([str(i)], TS + i)
+        archive.close()
+    archive.join()
+    files = [seg['file'] for seg in archive.segments()]
+    # an interrupted compression of the newest segment
+    with gzip.open(tmp_path / f'{files[-1]}.gz', 'wt') as f: f.write('partial')
+    (tmp_path / 'app.index.json').write_text('{not json')
+    (tmp_path / 'other-20240501-120000.log').write_text('not this archive')
+    archive = OutputArchive(str(tmp_path), 'app', keep=2, compress=False)
+    assert [seg['file'] for seg in archive.segments()] == files
+    assert [seg['start'] for seg in archive.segments()] == [TS, TS + 1, TS + 2]
+    assert not (tmp_path / f'{files[-1]}.gz').exists()
+    archive.write(['3'], TS + 3)
+    archive.join()
+    assert [_read(archive, seg) for seg in archive.segments()] == [['2'], ['3']]
+    assert _files(tmp_path) == sorted([*files[2:], archive.segments()[-1]['file'], 'other-20240501-120000.log'])
@@ -0,0 +1,92 @@
+import asyncio
+import gc
+import re
+
+from dgsm.utils.output_matcher import OutputMatcher, Waiter, WaiterHandle
+
+
+def _run(fn):
+    async def run(): return fn(asyncio.get_running_loop())
+    return asyncio.run(run())
+
+def _results(*waiters:Waiter) -> list:
+    return [w.fut.result() if w.fut.done() else None for w in waiters]
+
+
+def test_sub_string_waiters():
+    def run(loop):
+        matcher = OutputMatcher()
+        done, saved, never = Waiter(loop, sub_string='Done ('), Waiter(loop, sub_string='Saved'), Waiter(loop, sub_string='never')
+        for w in (done, saved, never): matcher.add(w)
+        matcher.feed(['Preparing level', 'Done (3.2s)! For help, type "help"', 'Saved the game'])
+        return _results(done, saved, never), done.output, saved.output
+    assert _run(run) == ([True, True, None], 'Done (3.2s)! For help, type "help"\n', 'Saved the game\n')
+
+# patterns are matched with one combined prefilter - backreferences and clashing group names are checked on their own
+def test_pattern_waiters():
+    def run(loop):
+        matcher = OutputMatcher()
+        seed = Waiter(loop, pattern=re.compile(r'Seed: \[(?P<seed>-?\d+)\]'))
+        player = Waiter(loop, pattern=re.compile(r'(?P<seed>\w+) joined', re.IGNORECASE))
+        repeat = Waiter(loop, pattern=re.compile(r'(\w+) \1'))
+        for w in (seed, player, repeat): matcher.add(w)
+        matcher.feed(['Seed: [-42]', 'ALEX JOINED the game', 'again again'])
+        return _results(seed, player, repeat), seed.match['seed'], player.match['seed'], repeat.match[1]
+    assert _run(run) == ([True, True, True], '-42', 'ALEX', 'again')
+
+def test_count_and_aggregate_waiters():
+    def run(loop):
+        matcher = OutputMatcher()
+        count = Waiter(loop, count=2)
+        capped = Waiter(loop, count=3, cap=6)
+        until = Waiter(loop, sub_string='end', aggregate=True)
+        for w in (count, capped, until): matcher.add(w)
+        matcher.feed(['one', 'two'])
+        matcher.feed(['three', 'the end'])
+        return _results(count, capped, until), count.output, (capped.output, capped.truncated), until.output
+    assert _run(run) == (
+        [True, True, True], 'one\ntwo\n', ('one\ntwo\n', True), 'one\ntwo\nthree\nthe end\n',
+    )
+
+def test_remove_and_clear():
+    def run(loop):
+        matcher = OutputMatcher()
+        removed, cleared = Waiter(loop, sub_string='x'), Waiter(loop, sub_string='y')
+        matcher.add(removed)()
+        matcher.add(cleared)
+        matcher.feed(['x'])
+        matcher.clear()
+        return _results(removed, cleared), len(matcher)
+    assert _run(run) == ([None, False], 0)
+
+# the waiter is removed once the handle that owns it is dropped, and kept while the handle is referenced
+def test_waiter_removed_with_its_handle():
+    def run(loop):
+        matcher = OutputMatcher()
+        handle = WaiterHandle()
+        handle.stop = matcher.add(Waiter(loop, sub_string='x'), owner=handle)
+        gc.collect()
+        kept = len(matcher)
+        del handle
+        gc.collect()
+        return kept, len(matcher)
+    assert _run(run) == (1, 0)
+
+# a handle in an awaiter's closure keeps the waiter while the awaiter's coroutine runs, even after the function is dropped
+def test_waiter_kept_by_running_coroutine():
+    async def run():
+        loop = asyncio.get_running_loop()
+        matcher = OutputMatcher()
+        def make():
+            waiter, handle = Waiter(loop, sub_string='x'), WaiterHandle()
+            async def awaiter():
+                try: return await waiter.fut
+                finally: handle.stop()
+            handle.stop = matcher.add(waiter, owner=handle)
+            return awaiter()
+        task = loop.create_task(make())
+        await asyncio.sleep(0)
+        gc.collect()
+        matcher.feed(['x'])
+        return await task, len(matcher)
+    assert asyncio.run(run()) == (True, 0)
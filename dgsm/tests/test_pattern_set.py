@@ -0,0 +1,67 @@
+import re
+
+import pytest
+
+from dgsm.controllers.implementations.factorio_controller import FactorioController
+from dgsm.controllers.implementations.minecraft_controller import MineCraftController
+from dgsm.controllers.implementations.valheim_controller import ValheimController
+from dgsm.utils.pattern_set import PatternSet, required_literal
+
+
+LINES = [
+    '[12:00:00] [Server thread/INFO]: Starting minecraft server version 1.20.4',
+    '[12:00:09] [Server thread/INFO]: Done (8.512s)! For help, type "help"',
+    '[12:01:00] [Server thread/INFO]: Steve joined the game',
+    '[12:05:00] [Server thread/INFO]: Steve left the game',
+    '[12:06:00] [Server thread/INFO]: <Alex> did Bob join? Bob joined the game, then Bob left the game',
+    '[12:07:00] [Server thread/INFO]: Bob left the game after Alex joined the game', # two patterns - the first declared wins
+    '   0.000 2024-05-01 12:00:00; Factorio 1.1.101 (build 62151, linux64, headless)',
+    '  10.123 Info ServerMultiplayerManager.cpp:789: Hosting game at IP ADDR:({0.0.0.0:34197})',
+    '2024-05-01 12:01:00 [JOIN] engineer joined the game',
+    '2024-05-01 12:02:00 [LEAVE] engineer left the game',
+    '05/01/2024 12:00:00: Valheim version: l-0.217.46 (network version 21)',
+    '05/01/2024 12:00:30: Game server connected',
+    '05/01/2024 12:01:00: Got character ZDOID from Ragnar : -123456789:1',
+    '05/01/2024 12:05:00: Destroying abandoned non persistent zdo -123456789:1 owner -123456789',
+    'GAME SERVER CONNECTED', # flags are kept per pattern
+    '[12:08:00] [Server thread/INFO]: Saved the game',
+    '',
+    'nothing to see here',
+]
+
+# the behaviour PatternSet replaced - every pattern is searched in turn and the first to match wins
+def _loop(patterns:list, line:str):
+    for i, pattern in enumerate(patterns):
+        if m := re.search(pattern, line): return i, m
+    return None
+
+def _same(patterns:list, lines:list[str], engine:str='re') -> None:
+    pset = PatternSet(patterns, engine)
+    for line in lines:
+        expected, got = _loop(patterns, line), pset.search(line)
+        assert (expected and (expected[0], expected[1].span(), expected[1].groups())) == (got and (got[0], got[1].span(), got[1].groups())), line
+
+
+@pytest.mark.parametrize('cls', [MineCraftController, FactorioController, ValheimController])
+def test_handlers_match_per_pattern_loop(cls):
+    patterns = list(cls.handlers.keys())
+    assert len(patterns) >= 4
+    _same(patterns, LINES)
+    _same(patterns, LINES, engine='re2') # falls back to re when re2 is not installed
+
+# all handler patterns of every game in one set, with and without the literal prefilter and the combined alternation
+def test_precedence_across_games():
+    patterns = [p for cls in (MineCraftController, FactorioController, ValheimController) for p in cls.handlers.keys()]
+    _same(patterns, LINES)
+    _same(list(reversed(patterns)), LINES)
+    no_literal = [*patterns, re.compile(r'\d{5,}')]
+    assert PatternSet(no_literal)._prefilter is None
+    _same(no_literal, [*LINES, 'id 1234567'])
+    backref = [re.compile(r'(\w+) joined the game, then \1'), *patterns]
+    assert PatternSet(backref)._combined is None
+    _same(backref, LINES)
+
+def test_required_literal():
+    assert required_literal(re.compile(r'(?:\[JOIN\] )(\w+)(?: joined the game)')) == ' joined the game'
+    assert required_literal(re.compile(r'(Done \([\w.]+s\)!)')) == 'Done ('
+    assert required_literal(re.compile(r'\d+|x')) == ''
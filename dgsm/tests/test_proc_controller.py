@@ -0,0 +1,57 @@
+import asyncio
+import os
+
+import psutil
+import pytest
+
+from dgsm.controllers import CONTROLLERS, DEFAULT_ID
+
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason='uses a posix shell')
+
+async def _discard(*_, **__): pass
+
+def _controller(script:str, **opts):
+    return CONTROLLERS[DEFAULT_ID]('test', prg=['sh', '-c', script], msg_cb=_discard, opts=opts)
+
+async def _wait_until(cond, timeout:float=10.0) -> bool:
+    loop = asyncio.get_running_loop()
+    until = loop.time() + timeout
+    while not cond():
+        if loop.time() > until: return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+# the root exits while its children keep running - every child is stopped, not all but the first
+def test_children_terminated_when_root_exits_first(tmp_path):
+    pids = tmp_path / 'pids'
+    script = f'sleep 60 >/dev/null 2>&1 & echo $! >> {pids}; sleep 60 >/dev/null 2>&1 & echo $! >> {pids}; sleep 1'
+
+    async def run():
+        app = _controller(script, ready={'timeout': 30})
+        start = asyncio.get_running_loop().create_task(app.cmds.start())
+        assert await _wait_until(lambda: pids.exists() and len(pids.read_text().split()) == 2)
+        children = [int(pid) for pid in pids.read_text().split()]
+        assert await _wait_until(lambda: app._tracker and set(children) <= {p.pid for p in app._tracker.discover()})
+        root = app._proc.pid
+        assert await _wait_until(lambda: not app._run, timeout=30)
+        await start
+        assert not psutil.pid_exists(root) or psutil.Process(root).status() == psutil.STATUS_ZOMBIE
+        return children
+
+    children = asyncio.run(run())
+    gone, alive = psutil.wait_procs([psutil.Process(pid) for pid in children if psutil.pid_exists(pid)], timeout=5)
+    assert not alive
+
+
+# critical workers hold up the reader when they fall behind instead of losing lines, display workers drop the oldest lines
+def test_output_worker_overflow():
+    async def run():
+        app = _controller('true')
+        stops = [app.output_worker(print, critical=True), app.output_worker(print, critical=False)]
+        overflow = {limiter is None: sub.overflow for sub, limiter in app._subscriptions.values()}
+        for stop in stops: stop()
+        return overflow
+
+    assert asyncio.run(run()) == {True: 'block', False: 'drop_oldest'}
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+
+from dgsm.utils.rcon import (
+    RconAuthError, RconConnection, RconError, RconPool, encode_packet, read_packet,
+    SERVERDATA_AUTH, SERVERDATA_AUTH_RESPONSE, SERVERDATA_RESPONSE_VALUE,
+)
+
+
+PASSWORD = 'secret'
+
+# Fake rcon server - responses longer than 'fragment' characters are split over several packets
+# answers the empty RESPONSE_VALUE after each command like source servers do, unless 'marker' is False
+# fragments are 'delay' seconds apart
+async def _serve(responses:dict[str,str], fragment:int=4096, marker:bool=True, delay:float=0.0):
+    async def handle(reader, writer):
+        try:
+            while True:
+                request_id, kind, body = await read_packet(reader)
+                if kind == SERVERDATA_AUTH:
+                    writer.write(encode_packet(request_id, SERVERDATA_RESPONSE_VALUE, ''))
+                    writer.write(encode_packet(request_id if body == PASSWORD else -1, SERVERDATA_AUTH_RESPONSE, ''))
+                elif kind == SERVERDATA_RESPONSE_VALUE:
+                    if marker: writer.write(encode_packet(request_id, SERVERDATA_RESPONSE_VALUE, ''))
+                else:
+                    text = responses.get(body, f'Unknown command {body}')
+                    for i in range(0, max(len(text), 1), fragment):
+                        if i and delay:
+                            await writer.drain()
+                            await asyncio.sleep(delay)
+                        writer.write(encode_packet(request_id, SERVERDATA_RESPONSE_VALUE, text[i:i + fragment]))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError): pass
+        finally: writer.close()
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_multi_packet_response():
+    long = ''.join(f'line {i}\n' for i in range(2000))
+    async def run():
+        server, port = await _serve({'list': long, 'seed': 'Seed: [42]'}, fragment=1000)
+        async with server:
+            conn = RconConnection('127.0.0.1', port, PASSWORD, timeout=2, idle=5)
+            await conn.connect()
+            try: return await asyncio.gather(conn.execute('list'), conn.execute('seed'))
+            finally: conn.close()
+    assert asyncio.run(run()) == [long, 'Seed: [42]']
+
+# a server that does not answer the marker costs the timeout once - later responses complete once the server goes quiet
+def test_server_without_marker():
+    long = 'x' * 5000
+    async def run():
+        server, port = await _serve({'list': long, 'seed': 'Seed: [42]'}, fragment=1000, marker=False)
+        async with server:
+            conn = RconConnection('127.0.0.1', port, PASSWORD, timeout=1, idle=0.2)
+            await conn.connect()
+            try:
+                first = await conn.execute('seed')
+                start = time.monotonic()
+                return first, await asyncio.gather(conn.execute('list'), conn.execute('seed')), time.monotonic() - start
+            finally: conn.close()
+    first, results, elapsed = asyncio.run(run())
+    assert first == 'Seed: [42]'
+    assert results == [long, 'Seed: [42]']
+    assert elapsed < 0.8
+
+# a gap within a response does not truncate it while the server answers the marker
+def test_slow_fragments_with_marker():
+    async def run():
+        server, port = await _serve({'list': 'abc'}, fragment=1, delay=0.4)
+        async with server:
+            conn = RconConnection('127.0.0.1', port, PASSWORD, timeout=3, idle=0.2)
+            await conn.connect()
+            try: return await conn.execute('list')
+            finally: conn.close()
+    assert asyncio.run(run()) == 'abc'
+
+def test_wrong_password():
+    async def run():
+        server, port = await _serve({})
+        async with server:
+            conn = RconConnection('127.0.0.1', port, 'wrong', timeout=2)
+            with pytest.raises(RconAuthError): await conn.connect()
+    asyncio.run(run())
+
+def test_connection_refused():
+    async def run():
+        server, port = await _serve({})
+        server.close()
+        await server.wait_closed()
+        with pytest.raises(RconError): await RconPool('127.0.0.1', port, PASSWORD, timeout=2).execute('list')
+    asyncio.run(run())
@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+
+import pytest
+
+from dgsm.controllers import registry
+from dgsm.controllers.default_controller import DefaultController
+from dgsm.controllers.registry import MANIFEST, ControllerRegistry, scan_directory
+
+
+def _controller(class_name:str, id_expr:str) -> str:
+    return (
+        'from dgsm.controllers.default_controller import DefaultController\n\n'
+        f'class {class_name}(DefaultController):\n'
+        '    @classmethod\n'
+        f'    def ID(cls) -> str: return {id_expr}\n'
+    )
+
+MODULES = {
+    'good.py': _controller('GoodController', "'Good'"),
+    'broken.py': _controller('BrokenController', "'broken'") + 'raise RuntimeError("missing dependency")\n',
+    'computed.py': _controller('ComputedController', "'comp' + 'uted'"),
+}
+
+# a package of controller modules that is importable for the duration of the test
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    name = f'ctrl_{tmp_path.name}'
+    directory = tmp_path / name
+    directory.mkdir()
+    (directory / '__init__.py').write_text('')
+    for fname, source in MODULES.items(): (directory / fname).write_text(source)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield name, directory
+    for module in [m for m in sys.modules if m == name or m.startswith(f'{name}.')]: del sys.modules[module]
+
+def _registry(package) -> ControllerRegistry:
+    name, directory = package
+    controllers = ControllerRegistry()
+    controllers.scan(str(directory), name)
+    return controllers
+
+
+def test_scan_directory(package):
+    _, directory = package
+    assert scan_directory(str(directory)) == {
+        'broken.py': [('BrokenController', 'broken')],
+        'computed.py': [('ComputedController', None)],
+        'good.py': [('GoodController', 'Good')],
+    }
+    with open(directory / '__pycache__' / MANIFEST) as f: assert set(json.load(f)['files']) == set(MODULES)
+
+# modules are only imported when one of their IDs is looked up
+def test_lazy_import(package):
+    name, _ = package
+    controllers = _registry(package)
+    assert not [m for m in sys.modules if m.startswith(f'{name}.')]
+    imp = controllers['GOOD']
+    assert imp.__name__ == 'GoodController' and issubclass(imp, DefaultController)
+    assert [m for m in sys.modules if m.startswith(f'{name}.')] == [f'{name}.good']
+    assert controllers['good'] is imp
+
+# an ID that is not a literal is learned by importing its module when it is not found otherwise
+def test_computed_id(package):
+    name, _ = package
+    controllers = _registry(package)
+    assert f'{name}.computed' not in sys.modules
+    assert controllers['computed'].__name__ == 'ComputedController'
+    assert f'{name}.broken' not in sys.modules
+
+# a module that fails to import loses its IDs - the other controllers are unaffected
+def test_broken_module(package):
+    controllers = _registry(package)
+    assert 'broken' in controllers
+    with pytest.raises(KeyError): controllers['broken']
+    assert 'broken' not in controllers
+    assert sorted(controllers) == ['computed', 'good']
+    assert controllers['good'].__name__ == 'GoodController'
+
+# cached scans are reused until a file's mtime or size changes
+def test_manifest_invalidation(package, monkeypatch):
+    _, directory = package
+    scan_directory(str(directory))
+    parsed = []
+    scan_source = registry.scan_source
+    monkeypatch.setattr(registry, 'scan_source', lambda path: parsed.append(os.path.basename(path)) or scan_source(path))
+    scan_directory(str(directory))
+    assert parsed == []
+    # same size, new mtime
+    good = directory / 'good.py'
+    st = good.stat()
+    good.write_text(MODULES['good.py'].replace("'Good'", "'Gold'"))
+    os.utime(good, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert scan_directory(str(directory))['good.py'] == [('GoodController', 'Gold')]
+    # same mtime, new size
+    st = good.stat()
+    good.write_text(MODULES['good.py'].replace("'Good'", "'Golden'"))
+    os.utime(good, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert scan_directory(str(directory))['good.py'] == [('GoodController', 'Golden')]
+    assert parsed == ['good.py', 'good.py']
+    # removed files are dropped from the manifest
+    (directory / 'broken.py').unlink()
+    assert set(scan_directory(str(directory))) == {'computed.py', 'good.py'}
+    with open(directory / '__pycache__' / MANIFEST) as f: assert set(json.load(f)['files']) == {'computed.py', 'good.py'}
+    assert parsed == ['good.py', 'good.py']
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import struct
+
+import pytest
+
+from dgsm.utils.server_query import (
+    A2S_HEADER, A2S_INFO, A2S_PLAYER, ANONYMOUS, QueryResult, _packet, _read_varint, _varint, query_a2s, query_slp, reconcile,
+)
+
+
+CHALLENGE = b'\x01\x02\x03\x04'
+
+# Fake steam server - both A2S_INFO and A2S_PLAYER have to be answered with the challenge first, like recent source servers
+class _A2SResponder(asyncio.DatagramProtocol):
+    def __init__(self, players:list[str], max_players:int=10, bots:int=0, version:str='0.217.46') -> None:
+        self.players = players
+        self.max_players = max_players
+        self.bots = bots
+        self.version = version
+        self.requests:list[bytes] = []
+
+    def connection_made(self, transport): self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.requests.append(data)
+        if data.startswith(A2S_INFO): request, challenge = A2S_INFO, data[len(A2S_INFO):]
+        elif data.startswith(A2S_PLAYER): request, challenge = A2S_PLAYER, data[len(A2S_PLAYER):]
+        else: return
+        if challenge != CHALLENGE: return self.transport.sendto(A2S_HEADER + b'A' + CHALLENGE, addr)
+        self.transport.sendto(A2S_HEADER + (self._info() if request is A2S_INFO else self._player()), addr)
+
+    def _info(self) -> bytes:
+        strings = b''.join(s.encode() + b'\x00' for s in ('My server', 'world', 'valheim', 'Valheim'))
+        counts = struct.pack('<HBBB', 0, len(self.players) + self.bots, self.max_players, self.bots) # app id, players, max players, bots
+        return b'I\x11' + strings + counts + b'dlo\x00' + self.version.encode() + b'\x00'
+
+    def _player(self) -> bytes:
+        return b'D' + bytes([len(self.players)]) + b''.join(
+            bytes([i]) + name.encode() + b'\x00' + struct.pack('<if', i, 60.0) for i, name in enumerate(self.players)
+        )
+
+async def _a2s_server(responder:_A2SResponder) -> tuple[asyncio.DatagramTransport, int]:
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(lambda: responder, local_addr=('127.0.0.1', 0))
+    return transport, transport.get_extra_info('sockname')[1]
+
+# Fake minecraft server answering one status request per connection
+async def _slp_server(status:dict):
+    async def handle(reader, writer):
+        try:
+            for _ in range(2): # handshake, status request
+                await reader.readexactly(await _read_varint(reader))
+            data = json.dumps(status).encode()
+            writer.write(_packet(0x00, _varint(len(data)) + data))
+            await writer.drain()
+        finally: writer.close()
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_a2s_with_players():
+    async def run():
+        responder = _A2SResponder(['Alice', 'Bob'], bots=1)
+        transport, port = await _a2s_server(responder)
+        try: return await query_a2s('127.0.0.1', port, timeout=2)
+        finally: transport.close()
+    result = asyncio.run(run())
+    assert (result.players, result.max_players, result.names, result.version) == (2, 10, ['Alice', 'Bob'], '0.217.46')
+    assert result.complete
+
+def test_a2s_empty_server_skips_player_query():
+    async def run():
+        responder = _A2SResponder([])
+        transport, port = await _a2s_server(responder)
+        try: return await query_a2s('127.0.0.1', port, timeout=2), responder.requests
+        finally: transport.close()
+    result, requests = asyncio.run(run())
+    assert (result.players, result.names) == (0, [])
+    assert not any(r.startswith(A2S_PLAYER) for r in requests)
+
+# valheim reports empty names - the count is known but the list is not complete
+def test_a2s_unnamed_players():
+    async def run():
+        transport, port = await _a2s_server(_A2SResponder(['', '']))
+        try: return await query_a2s('127.0.0.1', port, timeout=2)
+        finally: transport.close()
+    result = asyncio.run(run())
+    assert result.players == 2 and not result.complete
+
+def test_a2s_timeout():
+    async def run():
+        transport, port = await _a2s_server(asyncio.DatagramProtocol())
+        try: await query_a2s('127.0.0.1', port, timeout=0.2)
+        finally: transport.close()
+    with pytest.raises(asyncio.TimeoutError): asyncio.run(run())
+
+def test_slp():
+    status = {
+        'version': {'name': '1.20.4', 'protocol': 765},
+        'players': {'max': 20, 'online': 3, 'sample': [{'name': 'Alice', 'id': '1'}, {'name': 'Anonymous Player', 'id': ANONYMOUS}]},
+        'description': {'text': 'A Minecraft Server'},
+    }
+    async def run():
+        server, port = await _slp_server(status)
+        async with server: return await query_slp('127.0.0.1', port, timeout=2)
+    result = asyncio.run(run())
+    assert (result.players, result.max_players, result.names, result.version) == (3, 20, ['Alice', ''], '1.20.4')
+    assert not result.complete
+
+def test_varint_roundtrip():
+    async def decode(data:bytes) -> int:
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        return await _read_varint(reader)
+    for value in (0, 1, 127, 128, 25565, 2**31 - 1):
+        assert asyncio.run(decode(_varint(value))) == value
+    assert _varint(-1) == b'\xff\xff\xff\xff\x0f'
+
+
+def test_reconcile():
+    players = ['Alice', 'Bob', 'Carol']
+    # a complete list keeps the join order of the known players and appends the new ones
+    assert reconcile(players, QueryResult(3, 10, ['Dave', 'Carol', 'Alice'])) == ['Alice', 'Carol', 'Dave']
+    # only the count is known - the players that joined first are dropped
+    assert reconcile(players, QueryResult(1, 10, [''])) == ['Carol']
+    assert reconcile(players, QueryResult(3, 10)) is None
+    assert reconcile(players, QueryResult(3, 10, ['Alice', 'Bob', 'Carol'])) is None
@@ -0,0 +1,112 @@
+import asyncio
+import re
+
+import pytest
+
+from dgsm.utils.subscription import Subscription
+
+
+# everything queued in sub once it is closed
+async def _drain(sub:Subscription) -> list:
+    sub.close()
+    return [item async for item in sub]
+
+
+def test_drop_oldest():
+    async def run():
+        sub = Subscription(maxsize=3)
+        sub.publish(['a', 'b'])
+        sub.publish(['c', 'd'])
+        sub.publish(['e'])
+        return sub, await _drain(sub)
+    sub, lines = asyncio.run(run())
+    assert lines == ['c', 'd', 'e']
+    assert (sub.received, sub.dropped, sub.delivered, sub.max_lag) == (5, 2, 3, 3)
+
+# a partly delivered batch is cut at the right line
+def test_drop_oldest_after_partial_read():
+    async def run():
+        sub = Subscription(maxsize=3)
+        sub.publish(['a', 'b', 'c'])
+        first = await anext(sub)
+        sub.publish(['d', 'e'])
+        return first, await _drain(sub), sub.dropped
+    assert asyncio.run(run()) == ('a', ['c', 'd', 'e'], 1)
+
+def test_drop_new():
+    async def run():
+        sub = Subscription(maxsize=3, overflow='drop_new')
+        sub.publish(['a', 'b'])
+        sub.publish(['c', 'd'])
+        sub.publish(['e'])
+        return sub, await _drain(sub)
+    sub, lines = asyncio.run(run())
+    assert lines == ['a', 'b', 'c']
+    assert (sub.received, sub.dropped, sub.delivered) == (5, 2, 3)
+
+# a block subscription drops nothing - the reader waits until the consumer catches up
+def test_block():
+    async def run():
+        sub = Subscription(maxsize=2, overflow='block')
+        got = []
+        async def reader():
+            for i in range(0, 10, 3):
+                sub.publish([str(n) for n in range(i, min(i + 3, 10))])
+                assert sub.lag < sub.maxsize + 3 # never more than one batch beyond maxsize
+                await sub.wait_space()
+            sub.close()
+        async def consumer():
+            async for line in sub:
+                got.append(line)
+                await asyncio.sleep(0)
+        await asyncio.wait_for(asyncio.gather(reader(), consumer()), 2)
+        return sub, got
+    sub, got = asyncio.run(run())
+    assert got == [str(n) for n in range(10)]
+    assert sub.dropped == 0 and sub.max_lag == 4
+
+# close releases a reader waiting for space
+def test_block_close_releases_reader():
+    async def run():
+        sub = Subscription(maxsize=1, overflow='block')
+        sub.publish(['a', 'b'])
+        assert sub.full
+        waiter = asyncio.create_task(sub.wait_space())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        sub.close()
+        await asyncio.wait_for(waiter, 1)
+    asyncio.run(run())
+
+def test_batch():
+    async def run():
+        sub = Subscription(filter=re.compile(r'^\d'), maxsize=3, batch=True)
+        sub.publish(['1', 'x', '2'])
+        sub.publish(['3', '4'])
+        sub.publish(['y'])
+        return sub, await _drain(sub)
+    sub, batches = asyncio.run(run())
+    assert batches == [['2'], ['3', '4']]
+    assert (sub.received, sub.dropped, sub.delivered, sub.lag) == (4, 1, 3, 0)
+
+# close ends a consumer waiting in async for after the queued lines are delivered
+def test_close_ends_iteration():
+    async def run():
+        sub = Subscription(filter='keep')
+        got = []
+        async def consumer():
+            async for line in sub: got.append(line)
+        task = asyncio.create_task(consumer())
+        sub.publish(['keep 1', 'skip', 'keep 2'])
+        await asyncio.sleep(0)
+        sub.publish(['keep 3'])
+        sub.close()
+        sub.publish(['keep 4'])
+        await asyncio.wait_for(task, 1)
+        return got
+    assert asyncio.run(run()) == ['keep 1', 'keep 2', 'keep 3']
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError): Subscription(overflow='drop_all')
+    with pytest.raises(ValueError): Subscription(maxsize=0)
+    with pytest.raises(TypeError): Subscription(filter=42)
@@ -6,6 +6,8 @@ from disnake.ext import commands
 from disnake import ApplicationCommandInteraction
 from disnake.http import LoginFailure, HTTPException, GatewayNotFound
 import dgsm_bot.utils as nutil
+from dgsm_bot.monitor import HostMonitor, UP, BOOTING
+from dgsm_bot.outbox import Outbox
 import dgsm_bot.ssock as ssock
 
 
@@ -32,6 +34,7 @@ class DBot(commands.Cog):
         self._port = port
         self._controller_mac = mac
         self._app_info:dict[str,AppInfo] = {}
+        self._outbox = Outbox(bot, **kwargs.get('outbox', {}))
         self._sock = ssock.SSock(
             type='c',
             host=self._controller_ip,
@@ -40,6 +43,7 @@ class DBot(commands.Cog):
             on_connect=self._on_sock_connect,
             on_disconnect=self._on_sock_disconnect
         )
+        self._monitor = HostMonitor(self._controller_ip, [self._port], connected=lambda: self._sock.connected, **kwargs.get('monitor', {}))
     
     def main_loop(self):
         # wrap discord interface coros - stop the event loop if they raise and exception
@@ -56,6 +60,7 @@ class DBot(commands.Cog):
                 self._bot.loop.stop()
         self._bot.loop.create_task(start_bot()) # connect to discord
         self._sock.schedule(self._bot.loop) # connect to dgsm
+        self._bot.loop.create_task(self._monitor.run()) # keep the host's state current
         self._bot.loop.run_forever()
     
     # wait with timeout for the dgsm to connect
@@ -74,6 +79,7 @@ class DBot(commands.Cog):
     async def _on_sock_disconnect(self):
         print('Disconnected from DGSM')
         self._app_info = {}
+        await self._monitor.refresh()
     
     # extracts necessary context from a discord interaction to send to the dgsm
     def _extract_context(self, ctx:Union[ApplicationCommandInteraction, commands.Context]):
@@ -102,55 +108,54 @@ class DBot(commands.Cog):
         for name, info in app_info.items():
             self._app_info[name] = AppInfo(*info.values())
     
-    # sends message to the discord server
-    # uses messaging context to determine how to send the message
+    # queues message for the discord server
+    # uses messaging context to determine how to send the message - see Outbox
+    # a payload with a 'progress' key edits the message of the previous update with the same key
     async def _message_bot(self, payload):
         # leave if there is no context or message to send
         if not ((ctx := payload.get('context')) and (msg := payload.get('message'))): return
-        for chunk in nutil.message_chunks(msg, 1950):
-            chunk = f'```{chunk}```'
-            # respond to any interaction that has not yet been responded to (satisfy the deferral)
-            if (ctx.get('type', '') == 'interaction'
-                and not ctx.get('responded', True)
-                and (token := ctx.get('interaction_token'))):
-                await self._bot.http.create_followup_message(
-                    application_id=self._bot.application_id,
-                    token=token,
-                    content=chunk
-                )
-                ctx.update({'responded': True})
-            # everything else is pushed to the original channel (long running apps may push status beyond the 15m window)
-            elif cid := ctx.get('channel_id'): await self._bot.get_channel(cid).send(chunk)
+        self._outbox.post(ctx, msg, payload.get('progress'))
     
     ### user command handling ###
     async def _wake(self, context):
         extracted_ctx = self._extract_context(context)
-        if nutil.is_online(self._controller_ip):
+        if (state := await self._monitor.check()) == UP:
             await self._message_bot({
                 'context': extracted_ctx,
                 'message': 'The host is already powered on.'
             })
             return
+        if state == BOOTING:
+            await self._message_bot({
+                'context': extracted_ctx,
+                'message': 'The host is already powering on.  Please wait.'
+            })
+            return
         if not nutil.wol(self._controller_mac): #unable to send WOL packet
             await self._message_bot({
                 'context': extracted_ctx,
                 'message': 'Unable to power on host. Try again later.'
                 })
             return
+        self._monitor.booting()
         await self._message_bot({
             'context': extracted_ctx,
-            'message': 'Powering on the host.  Please wait.'
+            'message': 'Powering on the host.  Please wait.',
+            'progress': 'wake'
         })
         extracted_ctx.update({'responded': True})
         if await self._wait_for_connect(): 
             await self._message_bot({
                 'context': extracted_ctx,
-                'message': 'The host is now powered on and connected.'
+                'message': 'The host is now powered on and connected.',
+                'progress': 'wake'
                 })
         else: # the host is pingable, but the local socket is not connecting
+            await self._monitor.boot_failed() # so the next wake is not turned away as 'already powering on'
             await self._message_bot({
                 'context': extracted_ctx,
-                'message': 'The host is unresponsive. Try again later.'
+                'message': 'The host is unresponsive. Try again later.',
+                'progress': 'wake'
             })
     
     async def _sleep(self, context):
@@ -184,13 +189,12 @@ class DBot(commands.Cog):
             'context': self._extract_context(context),
             'user_cmd': {'cmd': 'status', 'app': app} if app else {'cmd': 'status'}
         })
-        elif not nutil.is_online(self._controller_ip): await self._message_bot({
-            'context': self._extract_context(context),
-            'message': "The host is disconnected. Try 'wake' to turn it on."
-        })
-        elif nutil.is_online(self._controller_ip): await self._message_bot({
+        else: await self._message_bot({
             'context': self._extract_context(context),
-            'message': "The host is powered on but unresponsive. Try again later."
+            'message': {
+                UP: "The host is powered on but unresponsive. Try again later.",
+                BOOTING: "The host is powering on. Try again shortly."
+            }.get(await self._monitor.check(), "The host is disconnected. Try 'wake' to turn it on.")
         })
     
     async def _help(self, context, app):
@@ -312,7 +316,7 @@ class DBot(commands.Cog):
 
 
 # configures and returns a DBot instance
-def create_dbot(token:str, prefix=None, mac:str=None, address:str='localhost', port:int=8888) -> DBot:
+def create_dbot(token:str, prefix=None, mac:str=None, address:str='localhost', port:int=8888, outbox:dict=None, monitor:dict=None) -> DBot:
     intent = Intents.default()
     if prefix:
         intent.message_content = True
@@ -333,7 +337,9 @@ def create_dbot(token:str, prefix=None, mac:str=None, address:str='localhost', p
         token=token,
         address=address,
         port=port,
-        mac=mac
+        mac=mac,
+        outbox=outbox or {},
+        monitor=monitor or {}
     )
 
     bot.add_cog(dbot)
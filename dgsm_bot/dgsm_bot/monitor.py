@@ -0,0 +1,93 @@
+import asyncio
+import time
+from typing import Callable, Optional
+import dgsm_bot.utils as nutil
+
+
+UP, DOWN, BOOTING, UNKNOWN = 'up', 'down', 'booting', 'unknown'
+
+# Cached reachability of the DGSM host - answers without waiting on the network
+# the host is probed every 'interval' seconds, and on demand when the cached state is older than 'max_age' seconds
+# a probe pings the host on a worker thread and tries a tcp connection to each of 'ports' at the same time
+#   a refused connection counts as reachable, the host answered it
+# while 'connected' returns True (the socket to DGSM is up) the host is known to be up and is not probed
+# after a wake the host is 'booting' until it answers, 'boot_timeout' seconds have passed or the wake gives up on DGSM connecting
+class HostMonitor:
+    def __init__(self, host:str, ports:list[int]=(), interval:float=30.0, max_age:float=10.0, timeout:float=0.5, boot_timeout:float=200.0, connected:Callable[[], bool]=None) -> None:
+        self.host = host
+        self.ports = list(ports)
+        self.interval = interval
+        self.max_age = max_age
+        self.timeout = timeout
+        self.boot_timeout = boot_timeout
+        self._connected = connected or (lambda: False)
+        self._state = UNKNOWN
+        self.since = self.checked = 0.0 # time.time() the state last changed and was last confirmed
+        self._boot_deadline = 0.0
+        self._probe:Optional[asyncio.Task] = None
+        self.probes = 0
+
+    # cached state - does not probe
+    @property
+    def state(self) -> str:
+        if self._connected(): return UP
+        if self._state == BOOTING and time.time() > self._boot_deadline: self._set(DOWN)
+        return self._state
+
+    # seconds since the state was last confirmed
+    @property
+    def age(self) -> float:
+        return 0.0 if self._connected() else time.time() - self.checked
+
+    # cached state, probing first if it is older than max_age (defaults to the monitor's max_age)
+    async def check(self, max_age:float=None) -> str:
+        if self._connected(): return UP
+        if self.age > (self.max_age if max_age is None else max_age): await self.refresh()
+        return self.state
+
+    # probe the host now - concurrent callers share the probe in flight
+    async def refresh(self) -> str:
+        if not self._probe or self._probe.done(): self._probe = asyncio.get_event_loop().create_task(self._run_probe())
+        await asyncio.shield(self._probe)
+        return self.state
+
+    # a wake-on-lan packet was sent
+    def booting(self) -> None:
+        self._boot_deadline = time.time() + self.boot_timeout
+        self._set(BOOTING)
+        self.checked = time.time()
+
+    # the host did not connect after a wake - it is no longer booting and is probed again
+    async def boot_failed(self) -> str:
+        self._boot_deadline = 0.0
+        if self._state == BOOTING: self._set(DOWN)
+        return await self.refresh()
+
+    # probe every interval while the socket to DGSM is down
+    async def run(self) -> None:
+        while True:
+            if not self._connected(): await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def _set(self, state:str) -> None:
+        if state != self._state: self.since = time.time()
+        self._state = state
+
+    async def _run_probe(self) -> None:
+        self.probes += 1
+        up = any(await asyncio.gather(
+            asyncio.to_thread(nutil.is_online, self.host, self.timeout / 5),
+            *(self._tcp(port) for port in self.ports)
+        ))
+        self.checked = time.time()
+        # a booting host stays booting until it answers or the boot timeout passes
+        if up: self._set(UP)
+        elif self._state != BOOTING or time.time() > self._boot_deadline: self._set(DOWN)
+
+    # True if the host answers a tcp connection to port
+    async def _tcp(self, port:int) -> bool:
+        try: _, writer = await asyncio.wait_for(asyncio.open_connection(self.host, port), self.timeout)
+        except ConnectionRefusedError: return True
+        except (OSError, asyncio.TimeoutError): return False
+        writer.close()
+        return True
@@ -0,0 +1,194 @@
+import asyncio
+from collections import deque, OrderedDict
+from dataclasses import dataclass, field
+import time
+from typing import Optional
+from disnake.ext import commands
+from disnake.http import HTTPException
+import dgsm_bot.utils as nutil
+
+
+MESSAGE_LIMIT = 2000 # characters allowed in a discord message
+FOLLOWUP_TTL = 14 * 60 # interaction tokens expire after 15 minutes
+
+
+# Token bucket of a discord rate limit - 'limit' requests every 'per' seconds
+# used to wait before sending instead of being rejected by discord
+class RateBucket:
+    def __init__(self, limit:int, per:float) -> None:
+        self.limit = limit
+        self.rate = limit / per
+        self._tokens = float(limit)
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+
+    # seconds until a request may be sent
+    def delay(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.limit, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        return max(self._blocked_until - now, (1.0 - self._tokens) / self.rate, 0.0)
+
+    async def acquire(self) -> None:
+        while (delay := self.delay()) > 0: await asyncio.sleep(delay)
+        self._tokens -= 1.0
+
+    # discord rejected a request - send nothing until retry_after seconds have passed
+    def block(self, retry_after:float) -> None:
+        self._blocked_until = time.monotonic() + retry_after
+        self._tokens = 0.0
+
+
+# a message waiting to be sent - route is ('followup', interaction token) or ('channel', channel id)
+@dataclass
+class _Item:
+    route: tuple
+    text: str
+    progress: Optional[str] = None
+
+# a message posted for a progress key - edited by later updates of the same key
+@dataclass
+class _Posted:
+    route: tuple
+    message_id: int
+    posted: float = field(default_factory=time.monotonic)
+
+
+# Sends the messages for discord, one sender per channel so messages of a channel are always posted in the order received
+# messages queued for a channel within 'window' seconds are merged into as few posts as the message limit allows
+# every send waits on a token bucket for its route (channel or interaction) and the global bucket, instead of running into 429s
+# messages with a progress key edit the message posted for that key, as long as it is still the latest post in the channel
+class Outbox:
+    def __init__(self, bot:commands.Bot, window:float=0.3, channel_rate:tuple=(5, 5.0), followup_rate:tuple=(5, 2.0), global_rate:tuple=(50, 1.0)) -> None:
+        self._bot = bot
+        self.window = window
+        self._channel_rate = channel_rate
+        self._followup_rate = followup_rate
+        self._global = RateBucket(*global_rate)
+        self._buckets:dict[tuple, RateBucket] = {}
+        self._queues:dict[int, deque] = {}
+        self._senders:dict[int, asyncio.Task] = {}
+        self._progress:OrderedDict[tuple, _Posted] = OrderedDict() # (channel id, progress key) -> posted message
+        self._latest:dict[int, int] = {} # channel id -> id of the last message posted in it
+        self.posts = self.edits = 0
+
+    # queue message for the channel in ctx - the first message of an interaction that has not been responded to is its followup
+    # returns False if ctx has no destination
+    def post(self, ctx:dict, message:str, progress:Optional[str]=None) -> bool:
+        if not (cid := ctx.get('channel_id')): return False
+        if ctx.get('type', '') == 'interaction' and not ctx.get('responded', True) and (token := ctx.get('interaction_token')):
+            route = ('followup', token)
+            ctx.update({'responded': True})
+        else: route = ('channel', cid)
+        self._queues.setdefault(cid, deque()).append(_Item(route, message, progress))
+        if not (task := self._senders.get(cid)) or task.done():
+            self._senders[cid] = asyncio.get_event_loop().create_task(self._sender(cid))
+        return True
+
+    # sends the queue of channel cid until it is empty
+    async def _sender(self, cid:int) -> None:
+        queue = self._queues[cid]
+        try:
+            while queue:
+                await asyncio.sleep(self.window)
+                items = list(queue)
+                queue.clear()
+                for route, content, progress in self._coalesce(items):
+                    # a failed post is reported and the rest of the batch is still sent
+                    try: await self._send(cid, route, content, progress)
+                    except Exception as e: print(f'Unable to send a message to channel {cid}: {e!r}')
+        finally:
+            if not queue: self._queues.pop(cid, None)
+            self._senders.pop(cid, None)
+
+    # merge items into posts of (route, content, progress key)
+    # consecutive messages are merged while they fit - channel messages may join a pending followup since it is posted to the same channel
+    # progress updates are never merged with other messages, only the latest update of a key is sent
+    #   (as the followup if any of the updates it replaces was one)
+    @staticmethod
+    def _coalesce(items:list) -> list:
+        latest, followups = {}, {}
+        for i, item in enumerate(items):
+            if not item.progress: continue
+            latest[item.progress] = i
+            if item.route[0] == 'followup': followups.setdefault(item.progress, item.route)
+        posts = []
+        for i, item in enumerate(items):
+            if item.progress:
+                if latest[item.progress] == i: posts.append([followups.get(item.progress, item.route), item.text, item.progress])
+                continue
+            last = posts[-1] if posts else None
+            if (last and not last[2] and (last[0] == item.route or (last[0][0] == 'followup' and item.route[0] == 'channel'))
+                and len(last[1]) + len(item.text) + 1 <= MESSAGE_LIMIT - 6):
+                last[1] += '\n' + item.text
+            else: posts.append([item.route, item.text, None])
+        return [tuple(post) for post in posts]
+
+    def _bucket(self, route:tuple) -> RateBucket:
+        if not (bucket := self._buckets.get(route)):
+            bucket = self._buckets[route] = RateBucket(*(self._followup_rate if route[0] == 'followup' else self._channel_rate))
+        return bucket
+
+    async def _send(self, cid:int, route:tuple, content:str, progress:Optional[str]) -> None:
+        key = (cid, progress)
+        # a followup is always posted, it answers an interaction
+        if progress and route[0] == 'channel' and (posted := self._progress.get(key)) and self._last_message_id(cid) == posted.message_id and len(content) <= MESSAGE_LIMIT - 6:
+            if posted.route[0] == 'channel' or time.monotonic() - posted.posted < FOLLOWUP_TTL:
+                try: return await self._edit(cid, posted, f'```{content}```')
+                except HTTPException: pass # deleted or expired - post it instead
+        message_id = None
+        for chunk in nutil.message_chunks(content, 1950):
+            if message_id: route = ('channel', cid) # the followup is satisfied by the first chunk
+            message_id = await self._create(cid, route, f'```{chunk}```')
+        self._latest[cid] = message_id
+        if progress:
+            self._progress.pop(key, None)
+            self._progress[key] = _Posted(route, message_id)
+            if len(self._progress) > 256: self._progress.popitem(last=False)
+
+    # id of the last message in the channel, by anyone - message ids increase, so the newer of the channel's
+    #   last message and the last post of the outbox is used (the channel only learns of a post when discord echoes it)
+    def _last_message_id(self, cid:int) -> Optional[int]:
+        channel = self._bot.get_channel(cid)
+        return max(getattr(channel, 'last_message_id', None) or 0, self._latest.get(cid, 0)) or None
+
+    # post content to route - returns the id of the message
+    async def _create(self, cid:int, route:tuple, content:str) -> int:
+        bucket = self._bucket(route)
+        while True:
+            await bucket.acquire()
+            await self._global.acquire()
+            try:
+                if route[0] == 'followup':
+                    data = await self._bot.http.create_followup_message(application_id=self._bot.application_id, token=route[1], content=content)
+                    message_id = int(data['id'])
+                else:
+                    channel = self._bot.get_channel(cid) or await self._bot.fetch_channel(cid) # not cached, i.e. a thread
+                    message_id = (await channel.send(content)).id
+            except HTTPException as e:
+                if e.status != 429: raise
+                bucket.block(_retry_after(e))
+                continue
+            self.posts += 1
+            return message_id
+
+    async def _edit(self, cid:int, posted:_Posted, content:str) -> None:
+        bucket = self._bucket(posted.route)
+        while True:
+            await bucket.acquire()
+            await self._global.acquire()
+            try:
+                if posted.route[0] == 'followup':
+                    await self._bot.http.edit_followup_message(self._bot.application_id, posted.route[1], posted.message_id, content=content)
+                else: await self._bot.http.edit_message(cid, posted.message_id, content=content)
+            except HTTPException as e:
+                if e.status != 429: raise
+                bucket.block(_retry_after(e))
+                continue
+            self.edits += 1
+            return
+
+# seconds to wait after a 429 - from the Retry-After header when discord sends it
+def _retry_after(e:HTTPException) -> float:
+    try: return float(e.response.headers.get('Retry-After', 1.0))
+    except (AttributeError, TypeError, ValueError): return 1.0